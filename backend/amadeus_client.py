@@ -1,10 +1,23 @@
 import time
 import hashlib
+import threading
 from amadeus import Client, ResponseError, ServerError
 import logging
 import os
-from .config import settings
-from .cache_db import get as cache_get, set_cache as cache_set
+try:
+    from config import settings
+    from cache_db import get as cache_get, set_cache as cache_set
+    from singleflight import single_flight
+    from http_retry import call_with_retry, observed_call, parse_retry_after
+    import metrics
+    from provider_replay import replay
+except ImportError:  # imported as backend.amadeus_client
+    from .config import settings
+    from .cache_db import get as cache_get, set_cache as cache_set
+    from .singleflight import single_flight
+    from .http_retry import call_with_retry, observed_call, parse_retry_after
+    from . import metrics
+    from .provider_replay import replay
 import datetime
 
 CLIENT_ID = settings.AMADEUS_CLIENT_ID
@@ -12,15 +25,37 @@ CLIENT_SECRET = settings.AMADEUS_CLIENT_SECRET
 CURRENCY = settings.CURRENCY
 
 logger = logging.getLogger("gelidonia")
-amadeus = None
-if CLIENT_ID and CLIENT_SECRET:
-    amadeus = Client(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET
-    )
-else:
-    logger.warning("Amadeus credentials missing. CLIENT_ID set=%s CLIENT_SECRET set=%s", bool(CLIENT_ID), bool(CLIENT_SECRET))
+_amadeus = None
+_amadeus_lock = threading.Lock()
 
+
+def _client():
+    """Amadeus SDK client, built on first use (not at import); None without credentials."""
+    global _amadeus
+    if _amadeus is None and CLIENT_ID and CLIENT_SECRET:
+        with _amadeus_lock:
+            if _amadeus is None:
+                _amadeus = Client(client_id=CLIENT_ID, client_secret=CLIENT_SECRET)
+    return _amadeus
+
+def _status_code(error):
+    try:
+        status = getattr(error, 'response', None)
+        return getattr(status, 'status_code', None) or getattr(status, 'code', None)
+    except Exception:
+        return None
+
+def _classify_error(response, error):
+    """Retry 429s and 5xx server errors under the shared policy, honouring Retry-After when present."""
+    if error is None:
+        return False, None
+    code = _status_code(error)
+    if code in (429, 503) or isinstance(error, ServerError):
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        return True, parse_retry_after(headers.get('Retry-After'))
+    return False, None
+
+@single_flight("AMA")
 def fetch_price_for_date(origin, destination, date):
     """
     Amadeus API'sini kullanarak belirli bir rota ve tarih için en ucuz uçuşu arar.
@@ -35,6 +70,7 @@ def fetch_price_for_date(origin, destination, date):
     print(f"Cache MISS for {origin}-{destination} on {date}. Calling Amadeus API.")
     
     # If Amadeus client is not configured, gracefully return None
+    amadeus = _client()
     if amadeus is None:
         logger.info("Skipping Amadeus call for %s-%s %s due to missing credentials", origin, destination, date)
         return None
@@ -47,7 +83,7 @@ def fetch_price_for_date(origin, destination, date):
             delay_sec = 0.5
         if delay_sec > 0:
             time.sleep(delay_sec)
-        response = amadeus.shopping.flight_offers_search.get(
+        search = dict(
             originLocationCode=origin,
             destinationLocationCode=destination,
             departureDate=date,
@@ -55,6 +91,12 @@ def fetch_price_for_date(origin, destination, date):
             adults=1,
             max=1 # Sadece en ucuz teklifi al
         )
+        response = call_with_retry(
+            lambda: observed_call("amadeus", "/v2/shopping/flight-offers", lambda: replay.sdk_call(
+                "amadeus", search, lambda: amadeus.shopping.flight_offers_search.get(**search))),
+            _classify_error,
+            f"Amadeus {origin}-{destination} {date}",
+        )
         
         if not response.data:
             logger.info("Amadeus returned no offers for %s-%s on %s", origin, destination, date)
@@ -84,53 +126,21 @@ def fetch_price_for_date(origin, destination, date):
         return result
 
     except ResponseError as error:
-        # Retry/backoff for 429
-        try:
-            status = getattr(error, 'response', None)
-            code = getattr(status, 'status_code', None) or getattr(status, 'code', None)
-        except Exception:
-            code = None
-        if code == 429:
-            logger.warning("Rate limited (429) for %s-%s on %s; retrying...", origin, destination, date)
-            for delay in (0.8, 1.6):
-                time.sleep(delay)
-                try:
-                    response = amadeus.shopping.flight_offers_search.get(
-                        originLocationCode=origin,
-                        destinationLocationCode=destination,
-                        departureDate=date,
-                        currencyCode=CURRENCY,
-                        adults=1,
-                        max=1
-                    )
-                    if not response.data:
-                        logger.info("Amadeus returned no offers after retry for %s-%s on %s", origin, destination, date)
-                        cache_set(origin, destination, date, None, fetched_at=int(time.time()))
-                        return None
-                    offer = response.data[0]
-                    price = float(offer['price']['total'])
-                    airline = "TBD"
-                    if 'carrierCode' in offer['itineraries'][0]['segments'][0]:
-                         airline = offer['itineraries'][0]['segments'][0]['carrierCode']
-                    duration = offer['itineraries'][0].get('duration', 'TBD')
-                    result = {"price": price, "airline": airline, "duration": duration}
-                    cache_set(origin, destination, date, result, fetched_at=int(time.time()))
-                    return result
-                except ResponseError:
-                    continue
-                except Exception as e:
-                    logger.exception("Unexpected error during retry: %s", e)
-                    break
-            # final give-up: inform caller about rate limit
+        if _status_code(error) == 429:
+            # the shared retry policy already backed off; inform caller about rate limit
+            metrics.UPSTREAM_RATE_LIMITED.inc("amadeus")
             logger.error("Amadeus API Error: 429 (rate limited) for %s-%s on %s", origin, destination, date)
             return {"rate_limited": True}
-        else:
-            logger.error("Amadeus API Error: %s", error)
-            # Hata durumunda da None dönelim ki ana mantık çökmesin.
-            return None
+        logger.error("Amadeus API Error: %s", error)
+        # Hata durumunda da None dönelim ki ana mantık çökmesin.
+        return None
     except ServerError as error:
         logger.error("Amadeus Server Error: %s", error)
         return None
     except Exception as e:
+        if _status_code(e) == 429:
+            metrics.UPSTREAM_RATE_LIMITED.inc("amadeus")
+            logger.error("Amadeus API Error: 429 (rate limited) for %s-%s on %s", origin, destination, date)
+            return {"rate_limited": True}
         logger.exception("Unexpected error while calling Amadeus: %s", e)
         return None
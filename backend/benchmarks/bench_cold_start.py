@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cold-start time of a worker: process start to first successful /find-route.
+
+    python benchmarks/bench_cold_start.py --runs 5                 # uvicorn worker, warm-up on and off
+    python benchmarks/bench_cold_start.py --server inprocess       # no uvicorn: TestClient in a fresh interpreter
+
+Every run starts a fresh process against a local mock Tequila upstream (see load_test.py), waits
+for /ready and fires the same small search, then reports per setting (WARMUP on / off) the median of:
+
+    import_ms       importing main (inprocess only)
+    listening_ms    first answered /health (uvicorn only)
+    ready_ms        first 200 from /ready
+    first_search_ms process start to first 200 from /find-route
+    search_ms       latency of that first search, sent once /ready answered 200
+
+The leg cache is disabled so the first search always goes upstream.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import BACKEND_DIR, LatencyModel, free_port, start_mock_upstream  # noqa: E402
+
+PAYLOAD = {
+    "start_range_start": "2030-06-01",
+    "start_range_end": "2030-06-10",
+    "trip_length_days": 6,
+    "start_airport": "IST",
+    "cities": ["BER", "BCN"],
+    "max_candidates": 2,
+}
+
+# runs in a fresh interpreter; prints one JSON line
+INPROCESS_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    while client.get("/ready").status_code != 200:
+        time.sleep(0.002)
+    ready = time.perf_counter()
+    while client.post("/find-route", json=json.loads(sys.argv[1])).status_code != 200:
+        time.sleep(0.005)
+    done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - t0) * 1000, "ready_ms": (ready - t0) * 1000,
+                  "first_search_ms": (done - t0) * 1000, "search_ms": (done - ready) * 1000}))
+"""
+
+
+def _env(upstream_base: str, warmup: bool) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="gelidonia-cold-")
+    return dict(os.environ, TEQUILA_API_BASE=upstream_base, TEQUILA_API_KEY="coldstart", RAPIDAPI_KEY="",
+                PROVIDER_MODE="live", CACHE_DB=os.path.join(tmpdir, "cache.db"), DISABLE_CACHE="true",
+                LOG_FILE=os.path.join(tmpdir, "server.log"), WARMUP="true" if warmup else "false", LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+
+
+def run_inprocess(upstream_base: str, warmup: bool) -> dict:
+    out = subprocess.run([sys.executable, "-c", INPROCESS_CHILD, json.dumps(PAYLOAD)], cwd=BACKEND_DIR,
+                         env=_env(upstream_base, warmup), capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise SystemExit(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_uvicorn(upstream_base: str, warmup: bool, timeout: float = 60.0) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "1", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(upstream_base, warmup))
+    marks = {}
+    try:
+        session = requests.Session()
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise SystemExit(f"app exited with code {proc.returncode}")
+            try:
+                if "listening_ms" not in marks and session.get(f"{base}/health", timeout=1).ok:
+                    marks["listening_ms"] = (time.perf_counter() - t0) * 1000
+                # traffic is sent once the worker reports ready, as a load balancer would
+                if "listening_ms" in marks and session.get(f"{base}/ready", timeout=1).ok:
+                    marks["ready_ms"] = (time.perf_counter() - t0) * 1000
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.005)
+        while "ready_ms" in marks and time.perf_counter() - t0 < timeout:
+            s0 = time.perf_counter()
+            if session.post(f"{base}/find-route", json=PAYLOAD, timeout=30).ok:
+                now = time.perf_counter()
+                return dict(marks, first_search_ms=(now - t0) * 1000, search_ms=(now - s0) * 1000)
+            time.sleep(0.005)
+        raise SystemExit("no successful /find-route before the timeout")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--server", choices=("uvicorn", "inprocess"), default="uvicorn")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--latency", default="const:40", help="mock upstream latency model")
+    args = ap.parse_args()
+
+    mock, stats = start_mock_upstream(LatencyModel(args.latency, 1), 0.0, 0.0)
+    upstream = f"http://127.0.0.1:{mock.server_address[1]}"
+    run = run_uvicorn if args.server == "uvicorn" else run_inprocess
+    try:
+        for warmup in (True, False):
+            samples = [run(upstream, warmup) for _ in range(args.runs)]
+            summary = {k: round(statistics.median(s[k] for s in samples), 1) for k in samples[0]}
+            print(json.dumps(dict(summary, server=args.server, warmup=warmup, runs=args.runs,
+                                  upstream_latency=args.latency)))
+    finally:
+        mock.shutdown()
+
+
+if __name__ == "__main__":
+    main_cli()
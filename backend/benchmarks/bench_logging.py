@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Per-search cost of logging on the /find-route hot path.
+
+    python benchmarks/bench_logging.py --cities 3 --window 30 --max-candidates 8 --repeat 5
+
+Runs the same warm-cache search (synthetic provider from bench_search) under several logging
+setups and prints one JSON line per setup with mean/min milliseconds per search:
+
+    sync-debug     handlers on the request thread, DEBUG, every leg logged (worst case)
+    sync-info      handlers on the request thread, INFO, every leg logged (previous setup)
+    queue-info     log_setup: queue + background listener, INFO, legs sampled at --sample-rate
+    warning        WARNING only, nothing emitted on the hot path (floor)
+
+Log output goes to a temporary file and os.devnull, not the terminal.
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_search  # noqa: E402  (sets up env, cache and main)
+import log_setup  # noqa: E402
+from provider_replay import replay  # noqa: E402
+
+
+def _handlers(log_path):
+    formatter = logging.Formatter(log_setup.LOG_FORMAT)
+    stream = logging.StreamHandler(open(os.devnull, "w"))
+    fh = logging.FileHandler(log_path, encoding="utf-8")
+    for h in (stream, fh):
+        h.setFormatter(formatter)
+    return [stream, fh]
+
+
+def install(mode, log_path, sample_rate):
+    """Replaces the root handlers for mode; returns a teardown callable."""
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    logging.getLogger("gelidonia").setLevel(logging.NOTSET)
+    log_setup.leg_logger.filters = []
+
+    if mode == "warning":
+        root.setLevel(logging.WARNING)
+        return lambda: None
+    handlers = _handlers(log_path)
+    if mode.startswith("sync"):
+        root.setLevel(logging.DEBUG if mode == "sync-debug" else logging.INFO)
+        for h in handlers:
+            root.addHandler(h)
+        return lambda: [h.close() for h in handlers]
+
+    root.setLevel(logging.INFO)
+    log_setup.leg_logger.filters = [log_setup.SampleFilter(sample_rate)]
+    q = queue.SimpleQueue()
+    root.addHandler(log_setup.DeferredQueueHandler(q))
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def teardown():
+        listener.stop()
+        for h in handlers:
+            h.close()
+    return teardown
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cities", type=int, default=3)
+    ap.add_argument("--window", type=int, default=30)
+    ap.add_argument("--max-candidates", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--sample-rate", type=float, default=0.1)
+    ap.add_argument("--modes", default="sync-debug,sync-info,queue-info,warning")
+    args = ap.parse_args()
+
+    replay.responder = bench_search.synthetic_tequila
+    payload = bench_search.make_payload(args.cities, args.window, args.max_candidates)
+    bench_search.run_find_route(payload.model_copy(deep=True))  # fill the cache once
+
+    log_dir = tempfile.mkdtemp(prefix="gelidonia-logbench-")
+    for mode in args.modes.split(","):
+        log_path = os.path.join(log_dir, f"{mode}.log")
+        teardown = install(mode, log_path, args.sample_rate)
+        try:
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                bench_search.run_find_route(payload.model_copy(deep=True))
+                samples.append((time.perf_counter() - t0) * 1000)
+        finally:
+            teardown()
+        print(json.dumps({"mode": mode, "cities": args.cities, "window_days": args.window,
+                          "max_candidates": args.max_candidates, "repeat": args.repeat,
+                          "mean_ms": round(statistics.mean(samples), 3), "min_ms": round(min(samples), 3),
+                          "log_bytes": os.path.getsize(log_path) if os.path.exists(log_path) else 0}))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the RapidAPI offer parser in tequila_client.
+
+    python benchmarks/bench_rapid_parse.py                      # synthetic one-way payloads
+    python benchmarks/bench_rapid_parse.py recorded/*.json      # recorded RapidAPI responses
+
+Recorded payloads are raw response bodies ({"itineraries": [...]} or {"data": [...]}).
+Reports offers parsed per second for the current parser (price-only ranking, details
+for the winner) and for the previous approach (dump + full-tree scans of every offer).
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tequila_client as tc  # noqa: E402
+
+logging.getLogger("gelidonia").setLevel(logging.WARNING)
+
+DATE = "2025-06-01"
+
+
+def synthetic_itinerary(rng: random.Random) -> dict:
+    hops = rng.randint(1, 2)
+    segments = []
+    for i in range(hops):
+        segments.append({
+            "segment": {
+                "id": f"seg-{rng.random()}",
+                "source": {"localTime": "2025-06-01T08:00:00", "utcTime": "2025-06-01T05:00:00Z",
+                           "station": {"code": "IST", "city": {"name": "Istanbul", "country": {"code": "TR"}}}},
+                "destination": {"localTime": "2025-06-01T11:00:00", "utcTime": "2025-06-01T09:00:00Z",
+                                "station": {"code": "BER", "city": {"name": "Berlin", "country": {"code": "DE"}}}},
+                "duration": rng.randint(3600, 14400),
+                "code": str(rng.randint(100, 9999)),
+                "carrier": {"code": rng.choice(["TK", "PC", "LH", "W6"]), "name": "Carrier"},
+                "operatingCarrier": {"code": "TK"},
+                "cabinClass": "ECONOMY",
+            },
+            "layover": {"duration": 3600} if i else None,
+        })
+    return {
+        "id": f"it-{rng.random()}",
+        "price": {"amount": f"{rng.uniform(40, 400):.2f}", "currency": "EUR"},
+        "priceEur": {"amount": "0"},
+        "provider": {"name": "Kiwi.com", "code": "KIWI"},
+        "sector": {"id": "sector", "duration": 7200, "sectorSegments": segments},
+        "bookingOptions": {"edges": [{"node": {"bookingUrl": "/en/booking?token=" + "x" * 400,
+                                               "price": {"amount": "0"}}}]},
+        "travelHack": {"isTrueHiddenCity": False, "isVirtualInterlining": False},
+    }
+
+
+def load_payloads(paths, count, offers):
+    if paths:
+        payloads = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                body = json.load(f)
+            items = body.get("itineraries") or body.get("data") or []
+            payloads.append(items)
+        return payloads
+    rng = random.Random(42)
+    return [[synthetic_itinerary(rng) for _ in range(offers)] for _ in range(count)]
+
+
+def legacy_parse(items, date):
+    """Previous behaviour: dump and deep-scan every offer, parse every improvement."""
+    best = None
+    for offer in items:
+        str(offer)
+        price_val = tc._rapid_offer_price(offer)
+        if price_val is None:
+            continue
+        tc._deep_find_first(offer, lambda d: "localTime" in d and "utcTime" in d)
+        tc._deep_find_first(offer, lambda d: "carrier" in d and "code" in d and "duration" in d)
+        if best is None or price_val < best["price"]:
+            best = tc._parse_rapid_offer(offer, price_val, date)
+    return best
+
+
+def bench(label, fn, payloads, repeat):
+    n_offers = sum(len(p) for p in payloads) * repeat
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for items in payloads:
+            fn(items)
+    elapsed = time.perf_counter() - t0
+    rate = n_offers / elapsed if elapsed else float("inf")
+    print(f"{label:<12} {n_offers:>8} offers  {elapsed:8.3f}s  {rate:12,.0f} offers/s")
+    return rate
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("payloads", nargs="*", help="recorded RapidAPI response JSON files")
+    ap.add_argument("--count", type=int, default=200, help="synthetic payloads to generate")
+    ap.add_argument("--offers", type=int, default=50, help="offers per synthetic payload")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    payloads = load_payloads(args.payloads, args.count, args.offers)
+    legacy = bench("legacy", lambda items: legacy_parse(items, DATE), payloads, args.repeat)
+    current = bench("current", lambda items: tc._parse_cheapest_rapid_offer(items, DATE), payloads, args.repeat)
+    print(f"speedup      {current / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Memory and serialization cost of /find-route responses.
+
+    python benchmarks/bench_response.py --cities 4 --window 60 --max-candidates 30 --repeat 20
+
+Scores one warm-cache search (synthetic provider from bench_search) with the Pareto objectives
+on, so the response holds many routes, then prints one JSON line per encoder:
+
+    fastapi        jsonable_encoder + json.dumps (FastAPI's default response path)
+    fast_json      fast_json.dumps (orjson when installed)
+    fast_json+gz   fast_json.dumps + gzip, as sent to clients accepting gzip
+    compact        compact_result + fast_json.dumps
+    compact+gz     compact_result + fast_json.dumps + gzip
+
+with mean milliseconds per encode and the body size. A first line reports the memory allocated
+while scoring (tracemalloc) and how many leg detail objects the routes share.
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_search  # noqa: E402  (sets up env, cache and main)
+import fast_json  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from leg_quote import compact_result  # noqa: E402
+from provider_replay import replay  # noqa: E402
+
+main = bench_search.main
+
+ENCODERS = {
+    "fastapi": lambda r: json.dumps(jsonable_encoder(r)).encode("utf-8"),
+    "fast_json": fast_json.dumps,
+    "fast_json+gz": lambda r: gzip.compress(fast_json.dumps(r), compresslevel=5),
+    "compact": lambda r: fast_json.dumps(compact_result(r)),
+    "compact+gz": lambda r: gzip.compress(fast_json.dumps(compact_result(r)), compresslevel=5),
+}
+
+
+def routes(result):
+    yield result["best_route"]
+    yield from result["alternatives"]
+    yield from result.get("pareto", {}).get("frontier", ())
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cities", type=int, default=4)
+    ap.add_argument("--window", type=int, default=60)
+    ap.add_argument("--max-candidates", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    replay.responder = bench_search.synthetic_tequila
+    payload = bench_search.make_payload(args.cities, args.window, args.max_candidates)
+    payload.objectives = ["price", "duration", "stops"]
+    payload = main.normalize_payload(payload)
+    candidates = main.prepare_candidates(payload)
+    quotes = main.price_legs([leg for cand in candidates for leg in cand["legs"]])
+
+    tracemalloc.start()
+    result = main.score_candidates(payload, candidates, quotes)
+    scoring_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    legs = [leg for r in routes(result) for leg in r["leg_details"]]
+    print(json.dumps({"candidates": len(candidates), "routes": sum(1 for _ in routes(result)),
+                      "leg_refs": len(legs), "leg_objects": len({id(leg) for leg in legs}),
+                      "scoring_peak_bytes": scoring_bytes}))
+
+    for name, encode in ENCODERS.items():
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            body = encode(result)
+            samples.append((time.perf_counter() - t0) * 1000)
+        print(json.dumps({"encoder": name, "repeat": args.repeat, "mean_ms": round(statistics.mean(samples), 3),
+                          "min_ms": round(min(samples), 3), "bytes": len(body),
+                          "orjson": fast_json.orjson is not None}))
+
+
+if __name__ == "__main__":
+    main_cli()
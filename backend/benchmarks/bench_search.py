@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the route search engine with a synthetic, deterministic price provider.
+
+    python benchmarks/bench_search.py                          # default sweep, JSON lines on stdout
+    python benchmarks/bench_search.py --cities 2,3,4 --window 7,30 --max-candidates 2,8 \\
+        --latency-ms 0,50 --output results.jsonl
+
+Every configuration is run cold (empty cache), warm (same search again, answered from the leg
+cache) and result_hit (same search answered from the result cache) and reports wall time,
+upstream call count, legs priced, cache hit ratio and peak traced memory. The result cache is
+off for the cold and warm runs (RESULT_CACHE=false), so warm keeps measuring a real search. Upstream calls
+are answered by provider_replay in replay mode with a synthetic responder, so the whole client
+stack (batching, retries, streaming decode, single-flight) is exercised without network.
+One JSON object per line; compare files across versions with any JSON tool.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmpdir = tempfile.mkdtemp(prefix="gelidonia-bench-")
+os.environ.setdefault("TEQUILA_API_KEY", "synthetic")
+os.environ["CACHE_DB"] = os.path.join(_tmpdir, "cache.db")
+os.environ["LOG_FILE"] = os.path.join(_tmpdir, "server.log")
+os.environ["DISABLE_CACHE"] = "false"
+os.environ["PROVIDER_MODE"] = "replay"
+os.environ["MAX_CANDIDATES_HARD_CAP"] = "1000"
+os.environ["RESULT_CACHE"] = "false"  # turned on only for the result_hit run
+
+import cache_db  # noqa: E402
+import main  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from provider_replay import replay  # noqa: E402
+from synthetic import synthetic_price, synthetic_tequila  # noqa: E402,F401
+
+main.startup()
+logging.getLogger("gelidonia").setLevel(logging.WARNING)
+
+CITY_POOL = ["BER", "BCN", "PAR", "ROM", "AMS", "VIE", "PRG", "LIS", "MAD", "ATH"]
+
+
+def make_payload(n_cities: int, window_days: int, max_candidates: int) -> main.RequestPayload:
+    start = datetime(2030, 6, 1)
+    trip_length = 3 * n_cities
+    return main.RequestPayload(
+        start_range_start=start.strftime("%Y-%m-%d"),
+        start_range_end=(start + timedelta(days=window_days + trip_length - 1)).strftime("%Y-%m-%d"),
+        trip_length_days=trip_length,
+        start_airport="IST",
+        cities=CITY_POOL[:n_cities],
+        max_candidates=max_candidates,
+    )
+
+
+def run_find_route(payload):
+    try:
+        result = main.search_route(payload)
+        return result["best_route"]["total_price"]
+    except HTTPException as e:
+        return f"HTTP {e.status_code}"
+
+
+# name -> callable(payload) returning a comparable summary of the result
+OPTIMIZERS = {
+    "find_route": run_find_route,
+}
+
+
+def measure(fn, payload, trace_memory: bool):
+    calls_before = replay.stats["replayed"]
+    hits, misses = cache_db.stats["hits"], cache_db.stats["misses"]
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(payload.model_copy(deep=True))
+    wall = time.perf_counter() - t0
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    lookups_hit = cache_db.stats["hits"] - hits
+    lookups = lookups_hit + cache_db.stats["misses"] - misses
+    return {
+        "wall_s": round(wall, 6),
+        "upstream_calls": replay.stats["replayed"] - calls_before,
+        "cache_lookups": lookups,
+        "cache_hit_ratio": round(lookups_hit / lookups, 4) if lookups else None,
+        "peak_mem_bytes": peak,
+        "result": result,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cities", type=int_list, default=[2, 3, 4])
+    ap.add_argument("--window", type=int_list, default=[7, 30], help="start-date window sizes in days")
+    ap.add_argument("--max-candidates", type=int_list, default=[2, 8])
+    ap.add_argument("--latency-ms", type=int_list, default=[0, 20])
+    ap.add_argument("--optimizers", default=",".join(OPTIMIZERS))
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--output", help="append JSON lines here instead of stdout")
+    args = ap.parse_args()
+
+    replay.responder = synthetic_tequila
+    meta = {"git": git_revision(), "python": platform.python_version(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z"}
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for name, n_cities, window, max_cand, latency in itertools.product(
+                args.optimizers.split(","), args.cities, args.window, args.max_candidates, args.latency_ms):
+            fn = OPTIMIZERS[name]
+            payload = make_payload(n_cities, window, max_cand)
+            replay.latency = (latency, latency)
+            row = dict(meta, optimizer=name, cities=n_cities, window_days=window,
+                       max_candidates=max_cand, latency_ms=latency)
+            cache_db.clear_all()
+            row["cold"] = measure(fn, payload, trace_memory=False)
+            row["warm"] = measure(fn, payload, trace_memory=False)
+            os.environ["RESULT_CACHE"] = "true"
+            try:
+                fn(payload.model_copy(deep=True))  # stores the response
+                row["result_hit"] = measure(fn, payload, trace_memory=False)
+            finally:
+                os.environ["RESULT_CACHE"] = "false"
+            if not args.no_memory:
+                cache_db.clear_all()
+                row["cold"]["peak_mem_bytes"] = measure(fn, payload, trace_memory=True)["peak_mem_bytes"]
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Requests per second of serve_web.py (the Flutter web build server), old vs new handler.
+
+    python benchmarks/bench_serve_web.py                       # synthetic build in a temp dir
+    python benchmarks/bench_serve_web.py --dir ../build/web --clients 16 --duration 5
+
+Serves the web build (--dir, or a generated stand-in with Flutter-sized main.dart.js and
+CanvasKit files) on a free port and runs --clients keep-alive client threads that fetch the
+asset list of a page load (Accept-Encoding: gzip, br) for --duration seconds. One JSON line per
+server:
+
+    legacy        socketserver.TCPServer + SimpleHTTPRequestHandler (the previous serve_web.py)
+    threaded      serve_web.Server + serve_web.Handler, first visit (full bodies)
+    revalidate    same, with If-None-Match from a previous visit (304s)
+
+with requests/s, MB/s on the wire, p50/p99 latency and errors. --slow-clients N adds N
+connections that send a partial request and stall, as a slow mobile client would.
+"""
+import argparse
+import http.client
+import http.server
+import json
+import os
+import random
+import socket
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+import serve_web  # noqa: E402
+
+PAGE_ASSETS = ["/", "/flutter_bootstrap.js", "/main.dart.js", "/canvaskit/canvaskit.js",
+               "/canvaskit/canvaskit.wasm", "/assets/FontManifest.json", "/manifest.json", "/favicon.png"]
+
+
+def synthetic_build(root: str) -> str:
+    """A stand-in web build: JS-like text and binary-ish wasm at Flutter release sizes."""
+    rng = random.Random(7)
+    words = [f"{w}{i}" for i, w in enumerate(["function", "var", "return", "this", "null", "prototype"] * 40)]
+
+    def text(size: int) -> bytes:
+        out, n = [], 0
+        while n < size:
+            w = rng.choice(words)
+            out.append(w)
+            n += len(w) + 1
+        return " ".join(out).encode()[:size]
+
+    files = {
+        "index.html": text(1500), "flutter_bootstrap.js": text(9000), "main.dart.js": text(2_500_000),
+        "canvaskit/canvaskit.js": text(90_000),
+        "canvaskit/canvaskit.wasm": bytes(rng.getrandbits(8) if i % 3 else 0 for i in range(1_500_000)),
+        "assets/FontManifest.json": text(300), "manifest.json": text(900), "favicon.png": os.urandom(900),
+    }
+    for name, data in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    return root
+
+
+class LegacyHandler(http.server.SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=serve_web.WEB_DIR, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(kind: str):
+    if kind == "legacy":
+        httpd = socketserver.TCPServer(("127.0.0.1", 0), LegacyHandler)
+    else:
+        serve_web.Handler.quiet = True
+        httpd = serve_web.Server(("127.0.0.1", 0), serve_web.Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def client(port: int, deadline: float, etags: dict, revalidate: bool, out: list):
+    conn, latencies, wire, errors = None, [], 0, 0
+    while time.perf_counter() < deadline:
+        for asset in PAGE_ASSETS:
+            headers = {"Accept-Encoding": "gzip, br"}
+            if revalidate and asset in etags:
+                headers["If-None-Match"] = etags[asset]
+            t0 = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", asset, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                if resp.status not in (200, 304):
+                    errors += 1
+                etags.setdefault(asset, resp.getheader("ETag"))
+                wire += len(body)
+                if resp.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                if conn is not None:
+                    conn.close()
+                conn = None
+                continue
+            latencies.append(time.perf_counter() - t0)
+    if conn is not None:
+        conn.close()
+    out.append((latencies, wire, errors))
+
+
+def run(kind: str, args) -> dict:
+    httpd = start("legacy" if kind == "legacy" else "threaded")
+    port = httpd.server_address[1]
+    stalled = []
+    for _ in range(args.slow_clients):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(b"GET /main.dart.js HTTP/1.1\r\nHost: x\r\n")  # headers never finished
+        stalled.append(s)
+    etags = {}
+    if kind == "revalidate":
+        client(port, 0, etags, False, [])  # deadline passed: one page load to learn the ETags
+    out = []
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client, args=(port, deadline, dict(etags), kind == "revalidate", out))
+               for _ in range(args.clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    for s in stalled:
+        s.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+    latencies = sorted(x for lat, _, _ in out for x in lat)
+    n = len(latencies)
+    return {"server": kind, "clients": args.clients, "slow_clients": args.slow_clients,
+            "requests_per_s": round(n / wall, 1), "mb_per_s": round(sum(w for _, w, _ in out) / wall / 1e6, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2) if n else None,
+            "p99_ms": round(latencies[max(0, int(n * 0.99) - 1)] * 1000, 2) if n else None,
+            "errors": sum(e for _, _, e in out)}
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dir", help="web build to serve (default: a generated stand-in)")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=3.0)
+    ap.add_argument("--slow-clients", type=int, default=0)
+    args = ap.parse_args()
+
+    serve_web.WEB_DIR = args.dir or synthetic_build(tempfile.mkdtemp(prefix="gelidonia-web-"))
+    counts = serve_web.precompress(serve_web.WEB_DIR)
+    print(json.dumps({"web_dir": serve_web.WEB_DIR, "precompressed": counts, "brotli": serve_web.brotli is not None}))
+    for kind in ("legacy", "threaded", "revalidate"):
+        print(json.dumps(run(kind, args)))
+
+
+if __name__ == "__main__":
+    main_cli()
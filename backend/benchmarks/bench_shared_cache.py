@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Leg cache lookups from several worker processes: SQLite only vs the shared mmap table.
+
+    python benchmarks/bench_shared_cache.py --workers 4 --keys 2000 --lookups 20000 --write-every 20
+
+Each run seeds a fresh cache.db with --keys legs, then starts --workers processes that each do
+--lookups cache_db.get() calls on random legs while writing a refreshed quote every --write-every
+lookups (a worker's upstream fetches landing in the cache). Reported per mode (SHARED_CACHE off /
+mmap), one JSON line each:
+
+    lookups_per_s   all workers together
+    p50_us, p99_us  per-lookup latency
+    shared_hit_ratio  lookups answered by the shared table (mmap only)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _legs(n: int):
+    return [("KIW|IST", f"D{i % 500:03d}", f"2030-{6 + i // 15000:02d}-{1 + (i // 500) % 30:02d}") for i in range(n)]
+
+
+def _quote(i: int) -> dict:
+    return {"price": 100 + i % 400, "currency": "EUR", "airline": "XQ", "duration": "3h 5m", "stops": i % 2,
+            "departure": "2030-06-01T08:00:00", "arrival": "2030-06-01T11:05:00"}
+
+
+def _worker(db_path: str, mode: str, n_keys: int, lookups: int, write_every: int, seed: int, out):
+    os.environ["SHARED_CACHE"] = mode
+    import cache_db
+    cache_db.init(db_path)
+    legs = _legs(n_keys)
+    rng = random.Random(seed)
+    samples = []
+    t0 = time.perf_counter()
+    for n in range(lookups):
+        leg = legs[rng.randrange(n_keys)]
+        s0 = time.perf_counter()
+        cache_db.get(*leg)
+        samples.append(time.perf_counter() - s0)
+        if write_every and n % write_every == 0:
+            cache_db.set_cache(*leg, _quote(n), int(time.time()))
+    shared_hits = cache_db.shared.stats["hits"] if cache_db.shared is not None else 0
+    out.put({"seconds": time.perf_counter() - t0, "samples": samples, "shared_hits": shared_hits})
+
+
+def run(mode: str, args) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="gelidonia-shared-")
+    db_path = os.path.join(tmpdir, "cache.db")
+    os.environ["SHARED_CACHE"] = mode
+    import cache_db
+    cache_db.init(db_path)
+    for i, leg in enumerate(_legs(args.keys)):
+        cache_db.set_cache(*leg, _quote(i), int(time.time()))
+
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(db_path, mode, args.keys, args.lookups, args.write_every, seed, out))
+             for seed in range(args.workers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    samples = sorted(s for r in results for s in r["samples"])
+    total = len(samples)
+    wall = max(r["seconds"] for r in results)
+    return {"mode": mode, "workers": args.workers, "keys": args.keys, "lookups": total,
+            "write_every": args.write_every, "lookups_per_s": round(total / wall),
+            "p50_us": round(statistics.median(samples) * 1e6, 1),
+            "p99_us": round(samples[int(total * 0.99) - 1] * 1e6, 1),
+            "shared_hit_ratio": round(sum(r["shared_hits"] for r in results) / total, 3)}
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--keys", type=int, default=2000)
+    ap.add_argument("--lookups", type=int, default=20000, help="per worker")
+    ap.add_argument("--write-every", type=int, default=20, help="0: read-only")
+    args = ap.parse_args()
+    for mode in ("off", "mmap"):
+        print(json.dumps(run(mode, args)))
+
+
+if __name__ == "__main__":
+    main_cli()
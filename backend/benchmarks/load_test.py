@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Load test for one worker of the FastAPI backend against a local mock Tequila upstream.
+
+    python benchmarks/load_test.py --rate 5 --duration 60
+    python benchmarks/load_test.py --rate 20 --duration 30 --latency lognormal:120:0.6 \\
+        --error-rate 0.02 --rate-limit-rate 0.01 --output load.jsonl
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --rate 2   # existing server (no mock)
+
+Starts a mock pricing server (synthetic deterministic prices, see synthetic.py) and the app under
+uvicorn with a single worker, pointed at the mock via TEQUILA_API_BASE. Searches drawn from a
+weighted mix of realistic payloads are then sent open-loop at --rate per second: requests are
+scheduled on a fixed clock and latency is measured from the scheduled time, so a saturated
+server shows up as growing latency instead of a silently lower send rate.
+
+Upstream latency (--latency):  const:MS | uniform:LO:HI | lognormal:MEDIAN_MS:SIGMA
+Prints one JSON summary: throughput, latency percentiles, status counts, error rate, and the
+mock upstream's request count.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import tequila_body  # noqa: E402
+
+CITY_POOL = ["BER", "BCN", "PAR", "ROM", "AMS", "VIE", "PRG", "LIS", "MAD", "ATH"]
+HOMES = ["IST", "SAW", "ESB", "ADB"]
+
+# (weight, n_cities, window_days, max_candidates): mostly small weekend/week trips, some big tours
+PAYLOAD_MIX = [
+    (50, 2, 7, 2),
+    (30, 3, 14, 4),
+    (15, 3, 30, 8),
+    (5, 4, 60, 8),
+]
+
+
+# ---------- mock upstream ----------
+class LatencyModel:
+    def __init__(self, spec: str, seed: int):
+        kind, _, rest = spec.partition(":")
+        args = [float(a) for a in rest.split(":") if a]
+        self.kind, self.args = kind, args
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        if kind not in ("const", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency model {spec!r}")
+
+    def sample_ms(self) -> float:
+        with self._lock:
+            if self.kind == "const":
+                return self.args[0] if self.args else 0.0
+            if self.kind == "uniform":
+                return self._rng.uniform(self.args[0], self.args[1])
+            median, sigma = self.args[0], (self.args[1] if len(self.args) > 1 else 0.5)
+            return self._rng.lognormvariate(math.log(max(median, 0.001)), sigma)
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients drop connections mid-body on purpose (streamed responses are closed early)
+        if not isinstance(sys.exc_info()[1], (ConnectionError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def start_mock_upstream(latency: LatencyModel, error_rate: float, rate_limit_rate: float):
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+    stats_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; without TCP_NODELAY a kept-alive client
+        # connection waits out the delayed ACK (~40 ms) on every response
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: str, headers=()):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != "/v2/search":
+                return self._send(404, "{}")
+            time.sleep(latency.sample_ms() / 1000.0)
+            roll = latency.roll()
+            with stats_lock:
+                stats["requests"] += 1
+                if roll < rate_limit_rate:
+                    stats["rate_limited"] += 1
+                elif roll < rate_limit_rate + error_rate:
+                    stats["errors"] += 1
+            if roll < rate_limit_rate:
+                return self._send(429, "{}", [("Retry-After", "1")])
+            if roll < rate_limit_rate + error_rate:
+                return self._send(503, "{}")
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            self._send(200, tequila_body(params))
+
+    server = _QuietServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+# ---------- app under test ----------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(upstream_base: str, disable_cache: bool, timeout: float = 30.0):
+    port = free_port()
+    tmpdir = tempfile.mkdtemp(prefix="gelidonia-load-")
+    env = dict(os.environ,
+               TEQUILA_API_BASE=upstream_base, TEQUILA_API_KEY="loadtest", RAPIDAPI_KEY="",
+               PROVIDER_MODE="live", CACHE_DB=os.path.join(tmpdir, "cache.db"), LOG_FILE=os.path.join(tmpdir, "server.log"),
+               DISABLE_CACHE="true" if disable_cache else "false",
+               MAX_CANDIDATES_HARD_CAP=os.getenv("MAX_CANDIDATES_HARD_CAP", "8"),
+               LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "1", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"app exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{base}/health", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("app did not become healthy in time")
+
+
+# ---------- load generation ----------
+def make_payloads(count: int, seed: int):
+    rng = random.Random(seed)
+    weights = [w for w, *_ in PAYLOAD_MIX]
+    payloads = []
+    for _ in range(count):
+        _, n_cities, window, max_cand = rng.choices(PAYLOAD_MIX, weights)[0]
+        start = datetime(2030, 5, 1) + timedelta(days=rng.randrange(120))
+        trip_length = rng.randint(2, 4) * n_cities
+        home = rng.choice(HOMES)
+        payloads.append({
+            "start_range_start": start.strftime("%Y-%m-%d"),
+            "start_range_end": (start + timedelta(days=window + trip_length - 1)).strftime("%Y-%m-%d"),
+            "trip_length_days": trip_length,
+            "start_airport": home,
+            "cities": rng.sample(CITY_POOL, n_cities),
+            "max_candidates": max_cand,
+        })
+    return payloads
+
+
+def percentile(sorted_values, q: float):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def run_load(base: str, payloads, rate: float, duration: float, concurrency: int, timeout: float):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    results = []
+    results_lock = threading.Lock()
+
+    def one(payload, scheduled):
+        try:
+            resp = session.post(f"{base}/find-route", json=payload, timeout=timeout)
+            status = str(resp.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - scheduled
+        with results_lock:
+            results.append((status, latency))
+
+    total = max(1, int(rate * duration))
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(total):
+            scheduled = t0 + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, payloads[i % len(payloads)], scheduled)
+    elapsed = time.perf_counter() - t0
+    return results, elapsed
+
+
+def summarize(results, elapsed: float):
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = sorted(lat for status, lat in results if status == "200")
+    all_lat = sorted(lat for _, lat in results)
+    # 404 (no route) is a valid search outcome; anything else counts as an error
+    errors = sum(n for s, n in statuses.items() if s not in ("200", "404"))
+
+    def pct(values):
+        return {f"p{int(q * 100)}": round(percentile(values, q) * 1000, 1) if values else None
+                for q in (0.5, 0.9, 0.95, 0.99)}
+
+    return {
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 3) if elapsed else None,
+        "ok_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "latency_ms": dict(pct(all_lat), max=round(all_lat[-1] * 1000, 1) if all_lat else None),
+        "ok_latency_ms": pct(ok),
+        "status": statuses,
+        "error_rate": round(errors / len(results), 4) if results else None,
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rate", type=float, default=5.0, help="searches per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    ap.add_argument("--concurrency", type=int, default=64, help="max in-flight client requests")
+    ap.add_argument("--timeout", type=float, default=60.0, help="client timeout per search")
+    ap.add_argument("--latency", default="lognormal:80:0.5", help="mock upstream latency model")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered 503")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of upstream calls answered 429")
+    ap.add_argument("--distinct-payloads", type=int, default=200, help="size of the payload pool")
+    ap.add_argument("--cache", action="store_true", help="run the app with the leg cache enabled")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--url", help="test an already running app instead of starting app + mock")
+    ap.add_argument("--output", help="append the JSON summary here as well as printing it")
+    args = ap.parse_args()
+
+    mock, mock_stats, proc = None, None, None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        mock, mock_stats = start_mock_upstream(LatencyModel(args.latency, args.seed), args.error_rate, args.rate_limit_rate)
+        proc, base = start_app(f"http://127.0.0.1:{mock.server_address[1]}", disable_cache=not args.cache)
+    try:
+        payloads = make_payloads(args.distinct_payloads, args.seed)
+        results, elapsed = run_load(base, payloads, args.rate, args.duration, args.concurrency, args.timeout)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if mock is not None:
+            mock.shutdown()
+
+    summary = dict(summarize(results, elapsed), target_rps=args.rate, duration_s=args.duration,
+                   latency_model=None if args.url else args.latency, upstream_error_rate=args.error_rate,
+                   upstream_429_rate=args.rate_limit_rate, cache=args.cache,
+                   timestamp=datetime.utcnow().isoformat(timespec="seconds") + "Z")
+    if mock_stats is not None:
+        summary["upstream"] = dict(mock_stats)
+    line = json.dumps(summary)
+    print(line)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,103 @@
+"""
+Deterministic synthetic Tequila v2/search responses shared by the benchmarks and the load test.
+Prices, durations and stops depend only on (origin, destination, date), so results are comparable
+across runs. Cheap offers tend to have more stops and take longer, as real ones do.
+Metro codes (LON) are searched across the city's airports, as Tequila does.
+Every leg is also flown by a second, dearer carrier (YY), so select_airlines/select_airlines_exclude
+filters still leave an offer. Like Tequila, one_for_city=1 keeps only the cheapest offer per destination city (cityCodeTo, from
+metro_areas plus CITIES), so airports of one city sharing a request would lose all but one offer,
+and at most `limit` offers are returned.
+"""
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metro_areas  # noqa: E402
+
+
+# cities Tequila knows that metro_areas.METRO_AREAS does not list
+CITIES: Dict[str, str] = {"SAW": "IST"}
+
+
+def _city(code: str) -> str:
+    return CITIES.get(code, metro_areas.city_of(code))
+
+
+def _airports(codes: str) -> List[str]:
+    return [a for code in str(codes).split(",") for a in metro_areas.METRO_AREAS.get(code, [code])]
+
+
+def synthetic_price(origin: str, destination: str, date: str) -> float:
+    digest = hashlib.sha1(f"{origin}|{destination}|{date}".encode()).digest()
+    return 30 + int.from_bytes(digest[:4], "big") % 270
+
+
+def synthetic_shape(origin: str, destination: str, date: str) -> Tuple[int, int]:
+    """(duration seconds, stops) of the synthetic offer for a leg."""
+    price = synthetic_price(origin, destination, date)
+    digest = hashlib.sha1(f"shape|{origin}|{destination}|{date}".encode()).digest()
+    stops = min(2, digest[0] % 3 + (1 if price < 120 else 0) - (1 if price > 220 else 0))
+    stops = max(0, stops)
+    return 5400 + stops * 7200 + int.from_bytes(digest[1:3], "big") % 3600, stops
+
+
+# carrier -> surcharge over synthetic_price; XX is the cheapest offer of every leg
+AIRLINES: Dict[str, int] = {"XX": 0, "YY": 40}
+
+
+def _allowed(airlines: set, params: Dict[str, Any]) -> bool:
+    selected = {a for a in str(params.get("select_airlines") or "").split(",") if a}
+    if not selected:
+        return True
+    if str(params.get("select_airlines_exclude", "")).lower() == "true":
+        return not airlines & selected
+    return airlines <= selected
+
+
+def tequila_body(params: Dict[str, Any]) -> str:
+    """
+    Tequila v2/search body for the requested fly_from/fly_to and date_from..date_to: one offer per
+    carrier, origin airport, destination airport and day, a metro code (LON) standing for all of its
+    airports.
+    """
+    day = datetime.strptime(params["date_from"], "%d/%m/%Y")
+    last = datetime.strptime(params.get("date_to") or params["date_from"], "%d/%m/%Y")
+    dates = [(day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last - day).days + 1)]
+    offers: List[Dict[str, Any]] = []
+    for date in dates:
+        for origin in _airports(params["fly_from"]):
+            for destination in _airports(params["fly_to"]):
+                duration, stops = synthetic_shape(origin, destination, date)
+                for airline, surcharge in AIRLINES.items():
+                    if not _allowed({airline}, params):
+                        continue
+                    price = synthetic_price(origin, destination, date) + surcharge
+                    offers.append({
+                        "flyFrom": origin, "flyTo": destination, "cityCodeTo": _city(destination),
+                        "price": price, "local_departure": f"{date}T08:00:00.000Z",
+                        "airlines": [airline],
+                        "route": [{"airline": airline, "flight_no": int(price) + i, "dTimeUTC": 0}
+                                  for i in range(stops + 1)],
+                        "duration": {"total": duration},
+                        "deep_link": f"https://example.invalid/{origin}/{destination}/{date}/{airline}",
+                    })
+    offers.sort(key=lambda o: o["price"])
+    if str(params.get("one_for_city", "")) == "1":
+        seen = set()
+        offers = [o for o in offers if not (o["cityCodeTo"] in seen or seen.add(o["cityCodeTo"]))]
+    if str(params.get("one_per_date", "")) == "1":
+        seen = set()
+        offers = [o for o in offers if not (o["local_departure"] in seen or seen.add(o["local_departure"]))]
+    if params.get("limit"):
+        offers = offers[:int(params["limit"])]
+    return json.dumps({"currency": "EUR", "data": offers})
+
+
+def synthetic_tequila(provider, request):
+    """provider_replay responder serving tequila_body for the request's query params."""
+    return 200, {"Content-Type": "application/json"}, tequila_body(request["params"])
@@ -1,17 +1,37 @@
 # cache_db.py
 # Basit SQLite tabanlı cache. uçuş fiyatlarını (origin,dest,date) -> JSON saklar.
 
+import contextlib
 import sqlite3
 import json
-from typing import Optional
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from search_timings import current as current_timings
+except ImportError:  # imported as backend.cache_db by the package-relative clients
+    from .search_timings import current as current_timings
+try:
+    import shared_cache
+except ImportError:
+    from . import shared_cache
 
 DB_PATH = None
+# lookup counters (hits/misses) since process start
+stats = {"hits": 0, "misses": 0}
+result_stats = {"hits": 0, "misses": 0}
+# cross-process tier in front of price_cache (SHARED_CACHE=mmap), None when off
+shared = None
 
 def init(db_path="cache.db"):
-    global DB_PATH
+    global DB_PATH, shared
     DB_PATH = db_path
+    shared = shared_cache.open_from_env(db_path)
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
+    if shared is not None:
+        # several workers write the same file: WAL lets their reads proceed during a write
+        c.execute("PRAGMA journal_mode=WAL")
     c.execute("""
     CREATE TABLE IF NOT EXISTS price_cache (
         origin TEXT,
@@ -22,30 +42,171 @@ def init(db_path="cache.db"):
         PRIMARY KEY(origin, destination, date)
     )
     """)
+    # whole /find-route responses keyed by normalized payload hash; result_cache_legs lists the legs
+    # each response was computed from, so refreshing any of them drops the response
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS result_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT,
+        expires_at INTEGER
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS result_cache_legs (
+        key TEXT,
+        origin TEXT,
+        destination TEXT,
+        date TEXT
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS result_cache_legs_leg ON result_cache_legs(origin, destination, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS result_cache_legs_key ON result_cache_legs(key)")
     conn.commit()
     conn.close()
 
-def get(origin: str, destination: str, date: str) -> Optional[dict]:
+def warm():
+    """Opens the database once and reads the schema and a page of each table (startup warm-up)."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        for table in ("price_cache", "result_cache", "result_cache_legs"):
+            conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchall()
+    finally:
+        conn.close()
+
+def _writer():
+    """
+    Context for a cache write. With the shared tier on, the writer holds its lock: one writer per
+    host at a time, for SQLite and the shared table alike (see shared_cache.py).
+    """
+    return shared.writing() if shared is not None else contextlib.nullcontext()
+
+def get(origin: str, destination: str, date: str, max_age: Optional[int] = None) -> Optional[dict]:
+    """The cached response, or None; rows older than max_age seconds count as missing in both tiers."""
+    t0 = time.perf_counter()
+    if shared is not None:
+        value = shared.get(origin, destination, date, max_age)
+        if value is not shared_cache.MISSING:
+            timings = current_timings()
+            if timings is not None:
+                timings.add_cache(time.perf_counter() - t0, True)
+            stats["hits"] += 1
+            return value
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("SELECT response FROM price_cache WHERE origin=? AND destination=? AND date=?", (origin, destination, date))
+    sql = "SELECT response, fetched_at FROM price_cache WHERE origin=? AND destination=? AND date=?"
+    args = [origin, destination, date]
+    if max_age is not None:
+        sql += " AND fetched_at >= ?"
+        args.append(int(time.time()) - max_age)
+    c.execute(sql, args)
     row = c.fetchone()
     conn.close()
+    timings = current_timings()
+    if timings is not None:
+        timings.add_cache(time.perf_counter() - t0, row is not None)
     if not row:
+        stats["misses"] += 1
         return None
-    return json.loads(row[0])
+    stats["hits"] += 1
+    value = json.loads(row[0])
+    if shared is not None:
+        # another worker may have written it; later reads on this host skip SQLite. The copy keeps
+        # the row's own fetched_at and never replaces a quote written since
+        shared.put(origin, destination, date, value, row[1] or 0, if_newer=True)
+    return value
+
+def get_range(origin: str, destination: str, date_from: str, date_to: str, max_age: Optional[int] = None) -> Dict[str, Any]:
+    """date -> cached response for every row between date_from and date_to (inclusive, YYYY-MM-DD); rows older than max_age seconds are skipped."""
+    t0 = time.perf_counter()
+    min_fetched = int(time.time()) - max_age if max_age is not None else None
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    sql = "SELECT date, response FROM price_cache WHERE origin=? AND destination=? AND date BETWEEN ? AND ?"
+    args = [origin, destination, date_from, date_to]
+    if min_fetched is not None:
+        sql += " AND fetched_at >= ?"
+        args.append(min_fetched)
+    c.execute(sql + " ORDER BY date", args)
+    rows = c.fetchall()
+    conn.close()
+    timings = current_timings()
+    if timings is not None:
+        timings.add_cache(time.perf_counter() - t0, bool(rows))
+    return {date: json.loads(response) for date, response in rows}
 
 def set_cache(origin: str, destination: str, date: str, data: dict, fetched_at: int = None):
+    with _writer():
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+        c.execute("INSERT OR REPLACE INTO price_cache(origin,destination,date,response,fetched_at) VALUES (?,?,?,?,?)",
+                  (origin, destination, date, json.dumps(data), fetched_at or 0))
+        # a refreshed leg invalidates every cached search result built from it (origin may carry a provider prefix)
+        _drop_results(c, "DELETE FROM {table} WHERE key IN (SELECT key FROM result_cache_legs WHERE origin=? AND destination=? AND date=?)",
+                      (origin.split("|")[-1], destination, date))
+        conn.commit()
+        conn.close()
+        if shared is not None:
+            shared.put(origin, destination, date, data, fetched_at or 0)
+
+def _drop_results(c, sql: str, args: tuple):
+    for table in ("result_cache", "result_cache_legs"):
+        c.execute(sql.format(table=table), args)
+
+def legs_fetched_at(provider: str, legs) -> Optional[int]:
+    """Oldest fetched_at among provider's cached (origin, destination, date) legs; None if none are cached."""
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO price_cache(origin,destination,date,response,fetched_at) VALUES (?,?,?,?,?)",
-              (origin, destination, date, json.dumps(data), fetched_at or 0))
-    conn.commit()
+    oldest = None
+    for origin, destination, date in legs:
+        c.execute("SELECT fetched_at FROM price_cache WHERE origin=? AND destination=? AND date=?",
+                  (f"{provider}|{origin}", destination, date))
+        row = c.fetchone()
+        if row and row[0] is not None:
+            oldest = row[0] if oldest is None else min(oldest, row[0])
     conn.close()
+    return oldest
 
-def clear_all():
+def get_result(key: str) -> Optional[dict]:
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("DELETE FROM price_cache")
-    conn.commit()
+    c.execute("SELECT response FROM result_cache WHERE key=? AND expires_at > ?", (key, int(time.time())))
+    row = c.fetchone()
     conn.close()
+    if not row:
+        result_stats["misses"] += 1
+        return None
+    result_stats["hits"] += 1
+    return json.loads(row[0])
+
+def _jsonable(obj):
+    # slotted result objects (leg_quote.LegQuote) provide their own dict form
+    if hasattr(obj, "as_dict"):
+        return obj.as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def set_result(key: str, data: dict, legs, expires_at: int):
+    response = json.dumps(data, default=_jsonable)
+    with _writer():
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+        _drop_results(c, "DELETE FROM {table} WHERE key=?", (key,))
+        # expired responses are pruned on write
+        c.execute("DELETE FROM result_cache_legs WHERE key IN (SELECT key FROM result_cache WHERE expires_at <= ?)", (int(time.time()),))
+        c.execute("DELETE FROM result_cache WHERE expires_at <= ?", (int(time.time()),))
+        c.execute("INSERT INTO result_cache(key,response,expires_at) VALUES (?,?,?)", (key, response, expires_at))
+        c.executemany("INSERT INTO result_cache_legs(key,origin,destination,date) VALUES (?,?,?,?)",
+                      [(key,) + tuple(leg) for leg in legs])
+        conn.commit()
+        conn.close()
+
+def clear_all():
+    with _writer():
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+        c.execute("DELETE FROM price_cache")
+        c.execute("DELETE FROM result_cache")
+        c.execute("DELETE FROM result_cache_legs")
+        conn.commit()
+        conn.close()
+        if shared is not None:
+            shared.clear()
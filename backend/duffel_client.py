@@ -3,8 +3,18 @@ import logging
 import requests
 from typing import Optional, Dict, Any
 
-from .config import settings
-from .cache_db import get as cache_get, set_cache as cache_set
+try:
+    from config import settings
+    from cache_db import get as cache_get, set_cache as cache_set
+    from json_stream import JSONArrayStream, cheapest_items
+    from singleflight import single_flight
+    from http_retry import request_with_retry
+except ImportError:  # imported as backend.duffel_client
+    from .config import settings
+    from .cache_db import get as cache_get, set_cache as cache_set
+    from .json_stream import JSONArrayStream, cheapest_items
+    from .singleflight import single_flight
+    from .http_retry import request_with_retry
 
 logger = logging.getLogger("gelidonia")
 
@@ -53,6 +63,14 @@ def _build_offer_request_body(origin: str, destination: str, date: str) -> Dict[
     }
 
 
+def _offer_amount(offer: Any) -> Optional[float]:
+    try:
+        return float(offer.get("total_amount"))
+    except Exception:
+        return None
+
+
+@single_flight("DUF")
 def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[Dict[str, Any]]:
     """
     Creates a Duffel offer request and returns the cheapest offer summary for a given date.
@@ -75,7 +93,7 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
     try:
         # Create offer request
         body = _build_offer_request_body(origin, destination, date)
-        logger.info("Duffel POST offer_request %s-%s %s body=%s", origin, destination, date, body)
+        logger.debug("Duffel POST offer_request %s-%s %s body=%s", origin, destination, date, body)
         candidate_versions = []
         # Try without version first (let API default), then env, then known versions
         candidate_versions = [None]
@@ -87,7 +105,8 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
         last_error_text = None
         for ver in candidate_versions:
             logger.info("Duffel trying version header=%s", (ver if ver is not None else "<none>"))
-            resp = requests.post(API_BASE, json=body, headers=_auth_headers(ver), timeout=25)
+            resp = request_with_retry("POST", API_BASE, label=f"Duffel offer_request {origin}-{destination} {date}",
+                                      json=body, headers=_auth_headers(ver), timeout=25, stream=True)
             if resp.status_code in (200, 201):
                 break
             if resp.status_code == 401:
@@ -108,32 +127,33 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
             logger.error("Duffel couldn't find a supported API version. Last error: %s", (last_error_text[:300] if last_error_text else None))
             return None
 
-        offer_request = resp.json()
-        logger.info("Duffel offer_request response code=%s size=%s preview=%s", resp.status_code, len(resp.text or ""), str(offer_request)[:240])
-        # Duffel returns offers embedded under data.offers or requires follow-up GET
-        # Some responses include "data", {"offers": [...]} directly. Handle both.
-        offers = None
-        if isinstance(offer_request, dict):
-            # Newer API: POST returns 201 and immediate offers at data.offers
-            data_obj = offer_request.get("data") or offer_request
-            offers = data_obj.get("offers") if isinstance(data_obj, dict) else None
+        # Offers are embedded at data.offers; stream them and keep only the cheapest.
+        # Older API versions return just the offer request (data.id) and need a follow-up GET.
+        stream = JSONArrayStream.from_response(resp, ("data", "offers"), capture=[("data", "id")])
+        try:
+            offers = cheapest_items(stream, _offer_amount)
+        finally:
+            resp.close()
+        logger.info("Duffel offer_request response code=%s offers=%d", resp.status_code, stream.count)
 
         # If no offers present, try follow-up GET using offer_request id
         if not offers:
-            req_id = None
-            try:
-                req_id = offer_request["data"]["id"]
-            except Exception:
-                req_id = None
+            req_id = stream.captured.get(("data", "id"))
             if req_id:
                 time.sleep(0.6)
                 get_url = f"{API_BASE}/{req_id}"
                 logger.info("Duffel GET offer_request %s", get_url)
-                get_resp = requests.get(get_url, headers=_auth_headers(), timeout=25)
+                get_resp = request_with_retry("GET", get_url, label="Duffel GET offer_request",
+                                              headers=_auth_headers(), timeout=25, stream=True)
                 if get_resp.status_code in (200, 201):
-                    get_json = get_resp.json()
-                    offers = (get_json.get("data") or {}).get("offers")
-                    logger.info("Duffel GET offers count=%s preview=%s", (len(offers) if offers else 0), str(offers[:1])[:240] if offers else None)
+                    get_stream = JSONArrayStream.from_response(get_resp, ("data", "offers"))
+                    try:
+                        offers = cheapest_items(get_stream, _offer_amount)
+                    finally:
+                        get_resp.close()
+                    logger.info("Duffel GET offers count=%s", get_stream.count)
+                else:
+                    get_resp.close()
 
         if not offers:
             logger.info("Duffel no offers for %s-%s %s", origin, destination, date)
@@ -210,6 +230,9 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
     except requests.RequestException as e:
         logger.error("Duffel network error for %s-%s %s: %s", origin, destination, date, e)
         return None
+    except ValueError as e:
+        logger.error("Duffel invalid JSON for %s-%s %s: %s", origin, destination, date, e)
+        return None
 
 
 def probe_versions() -> Dict[str, Any]:
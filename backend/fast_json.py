@@ -0,0 +1,50 @@
+# fast_json.py
+# Response serialization for the search endpoints. Results are encoded with orjson when it is
+# installed (standard json otherwise) straight into a Response, skipping FastAPI's generic
+# jsonable_encoder pass, and gzip-compressed when the client accepts it and the body is larger
+# than GZIP_MIN_BYTES (default 1024).
+
+import gzip
+import json
+import os
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    as_dict = getattr(obj, "as_dict", None)
+    if callable(as_dict):
+        return as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        # dataclasses (LegQuote) are native to orjson; non-str keys are not, so they are stringified
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _gzip_min_bytes() -> int:
+    try:
+        return int(os.getenv("GZIP_MIN_BYTES", "1024"))
+    except (TypeError, ValueError):
+        return 1024
+
+
+def json_response(content: Any, request: Optional[Request] = None, status_code: int = 200,
+                  headers: Optional[dict] = None) -> Response:
+    body = dumps(content)
+    headers = dict(headers or {})
+    accepts_gzip = request is not None and "gzip" in request.headers.get("accept-encoding", "").lower()
+    if accepts_gzip and len(body) >= _gzip_min_bytes():
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
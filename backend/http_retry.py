@@ -0,0 +1,220 @@
+# http_retry.py
+# Shared retry policy for the pricing clients.
+# Transient upstream failures (429 throttling, 5xx, connection errors) are retried with jittered
+# exponential backoff. A Retry-After header is honoured, every request has an attempt budget, and
+# no sleep runs past the active deadline (see deadline_scope), so a short throttle costs a delay
+# instead of a failed search while a long one still fails fast. A cancel_scope lets a caller
+# (e.g. a cancelled search job) stop pending attempts and backoff sleeps early.
+
+import contextlib
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+try:
+    from provider_replay import replay, provider_for
+    from search_timings import current as current_timings
+    import metrics
+except ImportError:  # imported as backend.http_retry by the package-relative clients
+    from .provider_replay import replay, provider_for
+    from .search_timings import current as current_timings
+    from . import metrics
+
+logger = logging.getLogger("gelidonia")
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Absolute time.monotonic() after which no more retries are started (None = unbounded)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("retry_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Bounds retries made by the current search: backoff never sleeps past `seconds` from now."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    new_deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(new_deadline if current is None else min(current, new_deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the active deadline, or None when there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class SearchCancelled(Exception):
+    """Raised by upstream calls made inside a cancel_scope once its event is set."""
+    # single-flight waiters from other searches re-run the call instead of sharing this error
+    leader_only = True
+
+
+_cancel: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("retry_cancel", default=None)
+
+
+@contextlib.contextmanager
+def cancel_scope(event: threading.Event):
+    """Upstream calls made by the current search raise SearchCancelled once event is set."""
+    token = _cancel.set(event)
+    try:
+        yield
+    finally:
+        _cancel.reset(token)
+
+
+def check_cancelled() -> None:
+    event = _cancel.get()
+    if event is not None and event.is_set():
+        raise SearchCancelled()
+
+
+def _sleep(seconds: float) -> None:
+    """time.sleep that wakes up (and raises SearchCancelled) as soon as the active cancel_scope is cancelled."""
+    event = _cancel.get()
+    if event is None:
+        time.sleep(seconds)
+    elif event.wait(seconds):
+        raise SearchCancelled()
+
+
+class RetryPolicy:
+    """Jittered exponential backoff: attempt n waits uniform(0, min(max_delay, base_delay * 2**n))."""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None):
+        # defaults are configurable via env (RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SEC, RETRY_MAX_DELAY_SEC)
+        if max_attempts is None:
+            max_attempts = int(_env_float("RETRY_MAX_ATTEMPTS", 3))
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay if base_delay is not None else _env_float("RETRY_BASE_DELAY_SEC", 0.5)
+        self.max_delay = max_delay if max_delay is not None else _env_float("RETRY_MAX_DELAY_SEC", 8.0)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def delay_for(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """
+        Sleep before the next attempt, or None if the attempt budget or deadline is exhausted.
+        A Retry-After longer than max_delay also gives up: that throttle isn't transient.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if retry_after is not None and retry_after > self.max_delay:
+            return None
+        delay = retry_after if retry_after is not None else self.backoff(attempt)
+        left = remaining()
+        if left is not None and delay >= left:
+            return None
+        return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds: either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(fn: Callable[[], Any], classify: Callable[[Any, Optional[BaseException]], Tuple[bool, Optional[float]]],
+                    label: str, policy: RetryPolicy = None) -> Any:
+    """
+    Calls fn() until classify(result, error) says not to retry or the budget runs out.
+    classify returns (retry, retry_after_seconds). The last result is returned, or the last error re-raised.
+    """
+    policy = policy or RetryPolicy()
+    attempt = 0
+    while True:
+        check_cancelled()
+        result, error = None, None
+        try:
+            result = fn()
+        except Exception as e:
+            error = e
+        retry, retry_after = classify(result, error)
+        if not retry:
+            break
+        delay = policy.delay_for(attempt, retry_after)
+        if delay is None:
+            logger.warning("%s: giving up after %d attempt(s)", label, attempt + 1)
+            break
+        logger.info("%s: transient failure (%s); retry %d in %.2fs", label,
+                    error or getattr(result, "status_code", result), attempt + 1, delay)
+        if result is not None and hasattr(result, "close"):
+            result.close()
+        _sleep(delay)
+        attempt += 1
+    if error is not None:
+        raise error
+    return result
+
+
+def _classify_response(resp: Optional[requests.Response], error: Optional[BaseException]) -> Tuple[bool, Optional[float]]:
+    if error is not None:
+        return isinstance(error, (requests.ConnectionError, requests.Timeout)), None
+    if resp.status_code in RETRY_STATUSES:
+        return True, parse_retry_after(resp.headers.get("Retry-After"))
+    return False, None
+
+
+def observed_call(provider: str, endpoint: str, fn: Callable[[], Any]) -> Any:
+    """Runs one upstream attempt, recording its latency (to response headers when streaming) and status."""
+    t0 = time.perf_counter()
+    status = "error"
+    try:
+        result = fn()
+        status = getattr(result, "status_code", 200)
+        return result
+    except Exception as e:
+        status = getattr(getattr(e, "response", None), "status_code", None) or "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.UPSTREAM_SECONDS.observe(elapsed, provider, endpoint)
+        metrics.UPSTREAM_RESPONSES.inc(provider, endpoint, str(status))
+        timings = current_timings()
+        if timings is not None:
+            timings.add_upstream(provider, elapsed)
+
+
+def request_with_retry(method: str, url: str, label: str = None, policy: RetryPolicy = None, **kwargs) -> requests.Response:
+    """
+    requests.request() under the shared retry policy; returns the final response (possibly still a 429).
+    Goes through provider_replay so PROVIDER_MODE=record/replay applies to every HTTP client.
+    """
+    provider = provider_for(url)
+    endpoint = metrics.endpoint_label(urlsplit(url).path)
+    resp = call_with_retry(lambda: observed_call(provider, endpoint, lambda: replay.send(method, url, **kwargs)),
+                           _classify_response, label or f"{method} {url}", policy)
+    if resp.status_code == 429:
+        metrics.UPSTREAM_RATE_LIMITED.inc(provider)
+    return resp
@@ -0,0 +1,176 @@
+# json_stream.py
+# Incremental decoding of large upstream JSON bodies.
+# Search responses (limit=50 offers, Duffel return_offers) can be megabytes; instead of
+# materializing the whole document with resp.json(), JSONArrayStream reads the body chunk by
+# chunk and yields the elements of one array (e.g. "data" or "data.offers") one at a time,
+# so callers only keep what they extract from each offer.
+
+import codecs
+import heapq
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_WS = re.compile(r"[ \t\n\r]*")
+_TOKEN = re.compile(
+    r'"(?:[^"\\]|\\.)*"|[{}\[\]:,]|-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null'
+)
+_DELIMS = " \t\n\r,]}"
+_decoder = json.JSONDecoder()
+
+
+class JSONArrayStream:
+    """
+    Iterates the elements of the array found at `path` (a tuple of object keys) in a JSON body
+    given as byte chunks. Scalars at `capture` paths are recorded in `captured` as they stream by.
+    After iteration `found` tells whether the array existed and `count` how many elements it had.
+    Only the unconsumed tail of the body and the current element are held in memory.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], path: Sequence[str], capture: Sequence[Sequence[str]] = ()):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.path = tuple(path)
+        self.capture = {tuple(p) for p in capture}
+        self.captured: Dict[Tuple[str, ...], Any] = {}
+        self.found = False
+        self.count = 0
+
+    @classmethod
+    def from_response(cls, resp, path: Sequence[str], capture: Sequence[Sequence[str]] = (),
+                      chunk_size: int = CHUNK_SIZE) -> "JSONArrayStream":
+        """Streams a requests.Response opened with stream=True."""
+        return cls(resp.iter_content(chunk_size=chunk_size), path, capture)
+
+    # ---------- buffer ----------
+    def _fill(self) -> bool:
+        """Appends the next non-empty chunk, dropping consumed text. False once the body is exhausted."""
+        if self._eof:
+            return False
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self._buf += text
+                return True
+        self._buf += self._utf8.decode(b"", final=True)
+        self._eof = True
+        return False
+
+    def _delimited(self, end: int) -> bool:
+        return end < len(self._buf) and self._buf[end] in _DELIMS
+
+    def _skip_ws(self) -> bool:
+        """Moves past whitespace; False if the body ends first."""
+        while True:
+            self._pos = _WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return True
+            if not self._fill():
+                return False
+
+    def _next_token(self) -> Optional[str]:
+        while True:
+            if not self._skip_ws():
+                return None
+            m = _TOKEN.match(self._buf, self._pos)
+            # a number not yet followed by a delimiter may continue in the next chunk
+            truncated = m is not None and m.group()[0] in "-0123456789" and not self._delimited(m.end())
+            if m is not None and (not truncated or self._eof):
+                self._pos = m.end()
+                return m.group()
+            if not self._fill():
+                if m is not None:
+                    self._pos = m.end()
+                    return m.group()
+                raise ValueError(f"Invalid JSON near: {self._buf[self._pos:self._pos + 40]!r}")
+
+    # ---------- walking ----------
+    def _items(self) -> Iterator[Any]:
+        """Yields elements of the array whose '[' was just consumed, leaving the stream after its ']'."""
+        while True:
+            if not self._skip_ws():
+                raise ValueError("Unexpected end of JSON inside array")
+            ch = self._buf[self._pos]
+            if ch == "]":
+                self._pos += 1
+                return
+            if ch == ",":
+                self._pos += 1
+                continue
+            try:
+                item, end = _decoder.raw_decode(self._buf, self._pos)
+                complete = self._delimited(end) or self._eof
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                complete = False
+            if not complete:
+                # read until the pending element has at least doubled, then retry
+                want = 2 * (len(self._buf) - self._pos)
+                while self._fill() and len(self._buf) - self._pos < want:
+                    pass
+                continue
+            self._pos = end
+            self.count += 1
+            yield item
+
+    def __iter__(self) -> Iterator[Any]:
+        # frames: [kind ("o"/"a"), current key, expecting a key]
+        stack: list = []
+        while True:
+            tok = self._next_token()
+            if tok is None:
+                return
+            c = tok[0]
+            top = stack[-1] if stack else None
+            if top is not None and top[0] == "o" and top[2]:
+                if c == '"':
+                    top[1] = json.loads(tok)
+                    top[2] = False
+                    continue
+                if c != "}":
+                    raise ValueError(f"Expected object key, got {tok[:40]!r}")
+            if c == ":":
+                continue
+            if c == ",":
+                if top is not None and top[0] == "o":
+                    top[2] = True
+                continue
+            if c in "}]":
+                stack.pop()
+                if not stack:
+                    return
+                continue
+            value_path = None
+            if all(frame[0] == "o" for frame in stack):
+                value_path = tuple(frame[1] for frame in stack)
+            if c == "{":
+                stack.append(["o", None, True])
+            elif c == "[":
+                if value_path == self.path:
+                    self.found = True
+                    yield from self._items()
+                else:
+                    stack.append(["a", None, False])
+            elif value_path in self.capture:
+                self.captured[value_path] = json.loads(tok)
+
+
+def cheapest_items(items: Iterable[Any], price: Callable[[Any], Optional[float]], keep: int = 1) -> List[Any]:
+    """
+    The `keep` lowest-priced items, cheapest first (ties keep input order); unpriced items are dropped.
+    Consumes `items` lazily and holds at most `keep` of them at a time.
+    """
+    def priced():
+        for idx, item in enumerate(items):
+            value = price(item)
+            if value is not None:
+                yield value, idx, item
+    return [item for _, _, item in heapq.nsmallest(keep, priced())]
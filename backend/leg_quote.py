@@ -0,0 +1,69 @@
+# leg_quote.py
+# Leg details of scored routes. A search builds one LegQuote per priced leg and every candidate,
+# alternative and Pareto route using that (origin, destination, date) leg holds the same object,
+# instead of a 14-key dict copied into each of them. LegQuote is a slotted dataclass: it serializes
+# with the same keys as the old dicts (fast_json, or FastAPI's encoder via dataclasses.asdict).
+# compact_result() rewrites a response so each leg appears once and routes refer to it by index.
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class LegQuote:
+    origin: str
+    destination: str
+    departure_date: str  # istenen tarih
+    actual_departure_date: str  # gerçek tarih
+    min_price: float
+    airline: Optional[str] = None
+    duration: Optional[str] = None
+    flight_number: Optional[str] = None
+    currency: Optional[str] = None
+    departure_time: Optional[str] = None
+    flight_link: Optional[str] = None
+    stops: Optional[int] = None
+    origin_airport: Optional[str] = None  # differs from origin for metro codes / airport lists
+    destination_airport: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def as_row(self) -> List[Any]:
+        return [getattr(self, name) for name in FIELDS]
+
+
+FIELDS = tuple(f.name for f in fields(LegQuote))
+
+
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compact response shape: "leg_fields" names the columns of "legs", one row per distinct leg,
+    and every route's leg_details becomes a list of row indexes. The input is not modified
+    (session memos share its routes).
+    """
+    rows: List[List[Any]] = []
+    index: Dict[Any, int] = {}
+
+    def ref(leg: Any) -> int:
+        # shared LegQuote objects dedupe by identity; dicts (e.g. from the result cache) by content
+        row = leg.as_row() if isinstance(leg, LegQuote) else [leg.get(name) for name in FIELDS]
+        key = id(leg) if isinstance(leg, LegQuote) else tuple(row)
+        if key not in index:
+            index[key] = len(rows)
+            rows.append(row)
+        return index[key]
+
+    def route(r: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not r:
+            return r
+        return dict(r, leg_details=[ref(leg) for leg in r.get("leg_details", ())])
+
+    out = dict(result)
+    out["best_route"] = route(result.get("best_route"))
+    out["alternatives"] = [route(r) for r in result.get("alternatives", ())]
+    if result.get("pareto"):
+        out["pareto"] = dict(result["pareto"], frontier=[route(r) for r in result["pareto"]["frontier"]])
+    out["leg_fields"] = list(FIELDS)
+    out["legs"] = rows
+    return out
@@ -0,0 +1,92 @@
+# log_setup.py
+# Non-blocking logging for the API process.
+# Request threads only enqueue log records; a background QueueListener thread formats them and
+# writes to stderr and server.log, so slow disks and string formatting stay off the search hot path.
+# Per-leg chatter goes through the "gelidonia.legs" child logger, which is sampled
+# (LEG_LOG_SAMPLE_RATE, default 0.1; warnings and errors always pass), and payload dumps are
+# DEBUG-only and wrapped in Preview so they are never stringified unless actually emitted.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Optional
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+leg_logger = logging.getLogger("gelidonia.legs")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted; the listener's handlers do the %-formatting on their thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """Passes a `rate` fraction of records below WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class Preview:
+    """Lazy, truncated str() of a payload for log arguments: only computed if the record is emitted."""
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj: Any, limit: int = 240):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self) -> str:
+        return str(self.obj)[:self.limit]
+
+
+def configure(log_path: str, level: Optional[str] = None, leg_sample_rate: Optional[float] = None) -> logging.handlers.QueueListener:
+    """
+    Routes the root logger through a queue to stderr and (gelidonia records only) log_path.
+    LOG_LEVEL / LEG_LOG_SAMPLE_RATE env vars provide the defaults. Safe to call more than once.
+    """
+    global _listener
+    if leg_sample_rate is None:
+        try:
+            leg_sample_rate = float(os.getenv("LEG_LOG_SAMPLE_RATE", "0.1"))
+        except ValueError:
+            leg_sample_rate = 0.1
+    leg_logger.filters = [SampleFilter(leg_sample_rate)]
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(formatter)
+    handlers.append(stream)
+    try:
+        fh = logging.FileHandler(log_path, encoding="utf-8")
+        fh.setFormatter(formatter)
+        fh.addFilter(logging.Filter("gelidonia"))
+        handlers.append(fh)
+    except Exception:
+        # file logging is best-effort
+        pass
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
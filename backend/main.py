@@ -1,34 +1,61 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+import contextlib
 import logging
+import time
 import os as _os
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime, timedelta
+import hashlib
 import itertools
+import json
+import math
 import os
+import re
 from dotenv import load_dotenv
 from config import settings
-from tequila_client import fetch_price_for_date
 from cache_db import init as init_cache, get as cache_get, set_cache as cache_set, clear_all
+from http_retry import deadline_scope
+from singleflight import inflight
+import cache_db
+import metrics
+from log_setup import Preview, configure as configure_logging, leg_logger
+import metro_areas
+from fast_json import json_response
+from leg_quote import LegQuote, compact_result
+from pareto import OBJECTIVES, ParetoFrontier, knee
+import profiling
+import providers
+from search_timings import current as current_timings, timings_scope
+from search_jobs import JobQueue, JobQueueFull
+from search_sessions import sessions as search_sessions
 
 load_dotenv()
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("gelidonia")
-try:
-    _log_path = _os.path.join(_os.path.dirname(__file__), "server.log")
-    _fh = logging.FileHandler(_log_path, encoding="utf-8")
-    _fh.setLevel(logging.INFO)
-    _fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    logger.addHandler(_fh)
-except Exception:
-    # file logging is best-effort
-    pass
 
-init_cache(settings.CACHE_DB)
 
-app = FastAPI(title="Gelidonia Backend - Kiwi Tequila")
+def startup() -> None:
+    """
+    Process setup kept out of import: logging (LOG_FILE, default server.log next to main.py) and the
+    SQLite cache (settings.CACHE_DB). Runs from the lifespan hook; scripts driving main directly call it.
+    """
+    configure_logging(_os.getenv("LOG_FILE") or _os.path.join(_os.path.dirname(__file__), "server.log"))
+    init_cache(settings.CACHE_DB)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup()
+    # Warm-up runs in the background so the worker accepts connections immediately; see /ready
+    if _os.getenv("WARMUP", "true").lower() not in ("0", "false", "no"):
+        providers.start_warm_up(cache_warm=cache_db.warm)
+    yield
+
+
+app = FastAPI(title="Gelidonia Backend - Kiwi Tequila", lifespan=lifespan)
 
 # CORS middleware for web interface
 app.add_middleware(
@@ -39,16 +66,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency for the API endpoints (not /metrics itself)
+_TIMED_PATHS = {"/find-route", "/find-route/batch", "/jobs/find-route", "/price-calendar", "/health", "/cache/clear", "/tequila/health"}
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    path = request.url.path
+    if path not in _TIMED_PATHS:
+        return await call_next(request)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - t0, path, str(status))
+
+def _shared_stat(name: str) -> int:
+    return cache_db.shared.stats[name] if cache_db.shared is not None else 0
+
+metrics.REGISTRY.collector(
+    "gelidonia_cache_requests_total", "counter",
+    "Cache lookups per tier: shared (cross-worker mmap table, SHARED_CACHE=mmap), sqlite price_cache, "
+    "inflight (served by a concurrent identical upstream call), and result (whole /find-route responses).",
+    ("tier", "result"),
+    lambda: {
+        ("shared", "hit"): _shared_stat("hits"),
+        ("shared", "miss"): _shared_stat("misses"),
+        ("sqlite", "hit"): cache_db.stats["hits"] - _shared_stat("hits"),
+        ("sqlite", "miss"): cache_db.stats["misses"],
+        ("inflight", "hit"): inflight.stats["shared"],
+        ("inflight", "miss"): inflight.stats["leaders"],
+        ("result", "hit"): cache_db.result_stats["hits"],
+        ("result", "miss"): cache_db.result_stats["misses"],
+    },
+)
+
 # ---------- Helper models ----------
 class RequestPayload(BaseModel):
     start_range_start: str  # YYYY-MM-DD
     start_range_end: str    # YYYY-MM-DD
     trip_length_days: int
-    start_airport: str      # IATA code, e.g., IST
+    start_airport: str      # IATA code, e.g., IST; also a metro code (LON) or airport list ("LHR,STN")
     end_airport: Optional[str] = None  # if None, same as start
-    cities: List[str]       # list of cities as IATA codes to visit (without start)
+    cities: List[str]       # list of cities as IATA codes to visit (without start); metro codes / lists allowed
     equal_days: bool = True # if true, distribute days equally across cities; else allow flexible
     max_candidates: Optional[int] = 30  # cap number of start dates to try (safety)
+    include_timings: bool = False  # add a "timings" breakdown (cache, providers, legs, slowest legs) to the response
+    compact: bool = False  # compact response: every leg once in "legs", routes refer to legs by index
+    session_id: Optional[str] = None  # from a previous response: reuse that search's priced legs (see search_sessions.py)
+    strategy: Optional[str] = None  # "sample" (evenly spaced, max_candidates) or "adaptive"; default SEARCH_STRATEGY env
+    leg_budget: Optional[int] = None  # adaptive: max legs priced upstream; default ADAPTIVE_LEG_BUDGET env
+    objectives: Optional[List[str]] = None  # e.g. ["price", "duration"] (+ "stops"): also return the Pareto frontier
+    # itinerary constraints; they shrink the visit orders / start dates before anything is priced
+    first_city: Optional[str] = None  # visit this city first
+    last_city: Optional[str] = None   # visit this city last
+    city_dates: Optional[Dict[str, str]] = None  # {"BCN": "2025-06-10"}: be in BCN on that date
+    exclude_airlines: Optional[List[str]] = None  # IATA carrier codes; legs are priced without offers they fly
+
+
+class BatchRequestPayload(BaseModel):
+    payloads: List[RequestPayload]
 
 
 # ---------- Utility ----------
@@ -102,21 +181,345 @@ def extract_min_price_from_tp_response(tp_resp):
         return None
     return min(prices)
 
+def build_leg_dates(start_dt: datetime, days_per_city: List[int]) -> List[str]:
+    """
+    Departure date of every leg for a trip starting on start_dt:
+    leg 0 leaves on start_dt, leg i+1 leaves after staying days_per_city[i] days in city i,
+    and the return leg leaves start_dt + sum(days_per_city).
+    """
+    current_date = start_dt
+    leg_departure_dates = [current_date.strftime("%Y-%m-%d")]
+    for days in days_per_city:
+        current_date = current_date + timedelta(days=days)
+        leg_departure_dates.append(current_date.strftime("%Y-%m-%d"))
+    return leg_departure_dates
+
+# up to this many cities every visit order is tried; beyond it only the first few permutations
+FULL_PERMUTATION_CITIES = 3
+
+
+def plan_candidates(payload: RequestPayload, feasible_starts: List[datetime]) -> List[dict]:
+    """
+    Enumerates every (start date, visit order) candidate of a search without pricing anything.
+    Each candidate carries its route and the (origin, destination, date) legs it needs.
+    """
+    n_cities = len(payload.cities)
+    candidates = []
+    for start_dt in feasible_starts:
+        # compute days per city
+        days_per_city = build_days_distribution(payload.trip_length_days, n_cities, payload.equal_days)
+        leg_departure_dates = build_leg_dates(start_dt, days_per_city)
+        allowed = city_date_positions(payload, leg_departure_dates)
+        if allowed is None:
+            continue
+        # Limit permutations if city count is large to avoid explosion (constraints are applied first)
+        perms_iter = visit_orders(payload, allowed)
+        if n_cities > FULL_PERMUTATION_CITIES:
+            perms_iter = itertools.islice(perms_iter, 6)
+        leg_logger.info("Evaluating candidate start=%s days_per_city=%s", start_dt, days_per_city)
+        for perm in perms_iter:
+            # build route: start -> perm[0] -> perm[1] -> ... -> perm[-1] -> end
+            route = [payload.start_airport] + list(perm) + [payload.end_airport]
+            leg_logger.debug("Route=%s legs=%s", route, leg_departure_dates)
+            candidates.append({
+                "start_date": start_dt.strftime("%Y-%m-%d"),
+                "days_per_city": days_per_city,
+                "route": route,
+                "legs": [(route[i], route[i+1], leg_departure_dates[i]) for i in range(len(route)-1)],
+            })
+    return candidates
+
+def visit_orders(payload: RequestPayload, allowed: Optional[Dict[str, set]] = None) -> Iterator[tuple]:
+    """
+    Permutations of payload.cities that respect first_city / last_city, in itertools.permutations order.
+    allowed (city -> positions in the visit order, see city_date_positions) keeps only the orders that
+    put each of those cities at one of its positions. They are built position by position and a
+    prefix is extended only while the cities still unplaced can reach their positions, so no time
+    goes into orders that would be dropped (8 cities have 40320 of them).
+    """
+    middle = list(payload.cities)
+
+    def take(city: Optional[str]) -> List[str]:
+        upper = [c.strip().upper() for c in middle]
+        city = (city or "").strip().upper()
+        return [middle.pop(upper.index(city))] if city in upper else []
+
+    head = take(payload.first_city)
+    tail = take(payload.last_city)
+    if not allowed:
+        for perm in itertools.permutations(middle):
+            yield tuple(head + list(perm) + tail)
+        return
+
+    n = len(payload.cities)
+    offset = len(head)
+    names = [c.strip().upper() for c in middle]
+    fixed = {(head[0].strip().upper(), 0)} if head else set()
+    if tail:
+        fixed.add((tail[0].strip().upper(), n - 1))
+    unmet = frozenset(city for city, positions in allowed.items()
+                      if not any(name == city and pos in positions for name, pos in fixed))
+    used = [False] * len(middle)
+    order: List[int] = []
+
+    def reachable(k: int, unmet: frozenset) -> bool:
+        # every unmet city needs an unused copy and its own free position >= offset + k (bipartite matching)
+        match: Dict[int, str] = {}
+
+        def assign(city: str, seen: set) -> bool:
+            for pos in allowed[city]:
+                if offset + k <= pos < offset + len(middle) and pos not in seen:
+                    seen.add(pos)
+                    if pos not in match or assign(match[pos], seen):
+                        match[pos] = city
+                        return True
+            return False
+
+        return all(any(not used[i] and names[i] == city for i in range(len(middle))) and assign(city, set())
+                   for city in unmet)
+
+    def extend(k: int, unmet: frozenset) -> Iterator[tuple]:
+        if k == len(middle):
+            yield tuple(head + [middle[i] for i in order] + tail)
+            return
+        for i in range(len(middle)):
+            if used[i]:
+                continue
+            rest = unmet - {names[i]} if offset + k in allowed.get(names[i], ()) else unmet
+            used[i] = True
+            order.append(i)
+            if reachable(k + 1, rest):
+                yield from extend(k + 1, rest)
+            order.pop()
+            used[i] = False
+
+    if reachable(0, unmet):
+        yield from extend(0, unmet)
+
+
+def city_date_positions(payload: RequestPayload, leg_departure_dates: List[str]) -> Optional[Dict[str, set]]:
+    """
+    city_dates as city -> positions in the visit order that are in that city on its date (arrival day
+    through departure day), for a trip with these leg dates. None when a city can't make its date.
+    """
+    allowed = {}
+    for city, date in (payload.city_dates or {}).items():
+        positions = {i for i in range(len(payload.cities)) if leg_departure_dates[i] <= date <= leg_departure_dates[i + 1]}
+        if not positions:
+            return None
+        city = city.strip().upper()
+        allowed[city] = allowed[city] & positions if city in allowed else positions
+        if not allowed[city]:
+            return None
+    return allowed
+
+
+def check_constraints(payload: RequestPayload) -> None:
+    """Rejects contradictory itinerary constraints and oversized airport lists with HTTPException(400)."""
+    limit = metro_areas.max_airports()
+    for place in [payload.start_airport, payload.end_airport or payload.start_airport, *payload.cities]:
+        if len(metro_areas.airports(place)) > limit:
+            raise HTTPException(status_code=400, detail=f"At most {limit} airports per place, got {place}")
+    cities = [c.strip().upper() for c in payload.cities]
+    first = (payload.first_city or "").strip().upper()
+    last = (payload.last_city or "").strip().upper()
+    for name, city in (("first_city", first), ("last_city", last)):
+        if city and city not in cities:
+            raise HTTPException(status_code=400, detail=f"{name} {city} is not one of the cities")
+    if first and first == last and cities.count(first) < 2 and len(cities) > 1:
+        raise HTTPException(status_code=400, detail="first_city and last_city must differ")
+    for city, date in (payload.city_dates or {}).items():
+        if city.strip().upper() not in cities:
+            raise HTTPException(status_code=400, detail=f"city_dates city {city} is not one of the cities")
+        try:
+            safe_date_parse(date)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid date format in city_dates: {e}")
+
+
+def excluded_airlines(payload: RequestPayload) -> tuple:
+    """
+    payload.exclude_airlines as sorted upper-case codes. The exclusion goes upstream with every leg
+    request, so each leg gets the cheapest offer no excluded carrier flies, priced and cached apart
+    from unrestricted quotes (see tequila_client.cache_provider).
+    """
+    return tuple(sorted({a.strip().upper() for a in payload.exclude_airlines or () if a.strip()}))
+
+
+def build_leg_detail(o: str, dpt: str, dep_date: str, min_price: float, tp_resp) -> LegQuote:
+    # enrich with carrier/duration if available from client
+    if not isinstance(tp_resp, dict):
+        return LegQuote(o, dpt, dep_date, dep_date, min_price, origin_airport=o, destination_airport=dpt)
+    return LegQuote(
+        origin=o,
+        destination=dpt,
+        departure_date=dep_date,
+        actual_departure_date=tp_resp.get("actual_departure_date", dep_date),
+        min_price=min_price,
+        airline=tp_resp.get("airline"),
+        duration=tp_resp.get("duration"),
+        flight_number=tp_resp.get("flight_number"),
+        currency=tp_resp.get("currency"),
+        departure_time=tp_resp.get("departure_time"),
+        flight_link=tp_resp.get("flight_link"),
+        stops=tp_resp.get("stops"),
+        origin_airport=tp_resp.get("origin_airport", o),
+        destination_airport=tp_resp.get("destination_airport", dpt),
+    )
+
 # ---------- Core route-finding logic ----------
 @app.post("/find-route")
-def find_route(payload: RequestPayload):
+def find_route(payload: RequestPayload, request: Request = None):
     """
-    Main endpoint.
-    Steps:
-      - iterate candidate start dates between start_range_start and start_range_end
-      - for each candidate start date s:
-          - create a schedule of dates for each leg based on trip_length_days and distribution
-          - for every permutation of cities (visit order), form legs [start -> c1, c1->c2, ..., cN->end]
-          - query cached Travelpayouts price for each leg's departure date; sum min prices
-      - keep best (lowest total price) across candidates and permutations
-    NOTE: This is brute-force and may be slow for many permutations and many start dates. Use max_candidates to limit.
+    Route search; see search_route. Admins can profile a single call by sending X-Profile: 1 and
+    X-Admin-Token: the response then carries a "profile" section (see profiling.py).
+    The response is encoded by fast_json (gzip when accepted), in the compact shape if asked.
+    """
+    if request is None or not request.headers.get("x-profile"):
+        return _route_response(search_route(payload), payload, request)
+    if not profiling.authorized(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Profiling requires a valid X-Admin-Token")
+    try:
+        result, profile = profiling.profile_call(search_route, payload)
+    except HTTPException as e:
+        profile = getattr(e, "profile", None) or {}
+        logger.info("Profiled search failed with %s; profile=%s", e.status_code, profile.get("file"))
+        e.headers = dict(e.headers or {}, **{"X-Profile-Id": str(profile.get("id"))})
+        raise
+    logger.info("Profiled search wall=%.3fs phases=%s profile=%s", profile["wall_s"], profile["phases_s"], profile["file"])
+    return _route_response(dict(result, profile=profile), payload, request)
+
+
+def _route_response(result: dict, payload: RequestPayload, request: Optional[Request]):
+    return json_response(compact_result(result) if payload.compact else result, request)
+
+
+def effective_max_candidates(payload: RequestPayload) -> int:
+    # Cap candidate days hard to limit upstream calls (configurable via env)
+    hard_cap = 2
+    try:
+        hard_cap = int(_os.getenv("MAX_CANDIDATES_HARD_CAP", "2"))
+    except Exception:
+        hard_cap = 2
+    return min(payload.max_candidates or 30, max(1, hard_cap))
+
+
+def normalize_payload(payload: RequestPayload) -> RequestPayload:
+    """
+    Canonical form of a search: upper-case IATA codes (sorted airport lists), ISO dates, resolved end_airport,
+    effective max_candidates, the resolved strategy / leg budget / objectives and canonical constraints. Equivalent payloads normalize (and search) identically.
+    The city order is kept: it steers which visit orders are tried (see plan_candidates).
+    """
+    def iso(s: str) -> str:
+        try:
+            return safe_date_parse(s).strftime("%Y-%m-%d")
+        except Exception:
+            return s  # rejected later by prepare_candidates
+
+    start = metro_areas.canonical(payload.start_airport)
+    return payload.model_copy(update={
+        "start_range_start": iso(payload.start_range_start),
+        "start_range_end": iso(payload.start_range_end),
+        "start_airport": start,
+        "end_airport": metro_areas.canonical(payload.end_airport or start),
+        "cities": [metro_areas.canonical(c) for c in payload.cities],
+        "max_candidates": effective_max_candidates(payload),
+        "first_city": metro_areas.canonical(payload.first_city) if payload.first_city else None,
+        "last_city": metro_areas.canonical(payload.last_city) if payload.last_city else None,
+        "city_dates": {metro_areas.canonical(c): iso(d) for c, d in payload.city_dates.items()} if payload.city_dates else None,
+        "exclude_airlines": list(excluded_airlines(payload)) or None,
+        "strategy": search_strategy(payload),
+        "objectives": list(search_objectives(payload)) if len(search_objectives(payload)) > 1 else None,
+        "leg_budget": _leg_budget(payload) if search_strategy(payload) == "adaptive" else None,
+    })
+
+
+def result_cache_key(payload: RequestPayload) -> str:
+    """Hash of a normalized payload; include_timings, session_id and compact don't change the result."""
+    fields = payload.model_dump(exclude={"include_timings", "session_id", "compact"})
+    if len(payload.cities) <= FULL_PERMUTATION_CITIES:
+        # every visit order is tried, so the order the cities were listed in doesn't matter
+        fields["cities"] = sorted(fields["cities"])
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def search_route(payload: RequestPayload):
+    """
+    Normalizes the payload and answers from the result cache when an identical search is cached.
+    Cached responses expire RESULT_CACHE_TTL_SEC (default 900) after their oldest leg price was
+    fetched, and are dropped as soon as any of their legs is refreshed (see cache_db.set_cache).
+    Searches asking for timings always run, so the breakdown reflects real work. RESULT_CACHE=false
+    turns the result cache off (the leg cache stays on).
     """
-    logger.info("/find-route called with payload=%s", payload.model_dump())
+    payload = normalize_payload(payload)
+    key, cached = cached_result(payload)
+    if cached is not None:
+        return cached
+    return run_search(payload, key, _search_route)
+
+
+def cached_result(payload: RequestPayload) -> tuple:
+    """(result cache key, or None when the search must not be cached; cached response or None) of a normalized payload."""
+    if getattr(settings, "DISABLE_CACHE", False) or payload.include_timings:
+        return None, None
+    if _os.getenv("RESULT_CACHE", "true").lower() in ("0", "false", "no"):
+        return None, None
+    key = result_cache_key(payload)
+    cached = cache_db.get_result(key)
+    if cached is not None:
+        logger.info("Result cache hit %s", key[:12])
+        # responses are stored without a session: the caller gets its own (or a fresh) one, never
+        # the session of whoever searched first; the legs are in the leg cache either way
+        session, _ = open_session(payload)
+        cached = dict(cached, session_id=session.id)
+    return key, cached
+
+
+def run_search(payload: RequestPayload, key: Optional[str], search) -> dict:
+    """
+    Runs search(payload, priced_legs) for a normalized payload (under a timings scope when asked)
+    and stores the result under key, unless key is None.
+    """
+    priced_legs = set()
+    if not payload.include_timings:
+        result = search(payload, priced_legs)
+    else:
+        with timings_scope() as timings:
+            result = search(payload, priced_legs)
+        result = dict(result, timings=timings.as_dict())
+    if key is not None:
+        _store_result(key, result, priced_legs, excluded_airlines(payload))
+    return result
+
+
+def _store_result(key: str, result: dict, legs: set, excluded: tuple = ()) -> None:
+    try:
+        ttl = int(_os.getenv("RESULT_CACHE_TTL_SEC", "900"))
+    except Exception:
+        ttl = 900
+    now = int(time.time())
+    oldest = cache_db.legs_fetched_at(_tequila().cache_provider(excluded), legs)
+    expires_at = min(oldest if oldest is not None else now, now) + ttl
+    if expires_at > now:
+        cache_db.set_result(key, {k: v for k, v in result.items() if k != "session_id"}, legs, expires_at)
+
+
+def prepare_candidates(payload: RequestPayload) -> List[dict]:
+    """Validates the payload and plans its candidates (start date x visit order); raises HTTPException(400)."""
+    feasible_starts = feasible_start_dates(payload)
+
+    # cap candidate count (sample evenly if too many)
+    max_cand = effective_max_candidates(payload)
+    if len(feasible_starts) > max_cand:
+        step = max(1, len(feasible_starts)//max_cand)
+        feasible_starts = feasible_starts[::step][:max_cand]
+
+    return plan_candidates(payload, feasible_starts)
+
+
+def feasible_start_dates(payload: RequestPayload) -> List[datetime]:
+    """Validates the payload and lists every start date whose trip fits the window; raises HTTPException(400)."""
+    logger.debug("/find-route called with payload=%s", Preview(payload, limit=2000))
     try:
         start_range_start = safe_date_parse(payload.start_range_start)
         start_range_end = safe_date_parse(payload.start_range_end)
@@ -129,6 +532,7 @@ def find_route(payload: RequestPayload):
     n_cities = len(payload.cities)
     if n_cities == 0:
         raise HTTPException(status_code=400, detail="At least one city must be provided in 'cities'")
+    check_constraints(payload)
 
     # Candidate start dates list (cap to max_candidates)
     all_dates = list(daterange(start_range_start, start_range_end))
@@ -140,175 +544,691 @@ def find_route(payload: RequestPayload):
     if not feasible_starts:
         logger.warning("No feasible start dates. start=%s end=%s trip_len=%s", start_range_start, start_range_end, payload.trip_length_days)
         raise HTTPException(status_code=400, detail="No feasible start dates in the given window for trip length")
+    if payload.city_dates:
+        # drop start dates no visit order can satisfy, so sampling and budgets only see useful ones
+        days_per_city = build_days_distribution(payload.trip_length_days, n_cities, payload.equal_days)
+        kept = []
+        for d in feasible_starts:
+            allowed = city_date_positions(payload, build_leg_dates(d, days_per_city))
+            if allowed is not None and next(visit_orders(payload, allowed), None) is not None:
+                kept.append(d)
+        feasible_starts = kept
+        if not feasible_starts:
+            raise HTTPException(status_code=400, detail="No start date in the window satisfies city_dates")
 
-    # cap candidate count (sample evenly if too many)
-    # Cap candidate days hard to limit upstream calls (configurable via env)
-    hard_cap = 2
-    try:
-        hard_cap = int(_os.getenv("MAX_CANDIDATES_HARD_CAP", "2"))
-    except Exception:
-        hard_cap = 2
-    max_cand = min(payload.max_candidates or 30, max(1, hard_cap))
-    logger.info("Feasible starts count=%d dates=%s", len(feasible_starts), [d.strftime('%Y-%m-%d') for d in feasible_starts])
-    if len(feasible_starts) > max_cand:
-        step = max(1, len(feasible_starts)//max_cand)
-        feasible_starts = feasible_starts[::step][:max_cand]
+    logger.info("Feasible starts count=%d", len(feasible_starts))
+    logger.debug("Feasible start dates=%s", feasible_starts)
+    return feasible_starts
 
-    best_overall = None
-    alternatives = []
 
-    # Import here to avoid startup crash if optional deps/env are missing
+def _tequila():
+    """The Tequila client module from the provider registry (imported on first use); raises HTTPException(500)."""
     # --- FORCE TEQUILA CLIENT ---
     try:
-        from tequila_client import fetch_price_for_date
-        logger.info("Using forced Kiwi Tequila client")
+        return providers.get("tequila")
     except ImportError as e:
         logger.error(f"FATAL: Could not import mandatory Tequila client: {e}")
         raise HTTPException(status_code=500, detail=f"Could not load Tequila client: {e}")
 
-    # iterate candidate starts
-    for start_dt in feasible_starts:
-        # compute days per city
-        days_per_city = build_days_distribution(payload.trip_length_days, n_cities, payload.equal_days)
-        logger.info("Evaluating candidate start=%s days_per_city=%s perms=%d", start_dt.strftime("%Y-%m-%d"), days_per_city, len(list(itertools.permutations(payload.cities))))
-        # for each permutation of visit order
-        # Limit permutations if city count is large to avoid explosion
-        perms_iter = itertools.permutations(payload.cities)
-        if n_cities > 3:
-            perms_iter = itertools.islice(perms_iter, 6)
-        for perm in perms_iter:
-            # build route: start -> perm[0] -> perm[1] -> ... -> perm[-1] -> end
-            route = [payload.start_airport] + list(perm) + [payload.end_airport]
-            # compute departure dates for each leg
-            leg_departure_dates = []
-            # initial day: start_dt (we assume user departs on the start_dt morning)
-            current_date = start_dt
-            # Leg 0: start -> first city on current_date
-            leg_departure_dates.append(current_date.strftime("%Y-%m-%d"))
-            # Then we stay in city0 for days_per_city[0] days, then fly to city1 on date = current_date + days_per_city[0]
-            for i in range(0, n_cities-1):
-                current_date = current_date + timedelta(days=days_per_city[i])
-                leg_departure_dates.append(current_date.strftime("%Y-%m-%d"))
-            # last leg: from last city back to end_airport
-            # depart after staying last city's days
-            current_date = current_date + timedelta(days=days_per_city[-1])
-            # but note: that would be one day after finishing; we want return flight departure date = start_dt + sum(days_per_city)
-            # However current_date at this point equals start_dt + sum(days_per_city). That's correct for return leg.
-            leg_departure_dates.append(current_date.strftime("%Y-%m-%d"))
-
-            # sanity: len(leg_departure_dates) should be len(route)-1
-            if len(leg_departure_dates) != len(route)-1:
-                # adjust if mismatch
-                # fallback: set all legs the same start date (safer)
-                leg_departure_dates = [start_dt.strftime("%Y-%m-%d")] * (len(route)-1)
-            logger.info("Route=%s legs=%s", route, leg_departure_dates)
-
-            total_price = 0
-            valid = True
-            leg_details = []
-
-            # for each leg, fetch price
-            for i in range(len(route)-1):
-                o = route[i]
-                dpt = route[i+1]
-                dep_date = leg_departure_dates[i]
-                # call pricing client (cached)
-                logger.info("Leg fetch start %s-%s %s", o, dpt, dep_date)
-                tp_resp = fetch_price_for_date(o, dpt, dep_date)
-                logger.info("Leg fetch done %s-%s %s resp_type=%s resp_preview=%s",
-                            o, dpt, dep_date, type(tp_resp).__name__,
-                            (str(tp_resp)[:240] if tp_resp is not None else None))
-                # Support both legacy Travelpayouts-style response and Amadeus simple dict
-                min_price = None
-                if isinstance(tp_resp, dict) and tp_resp.get("rate_limited"):
-                    logger.warning("Rate limited while fetching %s-%s %s; aborting with 503", o, dpt, dep_date)
-                    raise HTTPException(status_code=503, detail="Upstream rate limited. Please retry shortly.")
-                if isinstance(tp_resp, dict) and "price" in tp_resp:
-                    try:
-                        min_price = float(tp_resp.get("price"))
-                    except Exception:
-                        min_price = None
-                else:
-                    min_price = extract_min_price_from_tp_response(tp_resp)
-                if min_price:
-                    logger.info("Leg price %s-%s %s = %.2f", o, dpt, dep_date, min_price)
-                if min_price is None:
-                    logger.info("No price for leg %s-%s on %s; skipping candidate. Raw resp=%s",
-                                o, dpt, dep_date, (str(tp_resp)[:240] if tp_resp is not None else None))
-                    valid = False
-                    # break on missing price - you could instead treat as very expensive
-                    break
-                total_price += min_price
-                # enrich with carrier/duration if available from client
-                airline = None
-                duration = None
-                flight_number = None
-                currency = None
-                departure_time = None
-                flight_link = None
-                actual_departure_date = dep_date  # default to requested date
-                if isinstance(tp_resp, dict):
-                    airline = tp_resp.get("airline")
-                    duration = tp_resp.get("duration")
-                    flight_number = tp_resp.get("flight_number")
-                    currency = tp_resp.get("currency")
-                    departure_time = tp_resp.get("departure_time")
-                    flight_link = tp_resp.get("flight_link")
-                    actual_departure_date = tp_resp.get("actual_departure_date", dep_date)
-                leg_details.append({
-                    "origin": o,
-                    "destination": dpt,
-                    "departure_date": dep_date,  # istenen tarih
-                    "actual_departure_date": actual_departure_date,  # gerçek tarih
-                    "min_price": min_price,
-                    "airline": airline,
-                    "duration": duration,
-                    "flight_number": flight_number,
-                    "currency": currency,
-                    "departure_time": departure_time,
-                    "flight_link": flight_link,
-                })
-
-            if not valid:
+
+def price_legs(legs: List[tuple], excluded: tuple = ()) -> dict:
+    """
+    Prices (origin, destination, date) legs through the batch client under the search deadline,
+    without offers flown by the excluded carriers (see excluded_airlines).
+    A leg between multi-airport places is priced for every airport pair, in the same batched calls
+    as the other legs (pairs are shared between legs and candidates), and gets the cheapest pair.
+    """
+    fetch_prices_batch = _tequila().fetch_prices_batch
+
+    # Retries of throttled/failed upstream calls stop once the search deadline has passed
+    try:
+        search_deadline = float(_os.getenv("SEARCH_DEADLINE_SEC", "25"))
+    except Exception:
+        search_deadline = 25.0
+    expanded = {leg: metro_areas.expand_leg(leg) for leg in dict.fromkeys(legs)}
+    with deadline_scope(search_deadline):
+        quotes = fetch_prices_batch([pair for pairs in expanded.values() for pair in pairs], excluded)
+    return {
+        leg: quotes.get(leg) if pairs == [leg] else metro_areas.cheapest(pairs, quotes, _leg_price)
+        for leg, pairs in expanded.items()
+    }
+
+
+def _search_route(payload: RequestPayload, priced_legs: Optional[set] = None, prepriced: Optional[dict] = None,
+                  candidates: Optional[list] = None):
+    """
+    Main endpoint.
+    Steps:
+      - iterate candidate start dates between start_range_start and start_range_end
+      - for each candidate start date s:
+          - create a schedule of dates for each leg based on trip_length_days and distribution
+          - for every permutation of cities (visit order), form legs [start -> c1, c1->c2, ..., cN->end]
+      - price all unique legs in one batch (legs sharing origin and date go upstream together),
+        skipping legs already priced in the payload's search session or in prepriced (a batch's shared legs)
+        (a batch passes the candidates it already planned for the payload, so they are not sampled again)
+      - sum min prices per candidate
+      - keep best (lowest total price) across candidates and permutations
+    NOTE: This is brute-force and may be slow for many permutations and many start dates. Use max_candidates to limit.
+    """
+    session, reused = open_session(payload)
+    search_info = None
+    if search_strategy(payload) == "adaptive":
+        candidates, quotes, search_info = adaptive_candidates(payload, feasible_start_dates(payload), session)
+        legs = [leg for cand in candidates for leg in cand["legs"]]
+        n_reused = search_info["legs_from_session"]
+    else:
+        if candidates is None:
+            candidates = prepare_candidates(payload)
+        # Price every unique leg up-front so the client can batch legs sharing (origin, date);
+        # legs already priced earlier in this session are not fetched again
+        legs = [leg for cand in candidates for leg in cand["legs"]]
+        known = {leg: prepriced[leg] for leg in legs if prepriced and leg in prepriced and leg not in session.quotes}
+        pending = [leg for leg in legs if leg not in session.quotes and leg not in known]
+        fetched = {**known, **price_legs(pending, excluded_airlines(payload))} if pending else known
+        _remember_quotes(session, fetched)
+        quotes = {leg: session.quotes.get(leg, fetched.get(leg)) for leg in legs}
+        n_reused = len(quotes) - len(fetched)
+    if reused:
+        logger.info("Session %s: reused %d legs, priced %d", session.id[:12], n_reused, len(quotes) - n_reused)
+    if priced_legs is not None:
+        # the result depends on every airport pair of a multi-airport leg
+        priced_legs.update(pair for leg in quotes for pair in metro_areas.expand_leg(leg))
+    logger.info("Priced %d unique legs for %d candidates", len(quotes), len(candidates))
+    metrics.SEARCH_LEGS.observe(len(quotes))
+    metrics.SEARCH_CANDIDATES.observe(len(candidates))
+    timings = current_timings()
+    if timings is not None:
+        timings.counts.update(requested=len(legs), unique=len(quotes), session_reused=n_reused)
+    result = score_candidates(payload, candidates, quotes, memo=session.scores)
+    result = dict(result, session_id=session.id)
+    if search_info is not None:
+        result["search"] = search_info
+    return result
+
+
+def open_session(payload: RequestPayload) -> tuple:
+    """
+    (session, reused) for payload.session_id. Quotes priced with other carriers excluded don't
+    apply to this search, so a session whose exclusion changes starts over.
+    """
+    session, reused = search_sessions.get_or_create(payload.session_id)
+    excluded = excluded_airlines(payload)
+    if session.excluded != excluded:
+        session.quotes.clear()
+        session.scores.clear()
+        session.excluded = excluded
+    return session, reused
+
+
+def _remember_quotes(session, fetched: dict) -> None:
+    # rate-limited markers are not prices; they must be fetched again next time
+    session.quotes.update((leg, q) for leg, q in fetched.items() if not (isinstance(q, dict) and q.get("rate_limited")))
+
+
+def search_strategy(payload: RequestPayload) -> str:
+    strategy = (payload.strategy or _os.getenv("SEARCH_STRATEGY", "sample")).lower()
+    if strategy not in ("sample", "adaptive"):
+        raise HTTPException(status_code=400, detail="strategy must be 'sample' or 'adaptive'")
+    return strategy
+
+
+def search_objectives(payload: RequestPayload) -> tuple:
+    """Objectives to minimize, in OBJECTIVES order; price is always one of them."""
+    requested = {o.strip().lower() for o in payload.objectives or ()}
+    unknown = requested - set(OBJECTIVES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown objectives {sorted(unknown)}; allowed: {list(OBJECTIVES)}")
+    return tuple(o for o in OBJECTIVES if o == "price" or o in requested)
+
+
+def _leg_budget(payload: RequestPayload) -> int:
+    try:
+        default = int(_os.getenv("ADAPTIVE_LEG_BUDGET", "60"))
+    except Exception:
+        default = 60
+    try:
+        cap = int(_os.getenv("ADAPTIVE_MAX_LEG_BUDGET", "400"))
+    except Exception:
+        cap = 400
+    return max(1, min(payload.leg_budget or default, cap))
+
+
+def adaptive_candidates(payload: RequestPayload, starts: List[datetime], session) -> tuple:
+    """
+    Coarse-to-fine start date search under a budget of upstream-priced legs.
+    A coarse, evenly spaced sample of start dates (about half the budget) is priced first; the rest
+    of the budget bisects the gaps next to the cheapest start dates found so far, cheapest first,
+    until the budget is spent or the best regions are fully explored. Legs already known (search
+    session, price_cache filled by earlier searches or /price-calendar) are free.
+    Returns (candidates of the evaluated start dates, leg quotes, search info).
+    """
+    cached_quotes = _tequila().cached_quotes
+    excluded = excluded_airlines(payload)
+
+    budget = _leg_budget(payload)
+    spent = 0
+    from_session = 0
+    quotes = {}
+    planned = {}   # start index -> its candidates
+    best = {}      # start index -> cheapest candidate price, None if no candidate is priced
+
+    def evaluate(indices: List[int]) -> int:
+        """Prices and scores the start dates at indices that still fit the budget; returns how many did."""
+        nonlocal spent, from_session
+        accepted, new_legs = [], []
+        seen = set(quotes)
+        for i in indices:
+            if i in planned:
+                continue
+            cands = plan_candidates(payload, [starts[i]])
+            legs = list(dict.fromkeys(leg for c in cands for leg in c["legs"] if leg not in seen))
+            for leg in legs:
+                if leg in session.quotes:
+                    quotes[leg] = session.quotes[leg]
+                    from_session += 1
+            free = cached_quotes([leg for leg in legs if leg not in quotes], excluded)
+            quotes.update(free)
+            cost = [leg for leg in legs if leg not in quotes]
+            if spent + len(new_legs) + len(cost) > budget:
                 continue
+            planned[i] = cands
+            accepted.append(i)
+            new_legs.extend(cost)
+            seen.update(legs)
+        if new_legs:
+            fetched = price_legs(new_legs, excluded)
+            _remember_quotes(session, fetched)
+            quotes.update(fetched)
+            spent += len(new_legs)
+        for i in accepted:
+            prices = [c["total_price"] for c in (_score_candidate(cand, quotes) for cand in planned[i]) if c]
+            best[i] = min(prices) if prices else None
+        return len(accepted)
+
+    # coarse pass: evenly spaced start dates (endpoints included) using about half the budget
+    per_start = len({leg for c in plan_candidates(payload, [starts[0]]) for leg in c["legs"]}) or 1
+    n_coarse = max(2, min(len(starts), (budget // 2) // per_start))
+    if len(starts) == 1:
+        coarse = [0]
+    else:
+        coarse = sorted({round(k * (len(starts) - 1) / (n_coarse - 1)) for k in range(n_coarse)})
+    if not evaluate(coarse):
+        # the budget doesn't cover a single start's legs on top of what is known; price the first anyway
+        budget = max(budget, per_start)
+        evaluate([0])
+
+    # refinement: bisect the gaps around the cheapest evaluated start dates
+    while spent < budget:
+        evaluated = sorted(planned)
+        targets = []
+        for i in sorted((i for i in evaluated if best[i] is not None), key=best.get):
+            pos = evaluated.index(i)
+            for nb in evaluated[max(0, pos - 1):pos] + evaluated[pos + 1:pos + 2]:
+                if abs(nb - i) > 1:
+                    targets.append((i + nb) // 2)
+            if targets:
+                break
+        if not targets or not evaluate(targets):
+            break
+
+    candidates = [cand for i in sorted(planned) for cand in planned[i]]
+    info = {
+        "strategy": "adaptive",
+        "leg_budget": budget,
+        "legs_fetched": spent,
+        "legs_from_session": from_session,
+        "start_dates_feasible": len(starts),
+        "start_dates_evaluated": [starts[i].strftime("%Y-%m-%d") for i in sorted(planned)],
+    }
+    logger.info("Adaptive search evaluated %d/%d start dates with %d/%d legs fetched",
+                len(planned), len(starts), spent, budget)
+    return candidates, quotes, info
+
+
+def _score_candidate(cand: dict, quotes: dict, details: Optional[dict] = None) -> Optional[dict]:
+    """
+    Priced candidate dict, or None if a leg has no price; raises HTTPException(503) on a rate-limited leg.
+    details (leg -> LegQuote) lets the candidates of one search share their leg detail objects.
+    """
+    route = cand["route"]
+    total_price = 0
+    valid = True
+    leg_details = []
+
+    for o, dpt, dep_date in cand["legs"]:
+        tp_resp = quotes.get((o, dpt, dep_date))
+        leg_logger.debug("Leg fetch done %s-%s %s resp_preview=%s", o, dpt, dep_date, Preview(tp_resp))
+        if isinstance(tp_resp, dict) and tp_resp.get("rate_limited"):
+            logger.warning("Rate limited while fetching %s-%s %s; aborting with 503", o, dpt, dep_date)
+            raise HTTPException(status_code=503, detail="Upstream rate limited. Please retry shortly.")
+        min_price = _leg_price(tp_resp)
+        if min_price:
+            leg_logger.info("Leg price %s-%s %s = %.2f", o, dpt, dep_date, min_price)
+        if min_price is None:
+            leg_logger.info("No price for leg %s-%s on %s; skipping candidate", o, dpt, dep_date)
+            leg_logger.debug("No-price leg %s-%s %s raw resp=%s", o, dpt, dep_date, Preview(tp_resp))
+            valid = False
+            # break on missing price - you could instead treat as very expensive
+            break
+        total_price += min_price
+        detail = details.get((o, dpt, dep_date)) if details is not None else None
+        if detail is None:
+            detail = build_leg_detail(o, dpt, dep_date, min_price, tp_resp)
+            if details is not None:
+                details[(o, dpt, dep_date)] = detail
+        leg_details.append(detail)
+
+    if not valid:
+        return None
+
+    candidate_price = round(total_price, 2)
+    durations = [_leg_duration_minutes(quotes.get(leg)) for leg in cand["legs"]]
+    stops = [_leg_stops(quotes.get(leg)) for leg in cand["legs"]]
+    candidate = {
+        "route": route,
+        "leg_details": leg_details,
+        "total_price": candidate_price,
+        "total_duration_minutes": None if None in durations else sum(durations),
+        "total_stops": None if None in stops else sum(stops),
+        "start_date": cand["start_date"],
+        "days_per_city": cand["days_per_city"]
+    }
+    return candidate
+
 
-            candidate_price = round(total_price, 2)
-            if best_overall is None or candidate_price < best_overall["total_price"]:
-                if best_overall:
-                    alternatives.append(best_overall)
-                best_overall = {
-                    "route": route,
-                    "leg_details": leg_details,
-                    "total_price": candidate_price,
-                    "start_date": start_dt.strftime("%Y-%m-%d"),
-                    "days_per_city": days_per_city
-                }
+def _leg_price(tp_resp) -> Optional[float]:
+    # Support both legacy Travelpayouts-style response and Amadeus simple dict
+    if isinstance(tp_resp, dict) and "price" in tp_resp:
+        try:
+            return float(tp_resp.get("price"))
+        except Exception:
+            return None
+    return extract_min_price_from_tp_response(tp_resp)
+
+
+_DURATION_RE = re.compile(r"^(?:PT)?\s*(?:(\d+)\s*H)?\s*(?:(\d+)\s*M)?\s*$", re.IGNORECASE)
+
+
+def _leg_duration_minutes(tp_resp) -> Optional[int]:
+    """Flight time of a quote in minutes: "2h 30m" (Tequila/Duffel) or "PT2H30M" (Amadeus); None if unknown."""
+    duration = tp_resp.get("duration") if isinstance(tp_resp, dict) else None
+    if not isinstance(duration, str):
+        return None
+    m = _DURATION_RE.match(duration.strip())
+    if not m or not any(m.groups()):
+        return None
+    return int(m.group(1) or 0) * 60 + int(m.group(2) or 0)
+
+
+def _leg_stops(tp_resp) -> Optional[int]:
+    stops = tp_resp.get("stops") if isinstance(tp_resp, dict) else None
+    return stops if isinstance(stops, int) else None
+
+
+def _objective_vector(candidate: dict, objectives: tuple) -> tuple:
+    values = {"price": candidate["total_price"], "duration": candidate.get("total_duration_minutes"),
+              "stops": candidate.get("total_stops")}
+    # an unknown duration / stop count is worse than any known one
+    return tuple(math.inf if values[o] is None else values[o] for o in objectives)
+
+
+def _dominated_partial(cand: dict, quotes: dict, objectives: tuple, frontier: ParetoFrontier) -> bool:
+    """
+    Adds the candidate's legs up one by one and stops as soon as the running totals are dominated by
+    the frontier. Returns False (score it in full) when a leg is unpriced or rate limited, so
+    _score_candidate handles those cases exactly as in price-only searches.
+    """
+    totals = [0.0] * len(objectives)
+    for leg in cand["legs"]:
+        tp_resp = quotes.get(leg)
+        if isinstance(tp_resp, dict) and tp_resp.get("rate_limited"):
+            return False
+        price = _leg_price(tp_resp)
+        if price is None:
+            return False
+        for i, objective in enumerate(objectives):
+            if objective == "price":
+                value = price
             else:
-                # if price close to best (within 20 EUR) or top 5 cheapest, append
-                alternatives.append({
-                    "route": route,
-                    "leg_details": leg_details,
-                    "total_price": candidate_price,
-                    "start_date": start_dt.strftime("%Y-%m-%d"),
-                    "days_per_city": days_per_city
-                })
+                value = _leg_duration_minutes(tp_resp) if objective == "duration" else _leg_stops(tp_resp)
+            totals[i] += math.inf if value is None else value
+        if frontier.dominated(totals):
+            return True
+    return False
+
+
+def score_candidates(payload: RequestPayload, candidates: List[dict], quotes: dict, memo: Optional[dict] = None) -> dict:
+    """
+    Sums leg prices per candidate and picks the cheapest; raises HTTPException 503 (rate limited) or 404.
+    memo (legs tuple -> scored candidate or None) carries scores across searches of one session.
+    With more objectives than price (payload.objectives) the Pareto frontier is built on the way:
+    candidates dominated part-way through their legs are dropped unscored, so alternatives only
+    list candidates that were scored in full. The cheapest route is never dominated.
+    """
+    best_overall = None
+    alternatives = []
+    pruned = 0
+    objectives = search_objectives(payload)
+    frontier = ParetoFrontier() if len(objectives) > 1 else None
+    dominated = 0
+    details = {}
+
+    for cand in candidates:
+        memo_key = tuple(cand["legs"])
+        if memo is not None and memo_key in memo:
+            candidate = memo[memo_key]
+        elif frontier is not None and _dominated_partial(cand, quotes, objectives, frontier):
+            dominated += 1
+            continue
+        else:
+            candidate = _score_candidate(cand, quotes, details)
+            if memo is not None:
+                memo[memo_key] = candidate
+        if candidate is None:
+            pruned += 1
+            continue
+        if frontier is not None:
+            frontier.add(_objective_vector(candidate, objectives), candidate)
+
+        candidate_price = candidate["total_price"]
+        if best_overall is None or candidate_price < best_overall["total_price"]:
+            if best_overall:
+                alternatives.append(best_overall)
+            best_overall = candidate
+        else:
+            # if price close to best (within 20 EUR) or top 5 cheapest, append
+            alternatives.append(candidate)
+
+    timings = current_timings()
+    if timings is not None:
+        timings.candidates.update(evaluated=len(candidates), pruned=pruned)
+        if frontier is not None:
+            timings.candidates.update(dominated=dominated)
 
     # sort alternatives by price and limit to 5
     alternatives_sorted = sorted(alternatives, key=lambda x: x["total_price"])[:5]
 
     if not best_overall:
-        logger.warning("No valid routes found. Tried starts=%d cities=%s trip_len=%d", len(feasible_starts), payload.cities, payload.trip_length_days)
+        logger.warning("No valid routes found. Tried starts=%d cities=%s trip_len=%d",
+                       len({c["start_date"] for c in candidates}), payload.cities, payload.trip_length_days)
         raise HTTPException(status_code=404, detail="No valid routes found within constraints")
 
-    return {
+    result = {
         "best_route": best_overall,
         "alternatives": alternatives_sorted
     }
+    if frontier is not None:
+        result["pareto"] = pareto_section(frontier, objectives)
+    return result
+
+
+def pareto_section(frontier: ParetoFrontier, objectives: tuple) -> dict:
+    """Frontier routes by ascending price, with the indexes of the cheapest, fastest and best-value ones."""
+    points = frontier.points()
+    vectors = [v for v, _ in points]
+    section = {
+        "objectives": list(objectives),
+        "frontier": [c for _, c in points],
+        "cheapest": 0,
+        "fastest": None,
+        "best_value": knee(vectors),
+    }
+    if "duration" in objectives:
+        d = objectives.index("duration")
+        section["fastest"] = min(range(len(vectors)), key=lambda i: (vectors[i][d], vectors[i][0]))
+    return section
+
+@app.post("/find-route/batch")
+def find_route_batch(batch: BatchRequestPayload, request: Request = None):
+    """
+    Many searches priced from one shared leg matrix: the union of all payloads' legs is fetched once
+    (cost scales with unique legs, not payloads), then each payload is searched on its own exactly
+    like /find-route (normalized, answered from the result cache when possible).
+    Results come back in payload order as {"status": 200, "result": ...} or {"status": <code>, "detail": ...};
+    one payload failing does not fail the batch. MAX_BATCH_PAYLOADS (default 50) caps the batch size.
+    """
+    try:
+        max_payloads = int(_os.getenv("MAX_BATCH_PAYLOADS", "50"))
+    except Exception:
+        max_payloads = 50
+    if not batch.payloads:
+        raise HTTPException(status_code=400, detail="At least one payload must be provided in 'payloads'")
+    if len(batch.payloads) > max_payloads:
+        raise HTTPException(status_code=400, detail=f"At most {max_payloads} payloads per batch")
+
+    if not any(p.include_timings for p in batch.payloads):
+        return json_response(_search_batch(batch.payloads), request)
+    with timings_scope() as timings:
+        result = _search_batch(batch.payloads)
+    return json_response(dict(result, timings=timings.as_dict()), request)
+
+
+def _search_batch(payloads: List[RequestPayload]) -> dict:
+    """
+    Every payload goes through the /find-route path (normalize, result cache, search); the legs of
+    the sample-strategy searches that miss the result cache are priced up-front as one union, and
+    those searches are scored from it. Adaptive searches price their own legs under their budget.
+    """
+    planned = []  # per payload: HTTPException, or (normalized payload, result key, cached response, candidates)
+    for payload in payloads:
+        try:
+            payload = normalize_payload(payload)
+            key, cached = cached_result(payload)
+            sampled = cached is None and search_strategy(payload) == "sample"
+            planned.append((payload, key, cached, prepare_candidates(payload) if sampled else []))
+        except HTTPException as e:
+            planned.append(e)
+
+    # one union per carrier exclusion: its quotes only apply to payloads excluding the same carriers
+    by_excluded = {}
+    for item in planned:
+        if isinstance(item, tuple):
+            by_excluded.setdefault(excluded_airlines(item[0]), []).extend(leg for cand in item[3] for leg in cand["legs"])
+    quotes = {excluded: price_legs(legs, excluded) for excluded, legs in by_excluded.items() if legs}
+    n_requested = sum(len(legs) for legs in by_excluded.values())
+    n_unique = sum(len(q) for q in quotes.values())
+    logger.info("Batch of %d payloads: priced %d unique legs (%d requested)", len(payloads), n_unique, n_requested)
+
+    def search(candidates: list):
+        # the union was priced for exactly these candidates: planning again could sample others
+        def run(payload: RequestPayload, priced_legs: set) -> dict:
+            prepriced = quotes.get(excluded_airlines(payload), {})
+            return _search_route(payload, priced_legs, prepriced=prepriced, candidates=candidates or None)
+        return run
+
+    results = []
+    for item in planned:
+        if isinstance(item, HTTPException):
+            results.append({"status": item.status_code, "detail": item.detail})
+            continue
+        payload, key, cached, candidates = item
+        try:
+            result = cached if cached is not None else run_search(payload, key, search(candidates))
+        except HTTPException as e:
+            results.append({"status": e.status_code, "detail": e.detail})
+            continue
+        results.append({"status": 200, "result": compact_result(result) if payload.compact else result})
+    timings = current_timings()
+    if timings is not None:
+        # after the searches, which report their own per-payload counts into the same scope
+        timings.counts.update(requested=n_requested, unique=n_unique)
+    return {"results": results, "legs": {"requested": n_requested, "unique": n_unique}}
+
+def _run_search_job(job):
+    """
+    Job version of search_route: the payload is normalized and answered from the result cache like
+    /find-route. Otherwise candidates are priced one start date at a time so job.progress and
+    job.partial (best route so far) move while the search runs, and cancellation takes effect between
+    and during those fetches. Adaptive searches pick their start dates as they go and report
+    progress when they finish.
+    """
+    payload = normalize_payload(job.payload)
+    key, cached = cached_result(payload)
+    if cached is not None:
+        return cached
+    return run_search(payload, key, lambda p, priced_legs: _search_job_body(job, p, priced_legs))
+
+
+def _search_job_body(job, payload: RequestPayload, priced_legs: set):
+    if search_strategy(payload) == "adaptive":
+        result = _search_route(payload, priced_legs)
+        info = result["search"]
+        evaluated = len(info["start_dates_evaluated"])
+        job.progress = {"start_dates_done": evaluated, "start_dates_total": evaluated,
+                        "legs_priced": info["legs_fetched"], "legs_total": info["legs_fetched"]}
+        return result
+
+    session, _ = open_session(payload)
+    candidates = prepare_candidates(payload)
+    by_start = {}
+    for cand in candidates:
+        by_start.setdefault(cand["start_date"], []).append(cand)
+    legs_total = len({leg for cand in candidates for leg in cand["legs"]})
+
+    quotes = {}
+    scored = []
+    n_reused = 0
+    for start_date, cands in by_start.items():
+        pending = list(dict.fromkeys(leg for cand in cands for leg in cand["legs"] if leg not in quotes))
+        known = {leg: session.quotes[leg] for leg in pending if leg in session.quotes}
+        n_reused += len(known)
+        quotes.update(known)
+        pending = [leg for leg in pending if leg not in known]
+        if pending:
+            fetched = price_legs(pending, excluded_airlines(payload))
+            _remember_quotes(session, fetched)
+            quotes.update(fetched)
+        scored.extend(cands)
+        try:
+            job.partial = score_candidates(payload, scored, quotes)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+        job.progress = {"start_dates_done": len({c["start_date"] for c in scored}), "start_dates_total": len(by_start),
+                        "legs_priced": len(quotes), "legs_total": legs_total}
+
+    logger.info("Search job %s priced %d unique legs for %d candidates", job.id, len(quotes), len(candidates))
+    # the result depends on every airport pair of a multi-airport leg
+    priced_legs.update(pair for leg in quotes for pair in metro_areas.expand_leg(leg))
+    metrics.SEARCH_LEGS.observe(len(quotes))
+    metrics.SEARCH_CANDIDATES.observe(len(candidates))
+    timings = current_timings()
+    if timings is not None:
+        timings.counts.update(requested=sum(len(c["legs"]) for c in candidates), unique=len(quotes),
+                              session_reused=n_reused)
+    result = score_candidates(payload, candidates, quotes, memo=session.scores)
+    return dict(result, session_id=session.id)
+
+
+search_jobs = JobQueue(_run_search_job)
+
+
+@app.post("/jobs/find-route", status_code=202)
+def submit_search_job(payload: RequestPayload):
+    """
+    Queues a /find-route search and returns its job id at once. Poll GET /jobs/{job_id} for status,
+    progress and the best route found so far; DELETE /jobs/{job_id} cancels it.
+    """
+    try:
+        job = search_jobs.submit(payload)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Search job queue is full ({e}). Please retry shortly.")
+    return job.snapshot()
+
+@app.get("/jobs/{job_id}")
+def get_search_job(job_id: str, request: Request = None):
+    job = search_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    return json_response(job.snapshot(), request)
+
+@app.delete("/jobs/{job_id}")
+def cancel_search_job(job_id: str):
+    job = search_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    return job.snapshot()
+
+@app.get("/price-calendar")
+def price_calendar(origin: str, destination: str, date_from: str, date_to: str):
+    """
+    Cheapest fare per day for origin -> destination between date_from and date_to (YYYY-MM-DD, inclusive).
+    Days are answered from price_cache when fresher than PRICE_CALENDAR_MAX_AGE_SEC (default 6h) and
+    otherwise filled by provider range queries. PRICE_CALENDAR_MAX_DAYS (default 90) caps the range.
+    """
+    try:
+        start = safe_date_parse(date_from)
+        end = safe_date_parse(date_to)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {e}")
+    try:
+        max_days = int(_os.getenv("PRICE_CALENDAR_MAX_DAYS", "90"))
+    except Exception:
+        max_days = 90
+    try:
+        max_age = int(_os.getenv("PRICE_CALENDAR_MAX_AGE_SEC", "21600"))
+    except Exception:
+        max_age = 21600
+    if end < start:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+    if (end - start).days + 1 > max_days:
+        raise HTTPException(status_code=400, detail=f"At most {max_days} days per calendar")
+    origin, destination = origin.upper(), destination.upper()
+
+    fetch_price_calendar = _tequila().fetch_price_calendar
+    try:
+        search_deadline = float(_os.getenv("SEARCH_DEADLINE_SEC", "25"))
+    except Exception:
+        search_deadline = 25.0
+    with deadline_scope(search_deadline):
+        calendar = fetch_price_calendar(origin, destination, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), max_age)
+
+    if any(isinstance(q, dict) and q.get("rate_limited") for q in calendar.values()):
+        logger.warning("Rate limited while building calendar %s-%s; aborting with 503", origin, destination)
+        raise HTTPException(status_code=503, detail="Upstream rate limited. Please retry shortly.")
+
+    days = []
+    for day, quote in calendar.items():
+        price = quote.get("price") if isinstance(quote, dict) else None
+        days.append({
+            "date": day,
+            "price": price,
+            "currency": quote.get("currency") if price is not None else None,
+            "airline": quote.get("airline") if price is not None else None,
+        })
+    priced = [d for d in days if d["price"] is not None]
+    return {
+        "origin": origin,
+        "destination": destination,
+        "days": days,
+        "cheapest": min(priced, key=lambda d: d["price"]) if priced else None,
+    }
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the startup warm-up has finished (or when it is disabled), 503 before."""
+    state = providers.warmup
+    body = {"ready": state["state"] in ("done", "idle"), "warmup": state, "providers": providers.loaded()}
+    return body if body["ready"] else JSONResponse(status_code=503, content=body)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, request: Request):
+    """Raw pstats dump of a profiled search (load with pstats.Stats or snakeviz)."""
+    if not profiling.authorized(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Invalid X-Admin-Token")
+    path = profiling.stored_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+
 @app.post("/cache/clear")
 def clear_cache():
     clear_all()
@@ -335,7 +1255,6 @@ def enable_cache():
 @app.get("/tequila/health")
 def tequila_health():
     try:
-        from .tequila_client import probe as tequila_probe
-        return {"tequila": tequila_probe()}
+        return {"tequila": providers.get("tequila").probe()}
     except Exception as e:
         return {"ok": False, "error": str(e)}
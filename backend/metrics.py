@@ -0,0 +1,163 @@
+# metrics.py
+# In-process Prometheus-style metrics served by GET /metrics (text exposition format 0.0.4).
+# Each metric keeps one shard per thread, so recording on the hot path is a plain dict update with
+# no lock; a lock is only taken once per thread to register its shard, and shards are summed at
+# scrape time. Values that other modules already count (e.g. cache_db.stats) are exported through
+# collectors evaluated at scrape time, costing nothing per request.
+
+import bisect
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._register_lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._register_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self) -> Iterable[Tuple[tuple, object]]:
+        with self._register_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            yield from list(shard.items())
+
+    def _labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        totals: Dict[tuple, float] = {}
+        for labels, value in self._snapshot():
+            totals[labels] = totals.get(labels, 0) + value
+        return [f"{self.name}{self._labels(k)} {_num(v)}" for k, v in sorted(totals.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def observe(self, value: float, *labels) -> None:
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # one slot per bucket plus +Inf, then sum
+            row = shard[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self) -> List[str]:
+        merged: Dict[tuple, list] = {}
+        for labels, row in self._snapshot():
+            acc = merged.setdefault(labels, [0] * len(row))
+            for i, v in enumerate(list(row)):
+                acc[i] += v
+        lines = []
+        for labels, row in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_num(row[-1])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # collector -> (name, kind, help, labelnames); returns {label values tuple: value}
+        self._collectors: List[Tuple[str, str, str, Tuple[str, ...], Callable[[], Dict[tuple, float]]]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def collector(self, name: str, kind: str, help: str, labelnames: Sequence[str], fn: Callable[[], Dict[tuple, float]]) -> None:
+        self._collectors.append((name, kind, help, tuple(labelnames), fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for name, kind, help, labelnames, fn in self._collectors:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            try:
+                values = fn()
+            except Exception:
+                continue
+            for labels, value in sorted(values.items()):
+                pairs = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labels))
+                lines.append(f"{name}{{{pairs}}} {_num(value)}" if pairs else f"{name} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[A-Za-z0-9_-]{8,}$")
+
+
+def endpoint_label(path: str) -> str:
+    """URL path with id-like segments collapsed, to keep label cardinality bounded."""
+    return "/".join(":id" if _ID_SEGMENT.match(seg) else seg for seg in path.split("/")) or "/"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = Histogram("gelidonia_http_request_seconds", "API request latency.", ("path", "status"))
+UPSTREAM_SECONDS = Histogram("gelidonia_upstream_request_seconds", "Upstream provider request latency per attempt.",
+                             ("provider", "endpoint"))
+UPSTREAM_RESPONSES = Counter("gelidonia_upstream_responses_total", "Upstream responses by status code (\"error\" for network failures).",
+                             ("provider", "endpoint", "status"))
+UPSTREAM_RATE_LIMITED = Counter("gelidonia_upstream_rate_limited_total", "Upstream requests still rate limited (429) after retries.",
+                                ("provider",))
+SEARCH_LEGS = Histogram("gelidonia_search_legs", "Unique legs priced per search.", buckets=COUNT_BUCKETS)
+SEARCH_CANDIDATES = Histogram("gelidonia_search_candidates", "Candidates (start date x visit order) evaluated per search.",
+                              buckets=COUNT_BUCKETS)
+
+
+def render() -> str:
+    return REGISTRY.render()
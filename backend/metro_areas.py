@@ -0,0 +1,114 @@
+# metro_areas.py
+# Multi-airport places. start_airport, end_airport and cities accept a single IATA airport code,
+# a metro-area code (LON) or an explicit airport list ("LHR,STN").
+# Metro codes go upstream as they are: Tequila searches every airport of the city in one request
+# and the offer names the airport it flies from / to. An airport list is priced pair by pair in the
+# same batched upstream calls as the other legs, keeping the cheapest pair (see main.price_legs);
+# lists longer than METRO_MAX_AIRPORTS are rejected.
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+Leg = Tuple[str, str, str]
+
+# metro code -> airports, busiest first; only codes that are not airports themselves.
+# Used to tell sibling airports apart (city_of), not to expand metro codes.
+METRO_AREAS: Dict[str, List[str]] = {
+    "LON": ["LHR", "LGW", "STN", "LTN", "LCY", "SEN"],
+    "PAR": ["CDG", "ORY", "BVA"],
+    "MIL": ["MXP", "LIN", "BGY"],
+    "ROM": ["FCO", "CIA"],
+    "STO": ["ARN", "BMA", "NYO"],
+    "BUH": ["OTP", "BBU"],
+    "MOW": ["SVO", "DME", "VKO"],
+    "NYC": ["JFK", "EWR", "LGA"],
+    "WAS": ["IAD", "DCA", "BWI"],
+    "CHI": ["ORD", "MDW"],
+    "YTO": ["YYZ", "YTZ"],
+    "TYO": ["HND", "NRT"],
+    "SEL": ["ICN", "GMP"],
+    "BJS": ["PEK", "PKX"],
+    "REK": ["KEF", "RKV"],
+}
+
+
+# airport -> its metro code, for the airports listed above
+_CITY_OF: Dict[str, str] = {a: metro for metro, codes in METRO_AREAS.items() for a in codes}
+
+
+def max_airports() -> int:
+    try:
+        return max(1, int(os.getenv("METRO_MAX_AIRPORTS", "4")))
+    except (TypeError, ValueError):
+        return 4
+
+
+def canonical(place: str) -> str:
+    """Upper-case code, or a sorted, de-duplicated comma-separated airport list."""
+    codes = sorted({c.strip().upper() for c in place.split(",") if c.strip()})
+    return ",".join(codes) if len(codes) > 1 else (codes[0] if codes else place.strip().upper())
+
+
+def airports(place: str) -> List[str]:
+    """Codes a place is priced as: the codes of an airport list, else the code itself (metro codes included)."""
+    codes = [c.strip().upper() for c in place.split(",") if c.strip()]
+    return list(dict.fromkeys(codes)) or [place]
+
+
+def city_of(code: str) -> str:
+    """Metro code of an airport (LHR -> LON); any other code is its own city."""
+    code = code.strip().upper()
+    return _CITY_OF.get(code, code)
+
+
+def distinct_cities(codes: List[str]) -> bool:
+    """
+    True when every code is a metro code or one of its airports (so its city is known here) and
+    no two codes share a city. Only then may a Tequila request carry one_for_city=1, which answers
+    one offer per destination city: siblings of a city missing from METRO_AREAS (IST and SAW)
+    would otherwise share that one offer.
+    """
+    cities = set()
+    for code in codes:
+        code = code.strip().upper()
+        if code not in METRO_AREAS and code not in _CITY_OF:
+            return False
+        city = city_of(code)
+        if city in cities:
+            return False
+        cities.add(city)
+    return True
+
+
+def is_multi(place: str) -> bool:
+    return len(airports(place)) > 1
+
+
+def expand_leg(leg: Leg) -> List[Leg]:
+    """Airport-pair legs of a place leg (the leg itself when both ends are single airports)."""
+    origin, destination, date = leg
+    if not is_multi(origin) and not is_multi(destination):
+        return [leg]
+    return [(a, b, date) for a in airports(origin) for b in airports(destination) if a != b]
+
+
+def cheapest(pairs: List[Leg], quotes: Dict[Leg, Any], price_of) -> Optional[Dict[str, Any]]:
+    """
+    Cheapest priced quote among a place leg's airport pairs, tagged with the airports it flies
+    between: the quote's own when the pair has a metro code (LON) priced natively, else the pair's.
+    A rate-limited marker is returned only when no pair could be priced.
+    """
+    best, best_price, rate_limited = None, None, False
+    for pair in pairs:
+        quote = quotes.get(pair)
+        if isinstance(quote, dict) and quote.get("rate_limited"):
+            rate_limited = True
+            continue
+        price = price_of(quote)
+        if price is not None and (best_price is None or price < best_price):
+            best, best_price = (pair, quote), price
+    if best is None:
+        return {"rate_limited": True} if rate_limited else None
+    (origin, destination, _), quote = best
+    return dict(quote, origin_airport=quote.get("origin_airport") or origin,
+                destination_airport=quote.get("destination_airport") or destination)
@@ -0,0 +1,64 @@
+# pareto.py
+# Pareto frontier of itineraries over several minimized objectives (total price, total flight time,
+# total stops), returned by /find-route when the payload asks for more objectives than price.
+# Candidates are added one at a time: a candidate dominated by a frontier point is rejected and the
+# points it dominates are dropped, so the frontier never holds a dominated itinerary. Every objective
+# only grows as legs are added, so a partly scored candidate that is already dominated can be
+# abandoned before its remaining legs are priced and formatted (see ParetoFrontier.dominated).
+
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+OBJECTIVES = ("price", "duration", "stops")
+
+Vector = Tuple[float, ...]
+
+
+def dominates(a: Sequence[float], b: Sequence[float]) -> bool:
+    """a is no worse than b in every objective and better in at least one."""
+    return all(x <= y for x, y in zip(a, b)) and any(x < y for x, y in zip(a, b))
+
+
+class ParetoFrontier:
+    def __init__(self):
+        self._points: List[Tuple[Vector, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def dominated(self, vector: Sequence[float]) -> bool:
+        """
+        True if a frontier point is no worse than vector in every objective. Applied to a partial
+        sum this is safe pruning: the finished candidate can only get worse, so it would at best tie.
+        """
+        return any(all(p <= v for p, v in zip(point, vector)) for point, _ in self._points)
+
+    def add(self, vector: Sequence[float], item: Any) -> bool:
+        """Inserts item unless it is dominated or ties an existing point; returns whether it was kept."""
+        vector = tuple(vector)
+        if self.dominated(vector):
+            return False
+        self._points = [(p, it) for p, it in self._points if not dominates(vector, p)]
+        self._points.append((vector, item))
+        return True
+
+    def points(self) -> List[Tuple[Vector, Any]]:
+        """Frontier points ordered by the first objective (then the next ones)."""
+        return sorted(self._points, key=lambda pi: pi[0])
+
+
+def knee(vectors: Sequence[Vector]) -> Optional[int]:
+    """
+    Index of the best-value point: the smallest sum of objectives, each scaled to [0, 1] over the
+    frontier. Points with an unknown (infinite) objective are only picked if nothing else is known.
+    """
+    finite = [i for i, v in enumerate(vectors) if all(math.isfinite(x) for x in v)]
+    if not finite:
+        return 0 if vectors else None
+    lows = [min(vectors[i][d] for i in finite) for d in range(len(vectors[0]))]
+    highs = [max(vectors[i][d] for i in finite) for d in range(len(vectors[0]))]
+
+    def score(i: int) -> float:
+        return sum((x - lo) / (hi - lo) if hi > lo else 0.0 for x, lo, hi in zip(vectors[i], lows, highs))
+
+    return min(finite, key=score)
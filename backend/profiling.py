@@ -0,0 +1,109 @@
+# profiling.py
+# On-demand profiling of a single search, for diagnosing slow requests in production.
+# An admin sends X-Profile: 1 together with X-Admin-Token (must match the ADMIN_TOKEN env var;
+# profiling is disabled when it is unset). That find_route call runs under cProfile; the raw
+# pstats dump is stored under PROFILE_DIR (default backend/profiles) and a summary is returned in
+# the response: self time per phase (upstream waits, response parsing, cache, scoring, logging)
+# and the top functions by cumulative time.
+
+import cProfile
+import hmac
+import os
+import pstats
+import re
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+_PROFILE_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+
+# (phase, substrings matched against a function's file name or, for builtins, its name); first match wins
+_PHASES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("upstream_wait", ("provider_replay.py", "http_retry.py", "singleflight.py", "/requests/", "/urllib3/",
+                       "/http/client.py", "socket", "ssl", "time.sleep", "threading.py", "_thread.lock", "select")),
+    ("parsing", ("json_stream.py", "/json/", "_json", "tequila_client.py", "duffel_client.py",
+                 "amadeus_client.py", "travelpayouts_client.py")),
+    ("cache", ("cache_db.py", "sqlite3")),
+    ("logging", ("/logging/", "log_setup.py")),
+    ("scoring", ("/main.py",)),
+)
+
+
+def authorized(token: Optional[str]) -> bool:
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+
+def stored_path(profile_id: str) -> Optional[str]:
+    """Path of a stored pstats dump, or None if the id is malformed or unknown."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR), f"{profile_id}.pstats")
+    return path if os.path.isfile(path) else None
+
+
+def _phase(func: Tuple[str, int, str]) -> str:
+    filename, _, name = func
+    where = filename.replace("\\", "/") if filename != "~" else name
+    for phase, needles in _PHASES:
+        if any(n in where for n in needles):
+            return phase
+    return "other"
+
+
+def summarize(stats: pstats.Stats, top: int = 25) -> Dict[str, Any]:
+    phases: Dict[str, float] = {}
+    rows: List[Tuple[float, float, int, Tuple[str, int, str]]] = []
+    for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        phase = _phase(func)
+        phases[phase] = phases.get(phase, 0.0) + tottime
+        rows.append((cumtime, tottime, ncalls, func))
+    rows.sort(key=lambda r: r[0], reverse=True)
+    return {
+        "phases_s": {k: round(v, 6) for k, v in sorted(phases.items(), key=lambda kv: -kv[1])},
+        "top_cumulative": [
+            {"function": f"{os.path.basename(f[0])}:{f[1]}({f[2]})" if f[0] != "~" else f[2],
+             "calls": n, "self_s": round(tt, 6), "cumulative_s": round(ct, 6)}
+            for ct, tt, n, f in rows[:top]
+        ],
+    }
+
+
+def profile_call(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Runs fn under cProfile and returns (result, profile summary). The summary is also produced when
+    fn raises; it is attached to the exception as .profile before re-raising.
+    """
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    profiler = cProfile.Profile()
+    t0 = time.perf_counter()
+    result, error = None, None
+    profiler.enable()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        error = e
+    finally:
+        profiler.disable()
+    wall = time.perf_counter() - t0
+
+    stats = pstats.Stats(profiler)
+    summary = {"id": profile_id, "wall_s": round(wall, 6), **summarize(stats)}
+    profile_dir = os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{profile_id}.pstats")
+        stats.dump_stats(path)
+        # the summary goes back to the client: name the dump (GET /admin/profiles/{id}), not the server path
+        summary["file"] = os.path.basename(path)
+    except OSError:
+        # storing is best-effort; the summary is still returned
+        summary["file"] = None
+
+    if error is not None:
+        error.profile = summary
+        raise error
+    return result, summary
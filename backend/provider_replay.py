@@ -0,0 +1,235 @@
+# provider_replay.py
+# Record/replay stand-in for the upstream pricing APIs, for offline and reproducible benchmarking.
+#
+#   PROVIDER_MODE=live     (default) talk to the real APIs
+#   PROVIDER_MODE=record   talk to the real APIs and save every response under PROVIDER_FIXTURES_DIR
+#   PROVIDER_MODE=replay   serve saved responses without network, with injected faults:
+#       REPLAY_LATENCY_MS     added latency per call, "50" or a "20-200" uniform range
+#       REPLAY_ERROR_RATE     fraction of calls answered with HTTP 503
+#       REPLAY_429_RATE       fraction of calls answered with HTTP 429
+#       REPLAY_SEED           seed for the fault/latency generator
+#
+# A responder callable (provider, request) -> (status, headers, body) can stand in for the
+# fixture store in replay mode, e.g. a synthetic deterministic price function for benchmarks.
+#
+# Fixtures are keyed by provider, method, URL, query params and JSON body; credentials
+# (token/apikey params, auth headers) are neither part of the key nor stored. Replay still goes
+# through each client's credential check, so set any placeholder key for the provider replayed.
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger("gelidonia")
+
+SECRET_PARAMS = {"token", "apikey", "api_key", "key"}
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """
+    Process-wide pooled session for upstream HTTP: connections (DNS, TCP, TLS) are kept alive and
+    reused across requests instead of opened per call. HTTP_POOL_SIZE (default 32) connections per host.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                try:
+                    size = int(os.getenv("HTTP_POOL_SIZE", "32"))
+                except ValueError:
+                    size = 32
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=max(1, size))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+class ReplayError(Exception):
+    """Injected upstream failure for SDK-based providers; carries a response-like .response.status_code."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"replayed HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code, headers={})
+
+
+class ProviderReplay:
+    def __init__(self, mode: str = "live", fixtures_dir: str = DEFAULT_FIXTURES_DIR, latency_ms: str = "0",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: Optional[int] = None):
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.latency = _parse_range(latency_ms)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.responder: Optional[Callable[[str, Dict[str, Any]], Tuple[int, Dict[str, str], str]]] = None
+        self.stats = {"recorded": 0, "replayed": 0, "missed": 0, "injected_errors": 0, "injected_429": 0}
+
+    @classmethod
+    def from_env(cls) -> "ProviderReplay":
+        seed = os.getenv("REPLAY_SEED")
+        return cls(
+            mode=os.getenv("PROVIDER_MODE", "live").lower(),
+            fixtures_dir=os.getenv("PROVIDER_FIXTURES_DIR", DEFAULT_FIXTURES_DIR),
+            latency_ms=os.getenv("REPLAY_LATENCY_MS", "0"),
+            error_rate=float(os.getenv("REPLAY_ERROR_RATE", "0") or 0),
+            rate_limit_rate=float(os.getenv("REPLAY_429_RATE", "0") or 0),
+            seed=int(seed) if seed else None,
+        )
+
+    # ---------- fixture store ----------
+    def fixture_key(self, provider: str, request: Dict[str, Any]) -> str:
+        blob = json.dumps([provider, request], sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, provider: str, key: str) -> str:
+        return os.path.join(self.fixtures_dir, provider, f"{key}.json")
+
+    def save(self, provider: str, request: Dict[str, Any], status: int, headers: Dict[str, str], body: Any) -> None:
+        path = self._path(provider, self.fixture_key(provider, request))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"request": request, "status": status, "headers": headers, "body": body}, f)
+        os.replace(tmp, path)
+        self.stats["recorded"] += 1
+
+    def load(self, provider: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        path = self._path(provider, self.fixture_key(provider, request))
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # ---------- fault injection ----------
+    def _inject(self) -> Optional[int]:
+        """Sleeps the configured latency; returns 429/503 when a fault is injected."""
+        with self._rng_lock:
+            latency = self._rng.uniform(*self.latency)
+            roll = self._rng.random()
+        if latency > 0:
+            time.sleep(latency / 1000.0)
+        if roll < self.rate_limit_rate:
+            self.stats["injected_429"] += 1
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats["injected_errors"] += 1
+            return 503
+        return None
+
+    # ---------- HTTP providers ----------
+    def send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Drop-in for requests.request() (on the pooled http_session) used by http_retry.request_with_retry."""
+        if self.mode not in ("record", "replay"):
+            return http_session().request(method, url, **kwargs)
+        provider, request = _describe(method, url, kwargs)
+        if self.mode == "record":
+            resp = http_session().request(method, url, **kwargs)
+            # reading .content keeps the response usable (iter_content replays the buffered body)
+            self.save(provider, request, resp.status_code, _kept_headers(resp.headers), resp.content.decode("utf-8", "replace"))
+            return resp
+
+        fault = self._inject()
+        if fault is not None:
+            return _response(url, fault, {"Retry-After": "1"} if fault == 429 else {}, "{}")
+        if self.responder is not None:
+            self.stats["replayed"] += 1
+            return _response(url, *self.responder(provider, request))
+        fixture = self.load(provider, request)
+        if fixture is None:
+            self.stats["missed"] += 1
+            logger.warning("Replay miss for %s %s %s", provider, method, request.get("params"))
+            return _response(url, 404, {}, "{}")
+        self.stats["replayed"] += 1
+        return _response(url, fixture["status"], fixture.get("headers") or {}, fixture.get("body") or "")
+
+    # ---------- SDK providers ----------
+    def sdk_call(self, provider: str, request: Dict[str, Any], call: Callable[[], Any]) -> Any:
+        """
+        Wraps an SDK call whose response exposes .result (the parsed body) and .data, e.g. Amadeus.
+        Replayed responses are SimpleNamespace(status_code, result, data).
+        """
+        if self.mode == "record":
+            resp = call()
+            self.save(provider, request, getattr(resp, "status_code", 200), {}, getattr(resp, "result", None))
+            return resp
+        if self.mode != "replay":
+            return call()
+        fault = self._inject()
+        if fault is not None:
+            raise ReplayError(fault)
+        fixture = self.load(provider, request)
+        if fixture is None:
+            self.stats["missed"] += 1
+            logger.warning("Replay miss for %s %s", provider, request)
+            raise ReplayError(404)
+        self.stats["replayed"] += 1
+        body = fixture.get("body") or {}
+        return SimpleNamespace(status_code=fixture["status"], result=body, data=body.get("data"))
+
+
+def _parse_range(value: str) -> Tuple[float, float]:
+    try:
+        if "-" in str(value):
+            lo, hi = str(value).split("-", 1)
+            return float(lo), float(hi)
+        return float(value), float(value)
+    except ValueError:
+        return 0.0, 0.0
+
+
+def provider_for(url: str) -> str:
+    """Provider name for an upstream URL (fixture directory and metrics label)."""
+    host = urlsplit(url).netloc
+    if "duffel" in host:
+        return "duffel"
+    if "travelpayouts" in host:
+        return "travelpayouts"
+    if "rapidapi" in host:
+        return "rapidapi"
+    if "tequila" in host or "kiwi" in host:
+        return "tequila"
+    return host or "unknown"
+
+
+def _describe(method: str, url: str, kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    params = kwargs.get("params") or {}
+    if isinstance(params, dict):
+        params = {k: v for k, v in params.items() if k.lower() not in SECRET_PARAMS}
+    return provider_for(url), {"method": method.upper(), "url": url, "params": params, "json": kwargs.get("json")}
+
+
+def _kept_headers(headers) -> Dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() in ("content-type", "retry-after")}
+
+
+def _response(url: str, status: int, headers: Dict[str, str], body: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp.url = url
+    resp.headers = CaseInsensitiveDict(headers)
+    resp.encoding = "utf-8"
+    resp._content = body.encode("utf-8")
+    resp._content_consumed = True
+    return resp
+
+
+replay = ProviderReplay.from_env()
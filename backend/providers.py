@@ -0,0 +1,91 @@
+# providers.py
+# Lazy registry of the pricing clients. A client module is imported (building its SDK client,
+# sessions and settings-derived constants) the first time a search needs it, not when main is
+# imported, and only once. warm_up() runs at startup in a background thread: it loads the default
+# providers, touches the SQLite cache and lets each provider open its pooled upstream connection
+# (a module-level warm_up() hook), so the first search of a fresh worker pays none of it.
+# /ready reports the warm-up state for load balancers / autoscalers.
+
+import importlib
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("gelidonia")
+
+# provider name -> module; every client imports flat (uvicorn main:app from backend/) or as backend.*
+_MODULES: Dict[str, str] = {
+    "tequila": "tequila_client",
+    "travelpayouts": "travelpayouts_client",
+    "duffel": "duffel_client",
+    "amadeus": "amadeus_client",
+}
+DEFAULT_PROVIDERS = ("tequila",)
+
+_loaded: Dict[str, ModuleType] = {}
+_load_seconds: Dict[str, float] = {}
+_lock = threading.Lock()
+
+warmup: Dict[str, Any] = {"state": "idle", "seconds": None, "steps": {}, "errors": {}}
+
+
+def register(name: str, module: str) -> None:
+    with _lock:
+        _MODULES[name] = module
+        _loaded.pop(name, None)
+
+
+def get(name: str) -> ModuleType:
+    """The provider's client module, imported on first use; raises KeyError / ImportError."""
+    module = _loaded.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        if name not in _loaded:
+            t0 = time.perf_counter()
+            _loaded[name] = importlib.import_module(_MODULES[name])
+            _load_seconds[name] = time.perf_counter() - t0
+            logger.info("Provider %s loaded in %.1f ms", name, _load_seconds[name] * 1000)
+        return _loaded[name]
+
+
+def loaded() -> Dict[str, float]:
+    """Loaded providers -> import seconds."""
+    return dict(_load_seconds)
+
+
+def _step(name: str, fn) -> None:
+    t0 = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        # best-effort: a failed step is only slower on the first real request
+        warmup["errors"][name] = str(e)
+        logger.warning("Warm-up step %s failed: %s", name, e)
+    finally:
+        warmup["steps"][name] = round((time.perf_counter() - t0) * 1000, 3)
+
+
+def warm_up(names: Optional[List[str]] = None, cache_warm=None) -> Dict[str, Any]:
+    """Loads providers, runs cache_warm() and each provider's warm_up() hook; returns the warm-up state."""
+    warmup.update(state="running", steps={}, errors={})
+    t0 = time.perf_counter()
+    if cache_warm is not None:
+        _step("cache", cache_warm)
+    for name in names or DEFAULT_PROVIDERS:
+        _step(f"{name}.import", lambda: get(name))
+        hook = getattr(_loaded.get(name), "warm_up", None)
+        if callable(hook):
+            _step(f"{name}.connect", hook)
+    warmup.update(state="done", seconds=round(time.perf_counter() - t0, 6))
+    logger.info("Warm-up done in %.1f ms: %s", warmup["seconds"] * 1000, warmup["steps"])
+    return warmup
+
+
+def start_warm_up(names: Optional[List[str]] = None, cache_warm=None) -> threading.Thread:
+    warmup["state"] = "pending"
+    t = threading.Thread(target=warm_up, args=(names, cache_warm), name="warm-up", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,162 @@
+# search_jobs.py
+# Asynchronous search jobs: submit a payload, poll its status and partial results, cancel it.
+# Jobs wait in a bounded in-process queue (SEARCH_JOB_QUEUE_SIZE) served by a small pool of worker
+# threads (SEARCH_JOB_WORKERS). Each job runs inside a cancel_scope, so cancelling it stops its
+# pending leg fetches and retry sleeps (http_retry.SearchCancelled). Finished jobs are kept for
+# SEARCH_JOB_TTL_SEC and then dropped.
+
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from http_retry import SearchCancelled, cancel_scope, deadline_scope
+
+logger = logging.getLogger("gelidonia")
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, payload: Any):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        # progress and partial are replaced wholesale by the runner, so readers never see a half-updated dict
+        self.progress: Dict[str, int] = {}
+        self.partial: Any = None
+        self.result: Any = None
+        self.error: Optional[Dict[str, Any]] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress,
+            "cancel_requested": self.cancel_event.is_set(),
+        }
+        if self.status == "done":
+            out["result"] = self.result
+        else:
+            out["partial"] = self.partial
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+class JobQueue:
+    """
+    runner(job) performs the search and returns its result; it may update job.progress and job.partial.
+    An exception with status_code/detail attributes (e.g. HTTPException) fails the job with that status.
+    """
+
+    def __init__(self, runner: Callable[[Job], Any], workers: int = None, max_queued: int = None,
+                 ttl: float = None, timeout: float = None):
+        self.runner = runner
+        self.workers = max(1, workers if workers is not None else _env_int("SEARCH_JOB_WORKERS", 2))
+        self.ttl = ttl if ttl is not None else _env_int("SEARCH_JOB_TTL_SEC", 900)
+        # upper bound on one job's upstream retries (see http_retry.deadline_scope)
+        self.timeout = timeout if timeout is not None else _env_int("SEARCH_JOB_TIMEOUT_SEC", 600)
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max(1, max_queued if max_queued is not None
+                                                                   else _env_int("SEARCH_JOB_QUEUE_SIZE", 32)))
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads: list = []
+
+    def _start_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"search-job-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload: Any) -> Job:
+        self._sweep()
+        self._start_workers()
+        job = Job(payload)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise JobQueueFull(f"{self._queue.maxsize} jobs already queued")
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._sweep()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_event.set()
+        if job.status == "queued":
+            # the worker that dequeues it skips it
+            self._finish(job, "cancelled")
+        return job
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.finished_at = time.time()
+        job.status = status
+
+    def _sweep(self) -> None:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [k for k, j in self._jobs.items() if j.finished_at is not None and j.finished_at < cutoff]
+            for k in expired:
+                del self._jobs[k]
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancel_event.is_set():
+                    continue
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+        job.started_at = time.time()
+        job.status = "running"
+        try:
+            with cancel_scope(job.cancel_event), deadline_scope(self.timeout):
+                result = self.runner(job)
+        except SearchCancelled:
+            logger.info("Search job %s cancelled", job.id)
+            self._finish(job, "cancelled")
+            return
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            job.error = {"status": status or 500, "detail": getattr(e, "detail", None) or str(e)}
+            if status is None:
+                logger.exception("Search job %s failed", job.id)
+            self._finish(job, "cancelled" if job.cancel_event.is_set() else "failed")
+            return
+        job.result = result
+        self._finish(job, "cancelled" if job.cancel_event.is_set() else "done")
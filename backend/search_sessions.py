@@ -0,0 +1,63 @@
+# search_sessions.py
+# Incremental re-search: every /find-route response carries a session_id, and a follow-up search
+# that sends it back (e.g. with a city added or the window shifted) reuses that session's priced
+# leg matrix and scored candidates, so only the legs the change introduces go upstream.
+# Sessions live in process memory, LRU-bounded (SEARCH_SESSION_MAX) and expire after
+# SEARCH_SESSION_TTL_SEC of inactivity. An unknown or expired id simply starts a new session.
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+Leg = Tuple[str, str, str]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class SearchSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        # leg -> quote as returned by the pricing client (rate-limited markers are never stored)
+        self.quotes: Dict[Leg, Any] = {}
+        # candidate legs tuple -> scored candidate dict, or None if a leg had no price
+        self.scores: Dict[Tuple[Leg, ...], Optional[dict]] = {}
+        # carriers the quotes were priced without (main.excluded_airlines)
+        self.excluded: Tuple[str, ...] = ()
+        self.touched = time.monotonic()
+
+
+class SessionStore:
+    def __init__(self, ttl: float = None, max_sessions: int = None):
+        self.ttl = ttl if ttl is not None else _env_int("SEARCH_SESSION_TTL_SEC", 1800)
+        self.max_sessions = max(1, max_sessions if max_sessions is not None else _env_int("SEARCH_SESSION_MAX", 256))
+        self._sessions: "OrderedDict[str, SearchSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str]) -> Tuple[SearchSession, bool]:
+        """Returns (session, reused): the live session for session_id, or a fresh one."""
+        now = time.monotonic()
+        with self._lock:
+            # least recently used first, so expired sessions sit at the front
+            while self._sessions and now - next(iter(self._sessions.values())).touched > self.ttl:
+                self._sessions.popitem(last=False)
+            session = self._sessions.get(session_id) if session_id else None
+            reused = session is not None
+            if session is None:
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                session = SearchSession(uuid.uuid4().hex)
+                self._sessions[session.id] = session
+            session.touched = now
+            self._sessions.move_to_end(session.id)
+            return session, reused
+
+
+sessions = SessionStore()
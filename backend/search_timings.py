@@ -0,0 +1,82 @@
+# search_timings.py
+# Per-search timing breakdown, returned as the optional "timings" section of /find-route.
+# find_route opens a timings_scope(); the cache, the retry layer and the provider clients report
+# into the active SearchTimings through current(), which is None (and the hooks no-ops) outside a scope.
+
+import contextlib
+import contextvars
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_active: contextvars.ContextVar[Optional["SearchTimings"]] = contextvars.ContextVar("search_timings", default=None)
+
+
+class SearchTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.cache_seconds = 0.0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        # provider -> [seconds, attempts]
+        self.providers: Dict[str, list] = {}
+        self.legs_fetched = 0
+        # (seconds, origin, destinations, date) per upstream fetch; a batch prices several legs at once
+        self.fetches: List[Tuple[float, str, List[str], str]] = []
+        # legs: requested / unique / cached (set by the caller and the batch pricer); candidates: evaluated / pruned
+        self.counts: Dict[str, int] = {}
+        self.candidates: Dict[str, int] = {}
+
+    def add_cache(self, seconds: float, hit: bool) -> None:
+        self.cache_seconds += seconds
+        self.cache_lookups += 1
+        self.cache_hits += hit
+
+    def add_count(self, name: str, n: int) -> None:
+        # accumulates: a search may price its legs in several batches (adaptive search, jobs)
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_upstream(self, provider: str, seconds: float) -> None:
+        row = self.providers.setdefault(provider, [0.0, 0])
+        row[0] += seconds
+        row[1] += 1
+
+    def add_fetch(self, origin: str, destinations: List[str], date: str, seconds: float) -> None:
+        self.legs_fetched += len(destinations)
+        self.fetches.append((seconds, origin, list(destinations), date))
+
+    def as_dict(self, slowest: int = 5) -> Dict[str, Any]:
+        worst = sorted(self.fetches, key=lambda f: f[0], reverse=True)[:slowest]
+        legs = dict(self.counts, fetched=self.legs_fetched)
+        if "unique" in legs:
+            # served by a concurrent search's identical in-flight call
+            legs["shared"] = max(0, legs["unique"] - legs.get("cached", 0) - legs.get("session_reused", 0)
+                                 - self.legs_fetched)
+        return {
+            "total_ms": _ms(time.perf_counter() - self.started),
+            "cache": {"ms": _ms(self.cache_seconds), "lookups": self.cache_lookups, "hits": self.cache_hits},
+            "providers": {p: {"ms": _ms(s), "calls": n} for p, (s, n) in sorted(self.providers.items())},
+            "legs": legs,
+            "candidates": self.candidates,
+            "slowest_legs": [
+                {"origin": o, "destinations": ds, "date": date, "ms": _ms(s)}
+                for s, o, ds, date in worst
+            ],
+        }
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def current() -> Optional[SearchTimings]:
+    return _active.get()
+
+
+@contextlib.contextmanager
+def timings_scope() -> Iterator[SearchTimings]:
+    timings = SearchTimings()
+    token = _active.set(timings)
+    try:
+        yield timings
+    finally:
+        _active.reset(token)
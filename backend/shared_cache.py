@@ -0,0 +1,209 @@
+# shared_cache.py
+# Cross-process tier in front of the SQLite price_cache, for several uvicorn workers on one host.
+# SHARED_CACHE=mmap maps a fixed-size hash table file (SHARED_CACHE_PATH, default <CACHE_DB>.quotes)
+# into every worker, so a leg fetched by one worker is a memory read for all the others instead of
+# a SQLite query competing with their writes.
+#
+# Layout: a 64-byte header, then SHARED_CACHE_SLOTS slots of SHARED_CACHE_SLOT_BYTES each. A slot
+# holds one (origin, destination, date) -> quote entry; a key probes PROBE consecutive slots and
+# evicts the oldest of them when none is free. Readers never lock: every slot carries a sequence
+# number that is odd while a write is in progress (a seqlock), and a read whose sequence changed
+# under it is retried. Writes have a single writer: whoever holds the exclusive flock on a sidecar
+# lock file (and, within a worker, a thread lock, since threads share the flock). cache_db holds it
+# across its SQLite write and the slot update (writing()), so the host's workers never contend for
+# the SQLite write lock and both tiers see writes in the same order. Each slot keeps the quote's
+# fetched_at from SQLite: get(max_age=...) skips old entries as the SQLite query does, and a
+# promoted (read-through) copy never replaces a newer one. clear() bumps the header generation,
+# which invalidates every slot at once. Quotes too large for a slot stay SQLite-only (their old
+# slot is dropped).
+
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, the shared tier stays off
+    fcntl = None
+
+logger = logging.getLogger("gelidonia")
+
+MAGIC = b"GLDQ"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")  # magic, version, slots, slot size, generation
+HEADER_BYTES = 64
+SLOT = struct.Struct("<IQQqI")  # seq, generation, key hash, fetched_at, payload length
+PROBE = 8
+MISSING = object()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class SharedQuoteTable:
+    def __init__(self, path: str, slots: int = 16384, slot_bytes: int = 1024):
+        self.path = path
+        self.slots = max(PROBE, slots)
+        self.slot_bytes = max(SLOT.size + 64, slot_bytes)
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "skipped": 0}
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        size = HEADER_BYTES + self.slots * self.slot_bytes
+        with self._locked():
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != size or not self._header_ok(fd):
+                    # new file or another layout: start empty (the SQLite cache still has everything)
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, VERSION, self.slots, self.slot_bytes, 1), 0)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+
+    def _header_ok(self, fd: int) -> bool:
+        magic, version, slots, slot_bytes, _ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+        return (magic, version, slots, slot_bytes) == (MAGIC, VERSION, self.slots, self.slot_bytes)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # reentrant: put() runs inside a cache_db write that already holds the lock
+        with self._thread_lock:
+            if self._depth == 0:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def writing(self):
+        """Context making the caller the host's only cache writer (see the module comment)."""
+        return self._locked()
+
+    def _generation(self) -> int:
+        return HEADER.unpack_from(self._mm, 0)[4]
+
+    @staticmethod
+    def _key(origin: str, destination: str, date: str) -> Tuple[bytes, int]:
+        key = f"{origin}\x1f{destination}\x1f{date}".encode("utf-8")
+        return key, int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+    def _offset(self, index: int) -> int:
+        return HEADER_BYTES + (index % self.slots) * self.slot_bytes
+
+    def _read_slot(self, off: int) -> Optional[Tuple[int, int, int, bytes]]:
+        """(generation, hash, fetched_at, payload) of a consistent snapshot of the slot."""
+        for _ in range(16):
+            seq = struct.unpack_from("<I", self._mm, off)[0]
+            if seq & 1:
+                continue  # a write is in progress
+            raw = self._mm[off:off + self.slot_bytes]
+            if struct.unpack_from("<I", self._mm, off)[0] != seq:
+                continue
+            _, gen, h, fetched_at, length = SLOT.unpack_from(raw, 0)
+            return gen, h, fetched_at, raw[SLOT.size:SLOT.size + length]
+        return None
+
+    def get(self, origin: str, destination: str, date: str, max_age: Optional[int] = None) -> Any:
+        """The cached quote (possibly None for "no offers"), or MISSING; entries older than max_age seconds are MISSING."""
+        key, h = self._key(origin, destination, date)
+        generation = self._generation()
+        min_fetched = int(time.time()) - max_age if max_age is not None else None
+        start = h % self.slots
+        for i in range(PROBE):
+            snap = self._read_slot(self._offset(start + i))
+            if snap is None:
+                continue
+            gen, slot_hash, fetched_at, payload = snap
+            if gen == generation and slot_hash == h and payload.startswith(key + b"\x1e"):
+                if min_fetched is not None and fetched_at < min_fetched:
+                    break
+                self.stats["hits"] += 1
+                return json.loads(payload[len(key) + 1:])
+        self.stats["misses"] += 1
+        return MISSING
+
+    def _find(self, key: bytes, h: int, generation: int) -> Tuple[Optional[int], Optional[int], Optional[Tuple[int, int]]]:
+        """(the key's own slot, the first free slot, (fetched_at, slot) of the oldest entry) in the key's probe window."""
+        free, oldest = None, None
+        start = h % self.slots
+        for i in range(PROBE):
+            off = self._offset(start + i)
+            _, gen, slot_hash, slot_fetched, length = SLOT.unpack_from(self._mm, off)
+            if gen != generation or length == 0:
+                free = free if free is not None else off
+            elif slot_hash == h and self._mm[off + SLOT.size:off + SLOT.size + len(key) + 1] == key + b"\x1e":
+                return off, free, oldest
+            elif oldest is None or slot_fetched < oldest[0]:
+                oldest = (slot_fetched, off)
+        return None, free, oldest
+
+    def _write(self, off: int, payload: bytes, generation: int, h: int, fetched_at: int) -> None:
+        seq = struct.unpack_from("<I", self._mm, off)[0]
+        struct.pack_into("<I", self._mm, off, seq + 1)  # odd: readers retry
+        self._mm[off + SLOT.size:off + SLOT.size + len(payload)] = payload
+        struct.pack_into("<QQqI", self._mm, off + 4, generation, h, fetched_at, len(payload))
+        struct.pack_into("<I", self._mm, off, (seq + 2) & 0xFFFFFFFF)
+
+    def put(self, origin: str, destination: str, date: str, data: Any, fetched_at: Optional[int] = None,
+            if_newer: bool = False) -> bool:
+        """
+        Stores the quote with its SQLite fetched_at (default now). if_newer (a read-through copy) leaves
+        an entry fetched at the same time or later in place.
+        """
+        key, h = self._key(origin, destination, date)
+        payload = key + b"\x1e" + json.dumps(data, separators=(",", ":")).encode("utf-8")
+        fetched_at = int(time.time()) if fetched_at is None else fetched_at
+        with self._locked():
+            generation = self._generation()
+            same, free, oldest = self._find(key, h, generation)
+            if SLOT.size + len(payload) > self.slot_bytes:
+                if same is not None and not if_newer:
+                    # SQLite alone has the new quote: the old one must not be served
+                    self._write(same, b"", generation, 0, 0)
+                self.stats["skipped"] += 1
+                return False
+            if same is not None and if_newer and SLOT.unpack_from(self._mm, same)[3] >= fetched_at:
+                return False
+            # the key's own slot, else the first free one, else the oldest entry of the probe window
+            target = same if same is not None else free if free is not None else oldest[1]
+            self._write(target, payload, generation, h, fetched_at)
+        self.stats["writes"] += 1
+        return True
+
+    def clear(self) -> None:
+        with self._locked():
+            magic, version, slots, slot_bytes, generation = HEADER.unpack_from(self._mm, 0)
+            HEADER.pack_into(self._mm, 0, magic, version, slots, slot_bytes, generation + 1)
+
+
+def open_from_env(cache_db_path: str) -> Optional[SharedQuoteTable]:
+    """The shared table when SHARED_CACHE=mmap (and the platform supports it), else None."""
+    if os.getenv("SHARED_CACHE", "off").lower() != "mmap":
+        return None
+    if fcntl is None:
+        logger.warning("SHARED_CACHE=mmap needs fcntl (POSIX); shared quote cache disabled")
+        return None
+    path = os.getenv("SHARED_CACHE_PATH") or f"{cache_db_path}.quotes"
+    try:
+        table = SharedQuoteTable(path, _env_int("SHARED_CACHE_SLOTS", 16384), _env_int("SHARED_CACHE_SLOT_BYTES", 1024))
+    except OSError as e:
+        logger.warning("Could not open shared quote cache %s: %s", path, e)
+        return None
+    logger.info("Shared quote cache %s: %d slots x %d bytes", path, table.slots, table.slot_bytes)
+    return table
@@ -0,0 +1,135 @@
+# singleflight.py
+# Process-wide coalescing of identical in-flight upstream requests.
+# When several searches need the same (provider, origin, destination, date) leg at the same time,
+# the first caller (the leader) performs the upstream call and the others wait for it and share
+# its outcome: the returned quote, a {"rate_limited": True} marker, or the raised exception.
+# Exceptions marked leader_only (e.g. a cancelled search) are not shared: waiters retry the call.
+# A waiter whose own search is cancelled (http_retry.cancel_scope) stops waiting within WAIT_SLICE
+# seconds and raises SearchCancelled, without affecting the call it was waiting on.
+
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple
+
+try:
+    from http_retry import check_cancelled
+except ImportError:  # imported as backend.singleflight by the package-relative clients
+    from .http_retry import check_cancelled
+
+WAIT_SLICE = 0.05
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        # leaders: upstream calls made; shared: callers served by someone else's in-flight call
+        self.stats = {"leaders": 0, "shared": 0}
+
+    def _join(self, key: Hashable) -> Tuple[_Call, bool]:
+        """Returns (call, is_leader) for key, registering a new in-flight call if there is none."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["shared"] += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.stats["leaders"] += 1
+            return call, True
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        call.event.set()
+
+    @staticmethod
+    def _wait(call: _Call) -> Any:
+        while not call.event.wait(WAIT_SLICE):
+            check_cancelled()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs fn(*args, **kwargs) unless a call for key is already in flight, in which case its outcome is shared."""
+        call, leader = self._join(key)
+        while not leader:
+            try:
+                return self._wait(call)
+            except Exception as e:
+                if not getattr(e, "leader_only", False):
+                    raise
+                check_cancelled()
+                call, leader = self._join(key)
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def do_many(self, keys: Iterable[Hashable], fetch: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """
+        Batched variant of do(): fetch(owned_keys) is called once for the keys nobody else is
+        fetching and must return a dict keyed by them; keys already in flight are awaited.
+        The caller's own fetch completes before it waits on others, so overlapping batches can't deadlock.
+        """
+        owned: Dict[Hashable, _Call] = {}
+        waiting: Dict[Hashable, _Call] = {}
+        for key in dict.fromkeys(keys):
+            call, leader = self._join(key)
+            (owned if leader else waiting)[key] = call
+
+        results: Dict[Hashable, Any] = {}
+        if owned:
+            try:
+                fetched = fetch(list(owned))
+            except BaseException as e:
+                for key, call in owned.items():
+                    call.error = e
+                    self._finish(key, call)
+                raise
+            for key, call in owned.items():
+                call.result = results[key] = fetched.get(key)
+                self._finish(key, call)
+        retry: List[Hashable] = []
+        for key, call in waiting.items():
+            try:
+                results[key] = self._wait(call)
+            except Exception as e:
+                if not getattr(e, "leader_only", False):
+                    raise
+                check_cancelled()
+                retry.append(key)
+        if retry:
+            results.update(self.do_many(retry, fetch))
+        return results
+
+
+inflight = SingleFlight()
+
+
+def single_flight(provider: str):
+    """
+    Decorator for provider fetch_price_for_date(origin, destination, date, ...) functions: concurrent
+    calls for the same leg share one upstream request. Extra positional arguments (e.g. excluded
+    carriers) are part of the key. The undecorated function stays reachable as __wrapped__ for
+    callers that already own the leg's in-flight slot.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(origin: str, destination: str, date: str, *extra):
+            return inflight.do((provider, origin, destination, date) + extra, fn, origin, destination, date, *extra)
+        return wrapper
+    return decorator
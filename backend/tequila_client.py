@@ -1,18 +1,27 @@
 import time
 import logging
+import os
 import requests
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from collections import deque
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
 
 from config import settings
-from cache_db import get as cache_get, set_cache
+from cache_db import get as cache_get, get_range as cache_get_range, set_cache
+from json_stream import JSONArrayStream, cheapest_items
+from log_setup import Preview, leg_logger
+from singleflight import inflight, single_flight
+from http_retry import request_with_retry
+from provider_replay import http_session, replay
+from search_timings import current as current_timings
+import metro_areas
 
 
 logger = logging.getLogger("gelidonia")
 
 
-API_BASE = "https://api.tequila.kiwi.com"
+# TEQUILA_API_BASE points the client at another server, e.g. the load-test mock upstream
+API_BASE = os.getenv("TEQUILA_API_BASE", "https://api.tequila.kiwi.com").rstrip("/")
 SEARCH_ENDPOINT = f"{API_BASE}/v2/search"
 LOCATIONS_ENDPOINT = f"{API_BASE}/locations/query"
 
@@ -128,12 +137,282 @@ def _date_to_rapidapi_day_of_week(date_str: str) -> str:
         return ""
 
 
-def _rapid_fetch(origin: str, destination: str, date: str) -> Optional[Tuple[Dict[str, Any], str]]:
+def _tequila_search_params(fly_from: str, fly_to: str, date: str, limit: int = 50,
+                           exclude_airlines: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    date_fmt = _date_to_tequila(date)
+    params = {
+        "fly_from": fly_from,
+        "fly_to": fly_to,
+        "date_from": date_fmt,
+        "date_to": date_fmt,
+        "adults": 1,
+        "curr": settings.CURRENCY or "EUR",
+        "flight_type": "oneway",
+        "max_stopovers": 1,
+        "sort": "price",
+        "limit": limit,
+    }
+    if exclude_airlines:
+        # Tequila drops itineraries with a segment flown by any of these carriers
+        params["select_airlines"] = ",".join(exclude_airlines)
+        params["select_airlines_exclude"] = "true"
+    return params
+
+
+def cache_provider(exclude_airlines: Tuple[str, ...] = ()) -> str:
+    """
+    Provider prefix of price_cache rows: "KIW", or e.g. "KIW-W6,XX" for quotes priced without those
+    carriers, so searches excluding different airlines never share a cached or in-flight quote.
+    """
+    return "KIW-" + ",".join(exclude_airlines) if exclude_airlines else "KIW"
+
+
+def _parse_tequila_offer(offer: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """Maps a direct Tequila v2/search offer to the leg quote dict used by backend.main."""
+    try:
+        price_val = float(offer.get("price"))
+    except Exception:
+        price_val = None
+
+    currency = (settings.CURRENCY or "EUR")
+    deep_link = offer.get("deep_link")
+
+    airline_code = None
+    flight_number = None
+    departure_iso = None
+    duration_str = None
+    stops = None
+
+    try:
+        route = offer.get("route", [])
+        if route:
+            stops = len(route) - 1
+            first_seg = route[0]
+            airline_code = first_seg.get("airline") or (offer.get("airlines", [None]) or [None])[0]
+            if first_seg.get("airline") and first_seg.get("flight_no"):
+                flight_number = str(first_seg.get("flight_no"))
+            d_utc = first_seg.get("dTimeUTC")
+            if isinstance(d_utc, (int, float)):
+                departure_iso = datetime.fromtimestamp(int(d_utc), tz=timezone.utc).isoformat()
+            else:
+                departure_iso = offer.get("utc_departure") or offer.get("local_departure")
+    except Exception:
+        pass
+
+    try:
+        dur = offer.get("duration", {}).get("total")
+        if isinstance(dur, (int, float)):
+            duration_str = _format_duration_seconds(int(dur))
+    except Exception:
+        pass
+
+    actual_departure_date = date
+    local_dep = offer.get("local_departure")
+    if isinstance(local_dep, str) and len(local_dep) >= 10:
+        actual_departure_date = local_dep[:10]
+
+    quote = {
+        "price": price_val,
+        "currency": currency,
+        "airline": (airline_code or "TBD"),
+        "flight_number": (flight_number or "TBD"),
+        "duration": (duration_str or "TBD"),
+        "departure_time": (departure_iso or "TBD"),
+        "flight_link": (deep_link or None),
+        "stops": stops,
+        "actual_departure_date": actual_departure_date,  # Gerçek kalkış tarihi
+    }
+    # a metro-code search (LON) flies from / to one of the city's airports
+    for field, key in (("origin_airport", "flyFrom"), ("destination_airport", "flyTo")):
+        if offer.get(key):
+            quote[field] = offer[key]
+    return quote
+
+
+def _rapid_offer_price(offer: Any) -> Optional[float]:
+    """Price of a RapidAPI offer: a plain number (v2/search) or {"amount": ...} (one-way)."""
+    if not isinstance(offer, dict):
+        return None
+    price = offer.get("price")
+    try:
+        return float(price)
+    except (TypeError, ValueError):
+        pass
+    if isinstance(price, dict):
+        try:
+            return float(price.get("amount"))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _rapid_first_segment(offer: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """First flight segment of a one-way itinerary (sector.sectorSegments[0].segment), BFS as fallback."""
+    try:
+        segment = offer["sector"]["sectorSegments"][0]["segment"]
+        if isinstance(segment, dict) and "carrier" in segment and "duration" in segment:
+            return segment
+    except (KeyError, IndexError, TypeError):
+        pass
+    return _deep_find_first(offer, lambda d: "carrier" in d and "code" in d and "duration" in d)
+
+
+def _rapid_offer_airlines(offer: Dict[str, Any]) -> set:
+    """Carrier codes of a RapidAPI offer: v2/search "airlines" / route, or one-way sector segments."""
+    codes = set(offer.get("airlines") or ())
+    codes.update(seg.get("airline") for seg in offer.get("route") or () if isinstance(seg, dict))
+    try:
+        for item in offer["sector"]["sectorSegments"]:
+            carrier = (item.get("segment") or {}).get("carrier") or {}
+            codes.add(carrier.get("code"))
+    except (KeyError, TypeError, AttributeError):
+        pass
+    return {str(c).upper() for c in codes if c}
+
+
+def _parse_rapid_offer(offer: Dict[str, Any], price_val: float, date: str) -> Dict[str, Any]:
+    """Maps one RapidAPI offer (v2/search or one-way itinerary) to the leg quote dict used by backend.main."""
+    currency = (settings.CURRENCY or "EUR")
+    # bookingOptions.edges[0].node.bookingUrl is often a relative path
+    deep_link = None
+    try:
+        booking_url_path = (
+            offer.get("bookingOptions", {})
+            .get("edges", [{}])[0]
+            .get("node", {})
+            .get("bookingUrl")
+        )
+        if booking_url_path:
+            if booking_url_path.startswith("http"):
+                deep_link = booking_url_path
+            else:
+                deep_link = f"https://www.kiwi.com{booking_url_path}"
+    except Exception:
+        deep_link = None
+
+    segment = None
+    try:
+        segment = _rapid_first_segment(offer)
+    except Exception as e:
+        logger.error("Error locating RapidAPI offer segment: %s", e)
+
+    # Date check for v2/search which can return flights for other days
+    departure_utc_str = _deep_get(offer, "local_departure")
+    if not departure_utc_str: # fallback for one-way
+        source = segment.get("source") if segment else None
+        if not (isinstance(source, dict) and "utcTime" in source):
+            source = _deep_find_first(offer, lambda d: "localTime" in d and "utcTime" in d)
+        if source:
+            departure_utc_str = source.get("utcTime")
+
+    # Store actual departure date for display
+    actual_departure_date = date  # default to requested date
+    if departure_utc_str:
+        try:
+            departure_dt_utc = datetime.fromisoformat(departure_utc_str.replace("Z", "+00:00"))
+            actual_departure_date = departure_dt_utc.strftime("%Y-%m-%d")
+            if actual_departure_date != date:
+                leg_logger.debug(
+                    "Date mismatch - showing cheapest flight. Wanted %s, got %s",
+                    date, actual_departure_date
+                )
+        except (ValueError, TypeError):
+            logger.warning("Could not parse departure time from '%s'", departure_utc_str)
+
+    # --- Main data extraction ---
+    airline_code = "TBD"
+    flight_number = "TBD"
+    duration_str = "TBD"
+    departure_time = "TBD"
+    stops = None
+    try:
+        stops = len(offer["sector"]["sectorSegments"]) - 1
+    except (KeyError, TypeError):
+        pass
+
+    try:
+        if segment:
+            # Airline code
+            carrier = segment.get("carrier") or segment.get("operatingCarrier")
+            if isinstance(carrier, dict):
+                airline_code = carrier.get("code", "TBD")
+
+            # Flight number
+            flight_num_val = segment.get("code")
+            if flight_num_val:
+               flight_number = str(flight_num_val)
+
+            # Duration
+            duration_seconds = segment.get("duration")
+            if isinstance(duration_seconds, int):
+                duration_str = _format_duration_seconds(duration_seconds)
+
+            # Departure time
+            source = segment.get("source")
+            if isinstance(source, dict):
+                dep_utc = source.get("utcTime")
+                if dep_utc:
+                    departure_time = dep_utc
+    except Exception as e:
+        logger.error("Error parsing RapidAPI offer segment: %s", e)
+
+    # Prefer currency from offer if present
+    price = offer.get("price")
+    if isinstance(price, dict):
+        curr_from_offer = price.get("currency") or price.get("currencyCode")
+        if curr_from_offer:
+            currency = curr_from_offer
+
+    logger.debug(
+        "RapidAPI parsed keys airline=%s flight_number=%s duration=%s departure=%s link_set=%s price=%s",
+        airline_code, flight_number, duration_str, departure_time, bool(deep_link), price_val
+    )
+
+    return {
+        "price": price_val,
+        "currency": currency,
+        "airline": airline_code,
+        "flight_number": flight_number,
+        "duration": duration_str or "TBD",
+        "departure_time": departure_time or "TBD",
+        "flight_link": deep_link,
+        "stops": stops,
+        "actual_departure_date": actual_departure_date,  # Gerçek kalkış tarihi
+    }
+
+
+def _parse_cheapest_rapid_offer(items: List[Any], date: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses the cheapest RapidAPI offer (the first one on a price tie), None if none is priced.
+    Offers are ranked by price alone; segment/booking details are only extracted for the winner.
+    """
+    best = None
+    for idx, offer in enumerate(items):
+        price_val = _rapid_offer_price(offer)
+        if price_val is not None and (best is None or price_val < best[0]):
+            best = (price_val, idx)
+    return _parse_rapid_offer(items[best[1]], best[0], date) if best is not None else None
+
+
+def _rapid_fetch(origin: str, destination: str, date: str, keep: int = 1,
+                 exclude_airlines: Tuple[str, ...] = ()) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    Tries the RapidAPI search endpoints in order and returns ({items_key: offers}, endpoint_path).
+    The body is streamed and only the `keep` cheapest offers not flown by an excluded carrier are
+    retained; offers is None when the response has no items array.
+    """
     if not _is_rapid():
         return None
 
     headers = _rapid_headers()
     req_date_obj = datetime.strptime(date, "%Y-%m-%d")
+    excluded = set(exclude_airlines)
+
+    def price(offer: Any) -> Optional[float]:
+        # an offer flown by an excluded carrier counts as unpriced
+        if excluded and isinstance(offer, dict) and excluded & _rapid_offer_airlines(offer):
+            return None
+        return _rapid_offer_price(offer)
 
     # Order of preference for endpoints
     endpoints_to_try = _rapid_search_endpoints()
@@ -166,20 +445,25 @@ def _rapid_fetch(origin: str, destination: str, date: str) -> Optional[Tuple[Dic
             }
 
         try:
-            logger.info("RapidAPI GET %s url=%s params=%s", endpoint_name, url, str(params))
-            resp = requests.get(url, headers=headers, params=params, timeout=15)
-            logger.info("RapidAPI endpoint %s status %s", endpoint_name, resp.status_code)
+            leg_logger.debug("RapidAPI GET %s url=%s params=%s", endpoint_name, url, params)
+            resp = request_with_retry("GET", url, label=f"RapidAPI {endpoint_name}",
+                                      headers=headers, params=params, timeout=15, stream=True)
+            leg_logger.info("RapidAPI endpoint %s status %s", endpoint_name, resp.status_code)
             if resp.status_code == 200:
-                resp_json = resp.json()
-                # Validate that we got some data
                 items_key = "data" if endpoint_path in ["/v2/search", "/search"] else "itineraries"
-                if resp_json and resp_json.get(items_key):
-                    return resp_json, endpoint_path
-                else:
+                stream = JSONArrayStream.from_response(resp, (items_key,))
+                try:
+                    kept = cheapest_items(stream, price, keep)
+                finally:
+                    resp.close()
+                # Validate that we got some data
+                if not stream.count:
                     logger.warning("RapidAPI endpoint %s returned 200 but no flights in '%s'.", endpoint_name, items_key)
                     # This is a valid response (no flights), so we don't try other endpoints.
                     # We return the empty-but-valid response.
-                    return resp_json, endpoint_path
+                else:
+                    leg_logger.info("RapidAPI endpoint %s streamed %d offers, kept %d", endpoint_name, stream.count, len(kept))
+                return {items_key: (kept if stream.found else None)}, endpoint_path
 
             elif resp.status_code == 404:
                  logger.info("RapidAPI endpoint %s returned 404; trying next", endpoint_name)
@@ -191,7 +475,7 @@ def _rapid_fetch(origin: str, destination: str, date: str) -> Optional[Tuple[Dic
                     resp.status_code,
                     resp.text[:200],
                 )
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error("RapidAPI request failed for %s: %s", url, e)
             continue  # Try next endpoint
 
@@ -199,17 +483,29 @@ def _rapid_fetch(origin: str, destination: str, date: str) -> Optional[Tuple[Dic
     return None
 
 
-def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[Dict[str, Any]]:
+def warm_up() -> None:
+    """Opens a pooled connection (DNS, TCP, TLS) to the upstream host ahead of the first search."""
+    if replay.mode == "replay" or not (_is_rapid() or settings.TEQUILA_API_KEY):
+        return
+    http_session().head(_rapid_base() if _is_rapid() else API_BASE, timeout=5, allow_redirects=False).close()
+
+
+@single_flight("KIW")
+def fetch_price_for_date(origin: str, destination: str, date: str,
+                         exclude_airlines: Tuple[str, ...] = ()) -> Optional[Dict[str, Any]]:
     """
-    Queries Kiwi Tequila v2/search for the cheapest one-way flight on a given date.
+    Queries Kiwi Tequila v2/search for the cheapest one-way flight on a given date, leaving out
+    offers flown by the exclude_airlines carriers (sorted upper-case IATA codes).
     Returns a dict aligned with backend.main expectations:
       price (float), currency (str), airline (str), flight_number (str), duration (str),
       departure_time (str ISO), flight_link (str)
-    Results are cached by (origin, destination, date) with provider prefix.
+    Results are cached by (origin, destination, date) with provider prefix (see cache_provider);
+    concurrent calls for the same leg share one upstream request.
     """
+    cache_origin = f"{cache_provider(exclude_airlines)}|{origin}"
 
     if not getattr(settings, "DISABLE_CACHE", False):
-        cache = cache_get(f"KIW|{origin}", destination, date)
+        cache = cache_get(cache_origin, destination, date)
         if cache is not None:
             return cache
 
@@ -223,27 +519,16 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
         endpoint_path_used = None # Keep track of which endpoint succeeded
 
         if _is_rapid():
-            response_tuple = _rapid_fetch(origin, destination, date)
+            response_tuple = _rapid_fetch(origin, destination, date, exclude_airlines=exclude_airlines)
             if response_tuple:
                 data, endpoint_path_used = response_tuple
             else:
                 data = None
         else:
-            date_fmt = _date_to_tequila(date)
-            params = {
-                "fly_from": origin,
-                "fly_to": destination,
-                "date_from": date_fmt,
-                "date_to": date_fmt,
-                "adults": 1,
-                "curr": settings.CURRENCY or "EUR",
-                "flight_type": "oneway",
-                "max_stopovers": 1,
-                "sort": "price",
-                "limit": 50, # Increased from 5
-            }
-            logger.info("Tequila GET search %s-%s %s params=%s", origin, destination, date, params)
-            resp = requests.get(SEARCH_ENDPOINT, headers=_auth_headers(), params=params, timeout=25)
+            params = _tequila_search_params(origin, destination, date, exclude_airlines=exclude_airlines)
+            leg_logger.debug("Tequila GET search %s-%s %s params=%s", origin, destination, date, params)
+            resp = request_with_retry("GET", SEARCH_ENDPOINT, label=f"Tequila {origin}-{destination} {date}",
+                                      headers=_auth_headers(), params=params, timeout=25, stream=True)
             if resp.status_code == 401:
                 logger.error("Tequila unauthorized (401). Check TEQUILA_API_KEY")
                 return None
@@ -253,7 +538,12 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
             if resp.status_code not in (200,):
                 logger.error("Tequila HTTP %s: %s", resp.status_code, (resp.text or "")[:300])
                 return None
-            data = resp.json() if resp.text else {}
+            # Offers come sorted by price, so only the first one is decoded
+            try:
+                first = next(iter(JSONArrayStream.from_response(resp, ("data",))), None)
+            finally:
+                resp.close()
+            data = {"data": [first] if first is not None else []}
 
         if data is None:
             logger.error("No API response obtained from any source.")
@@ -267,147 +557,25 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
             if items is None: # Explicitly check for None, empty list is valid (no flights)
                 logger.info("RapidAPI response format error or key not found for %s-%s %s using %s.", origin, destination, date, endpoint_path_used)
                 if not getattr(settings, "DISABLE_CACHE", False):
-                    set_cache(f"KIW|{origin}", destination, date, None, fetched_at=int(time.time()))
+                    set_cache(cache_origin, destination, date, None, fetched_at=int(time.time()))
                 logger.debug("Tequila client returning None due to format error.")
                 return None # Return None on format error
             
             if not items:
                 logger.info("RapidAPI returned no flight offers for %s-%s on %s using %s.", origin, destination, date, endpoint_path_used)
                 if not getattr(settings, "DISABLE_CACHE", False):
-                    set_cache(f"KIW|{origin}", destination, date, {}, fetched_at=int(time.time())) # Cache empty result
+                    set_cache(cache_origin, destination, date, {}, fetched_at=int(time.time())) # Cache empty result
                 logger.debug("Tequila client returning {} due to no flights found in response.")
                 return {} # Return an empty dict to signify "no flights found", not an error
 
-            # Iterate through ALL offers to find the cheapest one
-            cheapest_offer = None
-            cheapest_price = float('inf')
-            
-            for offer in items:
-                logger.info("Full RapidAPI offer for %s-%s-%s: %s", origin, destination, date, str(offer))
-                try:
-                    price_val = float(offer.get("price"))
-                except (Exception, TypeError, ValueError):
-                    try:
-                        price_val = float(offer.get("price", {}).get("amount"))
-                    except (Exception, TypeError, ValueError):
-                        continue  # Skip offers without valid price
-
-                # Skip if price is higher than current cheapest
-                if price_val >= cheapest_price:
-                    continue
-
-                currency = (settings.CURRENCY or "EUR")
-                # bookingOptions.edges[0].node.bookingUrl is often a relative path
-                deep_link = None
-                try:
-                    booking_url_path = (
-                        offer.get("bookingOptions", {})
-                        .get("edges", [{}])[0]
-                        .get("node", {})
-                        .get("bookingUrl")
-                    )
-                    if booking_url_path:
-                        if booking_url_path.startswith("http"):
-                            deep_link = booking_url_path
-                        else:
-                            deep_link = f"https://www.kiwi.com{booking_url_path}"
-                except Exception:
-                    deep_link = None
-
-                # Date check for v2/search which can return flights for other days
-                departure_utc_str = _deep_get(offer, "local_departure")
-                if not departure_utc_str: # fallback for one-way
-                    first_segment = _deep_find_first(offer, lambda d: "localTime" in d and "utcTime" in d)
-                    if first_segment:
-                        departure_utc_str = first_segment.get("utcTime")
-
-                # Store actual departure date for display
-                actual_departure_date = date  # default to requested date
-                if departure_utc_str:
-                    try:
-                        departure_dt_utc = datetime.fromisoformat(departure_utc_str.replace("Z", "+00:00"))
-                        actual_departure_date = departure_dt_utc.strftime("%Y-%m-%d")
-                        if actual_departure_date != date:
-                            logger.info(
-                                "Date mismatch - showing cheapest flight. Wanted %s, got %s",
-                                date, actual_departure_date
-                            )
-                            # Don't skip - include in cheapest comparison
-                    except (ValueError, TypeError):
-                        logger.warning("Could not parse departure time from '%s'", departure_utc_str)
-                        # Continue with default date
-                
-                # --- Main data extraction ---
-                airline_code = "TBD"
-                flight_number = "TBD"
-                duration_str = "TBD"
-                departure_time = "TBD"
-                
-                try:
-                    # Find the first segment-like object
-                    segment = _deep_find_first(offer, lambda d: "carrier" in d and "code" in d and "duration" in d)
-                    if segment:
-                        # Airline code
-                        carrier = segment.get("carrier") or segment.get("operatingCarrier")
-                        if isinstance(carrier, dict):
-                            airline_code = carrier.get("code", "TBD")
-                        
-                        # Flight number
-                        flight_num_val = segment.get("code")
-                        if flight_num_val:
-                           flight_number = str(flight_num_val)
-
-                        # Duration
-                        duration_seconds = segment.get("duration")
-                        if isinstance(duration_seconds, int):
-                            duration_str = _format_duration_seconds(duration_seconds)
-                        
-                        # Departure time
-                        source = segment.get("source")
-                        if isinstance(source, dict):
-                            dep_utc = source.get("utcTime")
-                            if dep_utc:
-                                departure_time = dep_utc
-                
-                except Exception as e:
-                    logger.error("Error parsing RapidAPI offer segment: %s", e)
-
-                # Prefer currency from offer if present
-                try:
-                    curr_from_offer = offer.get("price", {}).get("currency") or offer.get("price", {}).get("currencyCode")
-                    if curr_from_offer:
-                        currency = curr_from_offer
-                except Exception:
-                    pass
-
-                # Debug log a small snapshot of keys to validate parsing in logs
-                try:
-                    logger.info(
-                        "RapidAPI parsed keys airline=%s flight_number=%s duration=%s departure=%s link_set=%s price=%s",
-                        airline_code, flight_number, duration_str, departure_time, bool(deep_link), price_val
-                    )
-                except Exception:
-                    pass
-
-                # This is the new cheapest offer
-                cheapest_price = price_val
-                cheapest_offer = {
-                    "price": price_val,
-                    "currency": currency,
-                    "airline": airline_code,
-                    "flight_number": flight_number,
-                    "duration": duration_str or "TBD",
-                    "departure_time": departure_time or "TBD",
-                    "flight_link": deep_link,
-                    "actual_departure_date": actual_departure_date,  # Gerçek kalkış tarihi
-                }
+            # Pick the cheapest offer by price alone, then parse details for it only
+            cheapest_offer = _parse_cheapest_rapid_offer(items, date)
 
             # Return the cheapest offer found
             if cheapest_offer:
-                logger.info("Leg fetch done %s-%s %s resp_type=%s resp_preview=%s (cheapest of %d offers)", 
-                           origin, destination, date, type(cheapest_offer).__name__, str(cheapest_offer)[:240], len(items))
+                leg_logger.debug("Leg fetch done %s-%s %s resp_preview=%s", origin, destination, date, Preview(cheapest_offer))
                 if not getattr(settings, "DISABLE_CACHE", False):
-                    set_cache(f"KIW|{origin}", destination, date, cheapest_offer, fetched_at=int(time.time()))
+                    set_cache(cache_origin, destination, date, cheapest_offer, fetched_at=int(time.time()))
                 return cheapest_offer
 
             # If loop finishes without finding any valid offer
@@ -417,65 +585,274 @@ def fetch_price_for_date(origin: str, destination: str, date: str) -> Optional[D
         else: # Legacy direct Tequila parsing
             items = data.get("data") if isinstance(data, dict) else None
             if not items:
-                logger.info("Tequila no offers for %s-%s %s", origin, destination, date)
+                leg_logger.info("Tequila no offers for %s-%s %s", origin, destination, date)
                 if not getattr(settings, "DISABLE_CACHE", False):
-                    set_cache(f"KIW|{origin}", destination, date, None, fetched_at=int(time.time()))
+                    set_cache(cache_origin, destination, date, None, fetched_at=int(time.time()))
                 return None
-            offer = items[0]
-            # Extract fields
-            try:
-                price_val = float(offer.get("price"))
-            except Exception:
-                price_val = None
+            result = _parse_tequila_offer(items[0], date)
 
-            currency = (settings.CURRENCY or "EUR")
-            deep_link = offer.get("deep_link")
+        if not getattr(settings, "DISABLE_CACHE", False):
+            set_cache(cache_origin, destination, date, result, fetched_at=int(time.time()))
+        return result
 
-            airline_code = None
-            flight_number = None
-            departure_iso = None
-            duration_str = None
+    except requests.RequestException as e:
+        logger.error("Tequila network error for %s-%s %s: %s", origin, destination, date, e)
+        return None
+    except ValueError as e:
+        logger.error("Tequila invalid JSON for %s-%s %s: %s", origin, destination, date, e)
+        return None
 
-            try:
-                route = offer.get("route", [])
-                if route:
-                    first_seg = route[0]
-                    airline_code = first_seg.get("airline") or (offer.get("airlines", [None]) or [None])[0]
-                    if first_seg.get("airline") and first_seg.get("flight_no"):
-                        flight_number = str(first_seg.get("flight_no"))
-                    d_utc = first_seg.get("dTimeUTC")
-                    if isinstance(d_utc, (int, float)):
-                        departure_iso = datetime.fromtimestamp(int(d_utc), tz=timezone.utc).isoformat()
-                    else:
-                        departure_iso = offer.get("utc_departure") or offer.get("local_departure")
-            except Exception:
-                pass
 
-            try:
-                dur = offer.get("duration", {}).get("total")
-                if isinstance(dur, (int, float)):
-                    duration_str = _format_duration_seconds(int(dur))
-            except Exception:
-                pass
+def cached_quotes(legs: List[Tuple[str, str, str]],
+                  exclude_airlines: Tuple[str, ...] = ()) -> Dict[Tuple[str, str, str], Optional[Dict[str, Any]]]:
+    """Quotes already in price_cache for (origin, destination, date) legs, without upstream calls."""
+    results: Dict[Tuple[str, str, str], Optional[Dict[str, Any]]] = {}
+    if getattr(settings, "DISABLE_CACHE", False):
+        return results
+    provider = cache_provider(exclude_airlines)
+    for leg in dict.fromkeys(legs):
+        origin, destination, date = leg
+        cache = cache_get(f"{provider}|{origin}", destination, date)
+        if cache is not None:
+            results[leg] = cache
+    timings = current_timings()
+    if timings is not None:
+        timings.add_count("cached", len(results))
+    return results
 
-            result = {
-                "price": price_val,
-                "currency": currency,
-                "airline": (airline_code or "TBD"),
-                "flight_number": (flight_number or "TBD"),
-                "duration": (duration_str or "TBD"),
-                "departure_time": (departure_iso or "TBD"),
-                "flight_link": (deep_link or None),
-                "actual_departure_date": actual_departure_date,  # Gerçek kalkış tarihi
-            }
 
+def fetch_prices_batch(legs: List[Tuple[str, str, str]],
+                       exclude_airlines: Tuple[str, ...] = ()) -> Dict[Tuple[str, str, str], Optional[Dict[str, Any]]]:
+    """
+    Prices many (origin, destination, date) legs with as few upstream calls as possible, leaving
+    out offers flown by the exclude_airlines carriers.
+    Legs are grouped by (origin, date) and each group is sent to Tequila v2/search as one
+    request with a comma-separated fly_to list (see _fetch_group for when one_for_city=1 is
+    used). Offers are split back into per-leg quotes shaped like fetch_price_for_date results
+    and cached per leg.
+    RapidAPI products don't reliably accept multi-destination queries, so in RapidAPI mode
+    (or without a direct key) every leg falls back to fetch_price_for_date.
+    Legs already being fetched by a concurrent search share that search's upstream call.
+    """
+    results = cached_quotes(legs, exclude_airlines)
+    pending = [leg for leg in dict.fromkeys(legs) if leg not in results]
+
+    # Legs another search is already fetching are awaited rather than requested again; the keys
+    # match fetch_price_for_date's single-flight keys, exclusion included
+    extra = (exclude_airlines,) if exclude_airlines else ()
+    keys = [("KIW",) + leg + extra for leg in pending]
+    for key, quote in inflight.do_many(keys, _fetch_legs).items():
+        results[key[1:4]] = quote
+    return results
+
+
+def _fetch_legs(keys: List[tuple]) -> Dict[tuple, Optional[Dict[str, Any]]]:
+    """
+    Upstream fetch for ("KIW", origin, destination, date[, exclude_airlines]) keys whose in-flight
+    slot the caller owns.
+    """
+    # the caller already holds these legs' single-flight slots, so bypass the coalescing wrapper
+    fetch_one = _timed(fetch_price_for_date.__wrapped__)
+    results: Dict[tuple, Optional[Dict[str, Any]]] = {}
+    if _is_rapid() or not settings.TEQUILA_API_KEY:
+        for key in keys:
+            results[key] = fetch_one(*key[1:])
+        return results
+
+    groups: Dict[tuple, List[str]] = {}
+    for _, origin, destination, date, *extra in keys:
+        groups.setdefault((origin, date, tuple(extra)), []).append(destination)
+
+    for (origin, date, extra), destinations in groups.items():
+        if len(destinations) > 1:
+            for destination, quote in _timed(_fetch_group)(origin, destinations, date, *extra).items():
+                results[("KIW", origin, destination, date) + extra] = quote
+        # destinations a batch could not settle (its offers were cut off by the limit) go alone
+        for destination in destinations:
+            if ("KIW", origin, destination, date) + extra not in results:
+                results[("KIW", origin, destination, date) + extra] = fetch_one(origin, destination, date, *extra)
+    return results
+
+
+def _timed(fetch):
+    """Wraps fetch(origin, destination(s), date, ...) to report its duration per leg to the active search timings."""
+    timings = current_timings()
+    if timings is None:
+        return fetch
+
+    def wrapper(origin, destinations, date, *extra):
+        t0 = time.perf_counter()
+        try:
+            return fetch(origin, destinations, date, *extra)
+        finally:
+            names = destinations if isinstance(destinations, list) else [destinations]
+            timings.add_fetch(origin, names, date, time.perf_counter() - t0)
+    return wrapper
+
+
+def _fetch_group(origin: str, destinations: List[str], date: str,
+                 exclude_airlines: Tuple[str, ...] = ()) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    One Tequila request for origin -> any of destinations on date; returns destination -> quote.
+    one_for_city=1 (one offer per destination city) is sent only when every destination is a
+    distinct known city. Otherwise all offers come back by price and the cheapest per destination
+    is kept here; destinations without an offer in a response cut off at the limit are left out
+    of the result (neither cached nor reported as "no flights").
+    """
+    one_for_city = metro_areas.distinct_cities(destinations)
+    limit = max(50, len(destinations) if one_for_city else 10 * len(destinations))
+    params = _tequila_search_params(origin, ",".join(destinations), date, limit=limit, exclude_airlines=exclude_airlines)
+    if one_for_city:
+        params["one_for_city"] = 1
+    try:
+        leg_logger.debug("Tequila GET batch search %s->%s %s", origin, params["fly_to"], date)
+        resp = request_with_retry("GET", SEARCH_ENDPOINT, label=f"Tequila batch {origin} {date}",
+                                  headers=_auth_headers(), params=params, timeout=25, stream=True)
+    except requests.RequestException as e:
+        logger.error("Tequila network error for batch %s->%s %s: %s", origin, ",".join(destinations), date, e)
+        return {d: None for d in destinations}
+    if resp.status_code == 429:
+        logger.warning("Tequila rate limited (429) for batch %s->%s %s", origin, ",".join(destinations), date)
+        return {d: {"rate_limited": True} for d in destinations}
+    if resp.status_code != 200:
+        logger.error("Tequila HTTP %s: %s", resp.status_code, (resp.text or "")[:300])
+        return {d: None for d in destinations}
+
+    # Items are sorted by price, so the first one seen per destination is its cheapest;
+    # stop reading once every destination has an offer. A metro code (LON) is matched by the
+    # offer's city, any other code by the airport flown to.
+    cheapest: Dict[str, Dict[str, Any]] = {}
+    wanted = set(destinations)
+    try:
+        stream = JSONArrayStream.from_response(resp, ("data",))
+        for offer in stream:
+            if not isinstance(offer, dict):
+                continue
+            city = offer.get("cityCodeTo")
+            for code in (offer.get("flyTo"), city if city in metro_areas.METRO_AREAS else None):
+                if code in wanted and code not in cheapest:
+                    cheapest[code] = offer
+            if len(cheapest) == len(wanted):
+                break
+        truncated = len(cheapest) < len(wanted) and stream.count >= limit
+    except (requests.RequestException, ValueError) as e:
+        logger.error("Tequila batch read failed for %s->%s %s: %s", origin, ",".join(destinations), date, e)
+        return {d: None for d in destinations}
+    finally:
+        resp.close()
+
+    quotes: Dict[str, Optional[Dict[str, Any]]] = {}
+    for destination in destinations:
+        offer = cheapest.get(destination)
+        if offer is None and truncated:
+            continue
+        quote = _parse_tequila_offer(offer, date) if offer is not None else None
         if not getattr(settings, "DISABLE_CACHE", False):
-            set_cache(f"KIW|{origin}", destination, date, result, fetched_at=int(time.time()))
-        return result
+            set_cache(f"{cache_provider(exclude_airlines)}|{origin}", destination, date, quote, fetched_at=int(time.time()))
+        quotes[destination] = quote
+    leg_logger.info("Tequila batch %s %s priced %d/%d destinations%s", origin, date,
+                sum(1 for q in quotes.values() if q), len(destinations), " (cut off at limit)" if truncated else "")
+    return quotes
+
+
+# Longest date range sent in one calendar request
+CALENDAR_CHUNK_DAYS = 31
+
 
+def fetch_price_calendar(origin: str, destination: str, date_from: str, date_to: str,
+                         max_age: Optional[int] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Cheapest quote per day for origin -> destination between date_from and date_to (YYYY-MM-DD, inclusive).
+    Days with a price_cache row younger than max_age seconds are answered from the cache; the rest
+    are filled by Tequila range queries (date_from..date_to with one_per_date=1, at most
+    CALENDAR_CHUNK_DAYS days per request) and cached per leg, like batch results.
+    In RapidAPI mode (or without a direct key) missing days are priced through fetch_prices_batch.
+    Days without offers map to None; a throttled range maps its days to {"rate_limited": True}.
+    """
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    n_days = (datetime.strptime(date_to, "%Y-%m-%d") - start).days + 1
+    days = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(max(0, n_days))]
+
+    calendar: Dict[str, Optional[Dict[str, Any]]] = {}
+    if not getattr(settings, "DISABLE_CACHE", False):
+        for day, quote in cache_get_range(f"KIW|{origin}", destination, date_from, date_to, max_age).items():
+            # null rows are failed lookups, {} rows are days known to have no offers
+            if quote is not None:
+                calendar[day] = quote or None
+    missing = [d for d in days if d not in calendar]
+    # every return lists the days in date order, whichever of them came from the cache
+    if not missing:
+        return {d: calendar.get(d) for d in days}
+
+    if _is_rapid() or not settings.TEQUILA_API_KEY:
+        quotes = fetch_prices_batch([(origin, destination, d) for d in missing])
+        calendar.update({d: quotes.get((origin, destination, d)) for d in missing})
+        return {d: calendar.get(d) for d in days}
+
+    # missing days are sorted; group them into ranges of at most CALENDAR_CHUNK_DAYS
+    chunks: List[List[str]] = []
+    for day in missing:
+        if chunks and days.index(day) - days.index(chunks[-1][0]) < CALENDAR_CHUNK_DAYS:
+            chunks[-1].append(day)
+        else:
+            chunks.append([day])
+    for chunk in chunks:
+        a, b = chunk[0], chunk[-1]
+        calendar.update(inflight.do(("KIW-CAL", origin, destination, a, b), _fetch_calendar_range, origin, destination, a, b))
+    return {d: calendar.get(d) for d in days}
+
+
+def _fetch_calendar_range(origin: str, destination: str, date_from: str, date_to: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    """One Tequila request for origin -> destination departing any day in date_from..date_to; returns day -> quote."""
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    n_days = (datetime.strptime(date_to, "%Y-%m-%d") - start).days + 1
+    days = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n_days)]
+    params = _tequila_search_params(origin, destination, date_from, limit=max(50, 2 * n_days))
+    params["date_to"] = _date_to_tequila(date_to)
+    params["one_per_date"] = 1
+    try:
+        leg_logger.debug("Tequila GET calendar %s-%s %s..%s", origin, destination, date_from, date_to)
+        resp = request_with_retry("GET", SEARCH_ENDPOINT, label=f"Tequila calendar {origin}-{destination}",
+                                  headers=_auth_headers(), params=params, timeout=25, stream=True)
     except requests.RequestException as e:
-        logger.error("Tequila network error for %s-%s %s: %s", origin, destination, date, e)
-        return None
+        logger.error("Tequila network error for calendar %s-%s %s..%s: %s", origin, destination, date_from, date_to, e)
+        return {d: None for d in days}
+    if resp.status_code == 429:
+        logger.warning("Tequila rate limited (429) for calendar %s-%s %s..%s", origin, destination, date_from, date_to)
+        return {d: {"rate_limited": True} for d in days}
+    if resp.status_code != 200:
+        logger.error("Tequila HTTP %s: %s", resp.status_code, (resp.text or "")[:300])
+        return {d: None for d in days}
+
+    # Sorted by price, so the first offer seen per departure day is that day's cheapest
+    cheapest: Dict[str, Dict[str, Any]] = {}
+    wanted = set(days)
+    try:
+        for offer in JSONArrayStream.from_response(resp, ("data",)):
+            if not isinstance(offer, dict):
+                continue
+            day = str(offer.get("local_departure") or "")[:10]
+            if day in wanted and day not in cheapest:
+                cheapest[day] = offer
+                if len(cheapest) == len(wanted):
+                    break
+    except (requests.RequestException, ValueError) as e:
+        logger.error("Tequila calendar read failed for %s-%s %s..%s: %s", origin, destination, date_from, date_to, e)
+        return {d: None for d in days}
+    finally:
+        resp.close()
+
+    quotes: Dict[str, Optional[Dict[str, Any]]] = {}
+    for day in days:
+        offer = cheapest.get(day)
+        quote = _parse_tequila_offer(offer, day) if offer is not None else None
+        if not getattr(settings, "DISABLE_CACHE", False):
+            # {} marks a day the range query returned no offers for
+            set_cache(f"KIW|{origin}", destination, day, quote or {}, fetched_at=int(time.time()))
+        quotes[day] = quote
+    leg_logger.info("Tequila calendar %s-%s %s..%s priced %d/%d days", origin, destination, date_from, date_to,
+                    len(cheapest), len(days))
+    return quotes
 
 
 def probe() -> Dict[str, Any]:
@@ -0,0 +1,71 @@
+"""
+Shared test setup: every test runs against the synthetic Tequila responder (benchmarks/synthetic.py)
+in provider_replay mode, with a fresh SQLite cache in its own temp dir.
+
+    cd backend && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+# read at import by config, provider_replay and main
+_tmpdir = tempfile.mkdtemp(prefix="gelidonia-tests-")
+os.environ["TEQUILA_API_KEY"] = "synthetic"
+os.environ["CACHE_DB"] = os.path.join(_tmpdir, "cache.db")
+os.environ["LOG_FILE"] = os.path.join(_tmpdir, "server.log")
+os.environ["DISABLE_CACHE"] = "false"
+os.environ["PROVIDER_MODE"] = "replay"
+os.environ["WARMUP"] = "false"
+os.environ.pop("SHARED_CACHE", None)
+
+import cache_db  # noqa: E402
+from provider_replay import replay as _replay  # noqa: E402
+from synthetic import synthetic_tequila  # noqa: E402
+
+CITY_POOL = ["BER", "BCN", "PAR", "ROM", "AMS", "VIE", "PRG", "LIS", "MAD", "ATH"]
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path):
+    """A fresh cache database per test; yields its path."""
+    path = str(tmp_path / "cache.db")
+    cache_db.init(path)
+    yield path
+
+
+@pytest.fixture(autouse=True)
+def replay():
+    """provider_replay answering with the synthetic responder; tests may swap replay.responder."""
+    _replay.responder = synthetic_tequila
+    _replay.error_rate = _replay.rate_limit_rate = 0.0
+    _replay.latency = (0.0, 0.0)
+    yield _replay
+    _replay.responder = synthetic_tequila
+
+
+@pytest.fixture
+def make_payload():
+    """Builds a search payload from IST over the first n synthetic cities, 3 days per city."""
+    import main
+
+    def make(n_cities=3, window_days=7, max_candidates=2, **fields):
+        start = datetime(2030, 6, 1)
+        trip_length = 3 * n_cities
+        values = dict(
+            start_range_start=start.strftime("%Y-%m-%d"),
+            start_range_end=(start + timedelta(days=window_days + trip_length - 1)).strftime("%Y-%m-%d"),
+            trip_length_days=trip_length,
+            start_airport="IST",
+            cities=CITY_POOL[:n_cities],
+            max_candidates=max_candidates,
+        )
+        values.update(fields)
+        return main.RequestPayload(**values)
+    return make
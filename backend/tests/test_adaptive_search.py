@@ -0,0 +1,46 @@
+"""Adaptive coarse-to-fine start-date search under a leg budget (main.adaptive_candidates)."""
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def no_candidate_cap(monkeypatch):
+    monkeypatch.setenv("MAX_CANDIDATES_HARD_CAP", "1000")
+    monkeypatch.setenv("RESULT_CACHE", "false")
+
+
+def test_budget_bounds_the_legs_priced(make_payload):
+    payload = make_payload(2, window_days=30, strategy="adaptive", leg_budget=40)
+    info = main.search_route(payload)["search"]
+    assert 0 < info["legs_fetched"] <= 40
+    assert len(info["start_dates_evaluated"]) < info["start_dates_feasible"] == 31
+    assert info["start_dates_evaluated"] == sorted(info["start_dates_evaluated"])
+
+
+def test_full_budget_finds_the_exhaustive_best(make_payload):
+    exhaustive = main.search_route(make_payload(2, window_days=12, max_candidates=13))
+    adaptive = main.search_route(make_payload(2, window_days=12, strategy="adaptive", leg_budget=400))
+    assert len(adaptive["search"]["start_dates_evaluated"]) == 13
+    assert adaptive["best_route"]["total_price"] == exhaustive["best_route"]["total_price"]
+
+
+def test_cached_legs_are_free(make_payload):
+    payload = make_payload(2, window_days=20, strategy="adaptive", leg_budget=30)
+    first = main.search_route(payload)["search"]
+    # a new session: the first search's legs come from price_cache and the whole budget goes to new start dates
+    again = main.search_route(payload)["search"]
+    assert again["legs_from_session"] == 0
+    assert set(first["start_dates_evaluated"]) < set(again["start_dates_evaluated"])
+
+
+def test_budget_below_one_start_still_prices_the_first(make_payload):
+    info = main.search_route(make_payload(3, window_days=5, strategy="adaptive", leg_budget=1))["search"]
+    assert info["start_dates_evaluated"] == ["2030-06-01"]
+
+
+def test_unknown_strategy_is_rejected(make_payload):
+    with pytest.raises(HTTPException) as e:
+        main.search_route(make_payload(2, strategy="greedy"))
+    assert e.value.status_code == 400
@@ -0,0 +1,106 @@
+"""Itinerary constraints (first_city, last_city, city_dates) applied before anything is priced."""
+import itertools
+import random
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from synthetic import synthetic_tequila
+
+
+def brute_force_orders(payload, allowed):
+    """What visit_orders(payload, allowed) must yield: the unconstrained orders, filtered."""
+    def ok(perm):
+        return all(any(perm[i].upper() == city for i in positions) for city, positions in allowed.items())
+    return [perm for perm in main.visit_orders(payload) if ok(perm)]
+
+
+def test_constrained_orders_match_filtered_permutations(make_payload):
+    rng = random.Random(7)
+    for _ in range(200):
+        n = rng.randint(2, 6)
+        cities = [rng.choice("ABCDEFG") for _ in range(n)]
+        first = rng.choice([None, cities[0]])
+        last = rng.choice([None, cities[-1]])
+        payload = make_payload(n, cities=cities, first_city=first, last_city=last)
+        allowed = {c: set(rng.sample(range(n), rng.randint(1, n))) for c in rng.sample(sorted(set(cities)), rng.randint(1, min(2, len(set(cities)))))}
+        assert list(main.visit_orders(payload, allowed)) == brute_force_orders(payload, allowed)
+
+
+def test_city_date_positions_cover_arrival_through_departure(make_payload):
+    payload = make_payload(3, city_dates={"BCN": "2030-06-04"})
+    legs = main.build_leg_dates(main.safe_date_parse("2030-06-01"), [3, 3, 3])
+    # 06-04 is the day the trip leaves the first city and arrives in the second
+    assert main.city_date_positions(payload, legs) == {"BCN": {0, 1}}
+    assert main.city_date_positions(payload.model_copy(update={"city_dates": {"BCN": "2030-07-01"}}), legs) is None
+
+
+def test_search_routes_respect_every_constraint(make_payload):
+    payload = make_payload(4, window_days=3, first_city="ROM", last_city="BER", city_dates={"PAR": "2030-06-05"})
+    result = main.search_route(payload)
+    for route in [result["best_route"]] + result["alternatives"]:
+        cities = route["route"][1:-1]
+        assert cities[0] == "ROM" and cities[-1] == "BER"
+        i = cities.index("PAR")
+        legs = route["leg_details"]
+        assert legs[i].departure_date <= "2030-06-05" <= legs[i + 1].departure_date
+
+
+@pytest.mark.parametrize("fields", [
+    {"first_city": "LIS"},
+    {"first_city": "BER", "last_city": "BER"},
+    {"city_dates": {"MAD": "2030-06-05"}},
+    {"city_dates": {"BER": "June 5"}},
+])
+def test_contradictory_constraints_are_rejected(make_payload, fields):
+    with pytest.raises(HTTPException) as e:
+        main.search_route(make_payload(3, **fields))
+    assert e.value.status_code == 400
+
+
+def test_eight_city_search_with_city_dates_is_fast(monkeypatch, make_payload):
+    monkeypatch.setenv("MAX_CANDIDATES_HARD_CAP", "1000")
+    monkeypatch.setenv("RESULT_CACHE", "false")
+    # two cities that can only be in the trip's first stop on the same day: no order satisfies both
+    conflicting = make_payload(8, window_days=14, city_dates={"BER": "2030-06-02", "BCN": "2030-06-02"})
+    t0 = time.perf_counter()
+    with pytest.raises(HTTPException) as e:
+        main.search_route(conflicting)
+    assert e.value.status_code == 400
+    assert time.perf_counter() - t0 < 1.0
+
+    payload = make_payload(8, window_days=14, max_candidates=3,
+                           city_dates={"PRG": "2030-06-02", "VIE": "2030-06-20", "LIS": "2030-06-12"})
+    t0 = time.perf_counter()
+    result = main.search_route(payload)
+    assert time.perf_counter() - t0 < 2.0
+    assert result["best_route"]["route"][1] == "PRG"
+
+
+def test_excluded_airline_leaves_the_next_cheapest_offer(replay, make_payload):
+    seen = []
+
+    def recording(provider, request):
+        seen.append(dict(request["params"]))
+        return synthetic_tequila(provider, request)
+
+    replay.responder = recording
+    session_id = main.search_route(make_payload(3))["session_id"]
+    seen.clear()
+    # lower-case and on a reused session: the quotes it holds were priced with XX allowed
+    result = main.search_route(make_payload(3, exclude_airlines=["xx"], session_id=session_id))
+    assert seen and all(p.get("select_airlines") == "XX" and p.get("select_airlines_exclude") == "true" for p in seen)
+    for route in [result["best_route"]] + result["alternatives"]:
+        assert {leg.airline for leg in route["leg_details"]} == {"YY"}
+    # the excluded quotes are cached apart: the unrestricted search still gets XX
+    again = main.search_route(make_payload(3))
+    assert {leg["airline"] if isinstance(leg, dict) else leg.airline
+            for leg in again["best_route"]["leg_details"]} == {"XX"}
+
+
+def test_excluding_every_airline_finds_nothing(make_payload):
+    with pytest.raises(HTTPException) as e:
+        main.search_route(make_payload(3, exclude_airlines=["XX", "YY"]))
+    assert e.value.status_code == 404
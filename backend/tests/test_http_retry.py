@@ -0,0 +1,79 @@
+"""Retry policy for upstream calls (http_retry): Retry-After, attempt budget and deadlines."""
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from http_retry import (RetryPolicy, SearchCancelled, cancel_scope, deadline_scope, parse_retry_after,
+                        request_with_retry)
+
+URL = "https://api.tequila.kiwi.com/v2/search"
+
+
+def scripted(*responses):
+    """Responder answering with the given (status, headers) in turn, then 200."""
+    calls = []
+
+    def respond(provider, request):
+        calls.append(time.monotonic())
+        status, headers = responses[len(calls) - 1] if len(calls) <= len(responses) else (200, {})
+        return status, headers, "{}"
+    return respond, calls
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_after_is_honoured(replay):
+    replay.responder, calls = scripted((429, {"Retry-After": "0.2"}), (503, {"Retry-After": "0"}))
+    resp = request_with_retry("GET", URL, policy=RetryPolicy(max_attempts=3, max_delay=1))
+    assert resp.status_code == 200
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.2
+
+
+def test_attempt_budget_returns_the_last_response(replay):
+    replay.responder, calls = scripted(*[(503, {})] * 5)
+    resp = request_with_retry("GET", URL, policy=RetryPolicy(max_attempts=2, base_delay=0.01))
+    assert resp.status_code == 503 and len(calls) == 2
+
+
+def test_long_retry_after_fails_fast(replay):
+    replay.responder, calls = scripted((429, {"Retry-After": "30"}))
+    t0 = time.monotonic()
+    resp = request_with_retry("GET", URL, policy=RetryPolicy(max_attempts=3, max_delay=8))
+    assert resp.status_code == 429 and len(calls) == 1
+    assert time.monotonic() - t0 < 1
+
+
+def test_no_sleep_runs_past_the_deadline(replay):
+    replay.responder, calls = scripted((429, {"Retry-After": "2"}))
+    t0 = time.monotonic()
+    with deadline_scope(0.5):
+        resp = request_with_retry("GET", URL, policy=RetryPolicy(max_attempts=3, max_delay=8))
+    assert resp.status_code == 429 and len(calls) == 1
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_inner_deadline_cannot_extend_the_outer_one():
+    policy = RetryPolicy(max_attempts=5, max_delay=8)
+    with deadline_scope(0.5):
+        with deadline_scope(60):
+            assert policy.delay_for(0, 1.0) is None
+            assert policy.delay_for(0, 0.1) == 0.1
+
+
+def test_cancel_scope_interrupts_a_backoff_sleep(replay):
+    replay.responder, calls = scripted((503, {"Retry-After": "5"}))
+    event = threading.Event()
+    threading.Timer(0.1, event.set).start()
+    t0 = time.monotonic()
+    with cancel_scope(event), pytest.raises(SearchCancelled):
+        request_with_retry("GET", URL, policy=RetryPolicy(max_attempts=3, max_delay=8))
+    assert len(calls) == 1 and time.monotonic() - t0 < 1
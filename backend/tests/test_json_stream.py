@@ -0,0 +1,53 @@
+"""Incremental JSON array decoding (json_stream)."""
+import json
+
+import pytest
+
+from json_stream import JSONArrayStream, cheapest_items
+
+
+def chunked(text, size):
+    data = text.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+BODY = json.dumps({
+    "currency": "EUR",
+    "meta": {"data": [0]},
+    "data": [{"price": 12.5, "city": "Zürich"}, {"price": -3e2, "nested": [1, [2], {"a": None}]}, 7, "x,]}"],
+    "_results": 4,
+})
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64 * 1024])
+def test_elements_match_json_loads_at_any_chunk_size(size):
+    stream = JSONArrayStream(chunked(BODY, size), ("data",), capture=[("currency",), ("_results",)])
+    assert list(stream) == json.loads(BODY)["data"]
+    assert (stream.found, stream.count) == (True, 4)
+    assert stream.captured[("currency",)] == "EUR"
+
+
+def test_nested_path_and_missing_array():
+    body = json.dumps({"data": {"offers": [{"id": 1}, {"id": 2}]}})
+    assert [o["id"] for o in JSONArrayStream(chunked(body, 5), ("data", "offers"))] == [1, 2]
+
+    stream = JSONArrayStream(chunked(json.dumps({"error": "nope"}), 4), ("data",))
+    assert list(stream) == [] and not stream.found
+
+
+def test_truncated_body_raises():
+    with pytest.raises(ValueError):
+        list(JSONArrayStream(chunked(BODY[:-20], 8), ("data",)))
+
+
+def test_stops_reading_when_the_caller_stops():
+    chunks = iter(chunked(json.dumps({"data": list(range(1000))}), 16))
+    stream = JSONArrayStream(chunks, ("data",))
+    assert next(iter(stream)) == 0
+    assert next(chunks, None) is not None  # most of the body is still unread
+
+
+def test_cheapest_items_keeps_input_order_on_ties_and_drops_unpriced():
+    items = [{"id": "a", "p": 5}, {"id": "b", "p": None}, {"id": "c", "p": 3}, {"id": "d", "p": 3}, {"id": "e", "p": 9}]
+    assert [i["id"] for i in cheapest_items(items, lambda i: i["p"], keep=3)] == ["c", "d", "a"]
+    assert [i["id"] for i in cheapest_items(iter(items), lambda i: i["p"])] == ["c"]
@@ -0,0 +1,43 @@
+"""Metro codes (LON) and airport lists ("LHR,STN") as trip places."""
+import pytest
+
+import main
+import metro_areas
+from fastapi import HTTPException
+from synthetic import synthetic_price
+
+
+def test_sibling_airports_in_one_batch_are_all_priced():
+    date = "2031-04-01"
+    legs = [("IST", code, date) for code in ("LHR", "STN", "LGW", "BER")]
+    quotes = main._tequila().fetch_prices_batch(legs)
+    assert {leg[1]: quotes[leg]["price"] for leg in legs} == {
+        leg[1]: synthetic_price("IST", leg[1], date) for leg in legs}
+
+
+def test_metro_code_is_priced_natively_with_its_airport(replay):
+    leg = ("IST", "LON", "2031-04-02")
+    assert metro_areas.expand_leg(leg) == [leg]
+    calls = replay.stats["replayed"]
+    quote = main.price_legs([leg])[leg]
+    assert replay.stats["replayed"] - calls == 1
+    prices = {a: synthetic_price("IST", a, leg[2]) for a in metro_areas.METRO_AREAS["LON"]}
+    assert quote["destination_airport"] == min(prices, key=prices.get)
+    assert quote["price"] == min(prices.values())
+
+
+def test_airport_list_over_the_limit_is_rejected(make_payload):
+    payload = make_payload(2, start_airport="LHR,LGW,STN,LTN,LCY")
+    with pytest.raises(HTTPException) as e:
+        main.check_constraints(payload)
+    assert e.value.status_code == 400
+
+
+def test_airport_list_to_metro_code_reports_the_real_airports():
+    date = "2031-04-03"
+    leg = ("LHR,STN", "PAR", date)
+    quote = main.price_legs([leg])[leg]
+    prices = {(a, b): synthetic_price(a, b, date) for a in ("LHR", "STN") for b in metro_areas.METRO_AREAS["PAR"]}
+    origin, destination = min(prices, key=prices.get)
+    assert (quote["origin_airport"], quote["destination_airport"]) == (origin, destination)
+    assert quote["price"] == prices[(origin, destination)]
@@ -0,0 +1,60 @@
+"""Pareto frontier over price, flight time and stops (pareto, objectives on /find-route)."""
+import math
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from pareto import ParetoFrontier, dominates, knee
+
+
+def test_frontier_keeps_only_non_dominated_points():
+    frontier = ParetoFrontier()
+    assert frontier.add((100, 300), "a")
+    assert frontier.add((80, 400), "b")
+    assert not frontier.add((120, 350), "dominated by a")
+    assert not frontier.add((100, 300), "ties a")
+    assert frontier.add((90, 200), "c")  # dominates a
+    assert [item for _, item in frontier.points()] == ["b", "c"]
+    assert frontier.dominated((95, 250)) and not frontier.dominated((85, 250))
+
+
+def test_dominates():
+    assert dominates((1, 2), (1, 3))
+    assert not dominates((1, 2), (1, 2))
+    assert not dominates((1, 4), (2, 3))
+
+
+def test_knee_picks_the_balanced_point_and_avoids_unknowns():
+    assert knee([(100, 600), (150, 310), (400, 300)]) == 1
+    assert knee([(100, math.inf), (150, 310)]) == 1
+    assert knee([(100, math.inf)]) == 0
+    assert knee([]) is None
+
+
+def brute_force_frontier(payload):
+    candidates = main.prepare_candidates(payload)
+    quotes = main.price_legs([leg for c in candidates for leg in c["legs"]])
+    scored = [c for c in (main._score_candidate(c, quotes) for c in candidates) if c]
+    vectors = {(c["total_price"], c["total_duration_minutes"]) for c in scored}
+    return {v for v in vectors if not any(dominates(w, v) for w in vectors)}
+
+
+def test_search_frontier_matches_brute_force(monkeypatch, make_payload):
+    monkeypatch.setenv("MAX_CANDIDATES_HARD_CAP", "1000")
+    payload = make_payload(3, window_days=6, max_candidates=7, objectives=["duration", "price"])
+    result = main.search_route(payload)
+    pareto = result["pareto"]
+    assert pareto["objectives"] == ["price", "duration"]
+    frontier = pareto["frontier"]
+    assert len(frontier) > 1
+    assert {(c["total_price"], c["total_duration_minutes"]) for c in frontier} == brute_force_frontier(payload)
+    assert frontier[pareto["cheapest"]]["total_price"] == result["best_route"]["total_price"]
+    assert frontier[pareto["fastest"]]["total_duration_minutes"] == min(c["total_duration_minutes"] for c in frontier)
+
+
+def test_price_only_search_has_no_frontier_and_unknown_objectives_fail(make_payload):
+    assert "pareto" not in main.search_route(make_payload(2))
+    with pytest.raises(HTTPException) as e:
+        main.search_route(make_payload(2, objectives=["price", "comfort"]))
+    assert e.value.status_code == 400
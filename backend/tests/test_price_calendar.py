@@ -0,0 +1,56 @@
+"""/price-calendar and tequila_client.fetch_price_calendar against the synthetic upstream."""
+import pytest
+from fastapi.testclient import TestClient
+
+import cache_db
+import main
+from config import settings
+from synthetic import synthetic_price
+
+DAYS = ["2031-03-01", "2031-03-02", "2031-03-03", "2031-03-04", "2031-03-05"]
+
+client = TestClient(main.app)
+
+
+@pytest.mark.parametrize("api_key", ["synthetic", ""], ids=["range-query", "no-key"])
+def test_calendar_days_in_date_order_with_cached_middle_day(monkeypatch, api_key):
+    monkeypatch.setattr(settings, "TEQUILA_API_KEY", api_key)
+    cache_db.set_cache("KIW|IST", "VIE", DAYS[2], {"price": 1.0, "currency": "EUR"}, 2**40)
+
+    calendar = main._tequila().fetch_price_calendar("IST", "VIE", DAYS[0], DAYS[-1])
+    assert list(calendar) == DAYS
+    if not api_key:
+        # only the missing days are priced; a range query re-prices the whole range
+        assert calendar[DAYS[2]]["price"] == 1.0
+
+    # answered from the cache alone
+    assert list(main._tequila().fetch_price_calendar("IST", "VIE", DAYS[0], DAYS[-1])) == DAYS
+
+
+def test_endpoint_prices_every_day_in_one_range_query(replay):
+    calls = replay.stats["replayed"]
+    body = client.get("/price-calendar", params={"origin": "ist", "destination": "vie",
+                                                 "date_from": DAYS[0], "date_to": DAYS[-1]}).json()
+    assert replay.stats["replayed"] - calls == 1
+    assert [(d["date"], d["price"]) for d in body["days"]] == [(d, synthetic_price("IST", "VIE", d)) for d in DAYS]
+    assert body["cheapest"]["price"] == min(synthetic_price("IST", "VIE", d) for d in DAYS)
+
+    # fresh cached days are not asked for again
+    client.get("/price-calendar", params={"origin": "IST", "destination": "VIE",
+                                          "date_from": DAYS[1], "date_to": DAYS[3]})
+    assert replay.stats["replayed"] - calls == 1
+
+
+@pytest.mark.parametrize("date_from,date_to", [(DAYS[3], DAYS[0]), ("2031-01-01", "2031-12-31"), ("tomorrow", DAYS[0])])
+def test_endpoint_rejects_bad_ranges(date_from, date_to):
+    resp = client.get("/price-calendar", params={"origin": "IST", "destination": "VIE",
+                                                 "date_from": date_from, "date_to": date_to})
+    assert resp.status_code == 400
+
+
+def test_rate_limited_range_is_a_503(replay, monkeypatch):
+    monkeypatch.setenv("RETRY_MAX_ATTEMPTS", "1")
+    replay.responder = lambda provider, request: (429, {}, "{}")
+    resp = client.get("/price-calendar", params={"origin": "IST", "destination": "VIE",
+                                                 "date_from": DAYS[0], "date_to": DAYS[1]})
+    assert resp.status_code == 503
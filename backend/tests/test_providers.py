@@ -0,0 +1,42 @@
+"""The lazy provider registry and process setup deferred to the startup hook."""
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import cache_db
+import main
+import providers
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_every_client_is_registered():
+    assert {"tequila", "travelpayouts", "duffel", "amadeus"} <= set(providers._MODULES)
+    assert providers.get("duffel").__name__ == "duffel_client"
+
+
+def test_amadeus_loads_through_the_registry():
+    pytest.importorskip("amadeus")
+    assert providers.get("amadeus").__name__ == "amadeus_client"
+
+
+def test_importing_main_opens_no_cache_and_no_log_file(tmp_path):
+    workdir = tmp_path / "import"
+    workdir.mkdir()
+    env = dict(os.environ, CACHE_DB=str(workdir / "cache.db"), LOG_FILE=str(workdir / "server.log"))
+    code = "import cache_db, main; print(cache_db.DB_PATH)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "None"
+    assert not os.listdir(workdir)
+
+
+def test_startup_hook_configures_logging_and_the_cache(monkeypatch, tmp_path):
+    path = str(tmp_path / "startup.db")
+    monkeypatch.setattr(main.settings, "CACHE_DB", path)
+    with TestClient(main.app):
+        assert cache_db.DB_PATH == path
+    assert os.path.exists(path)
@@ -0,0 +1,28 @@
+"""Cheapest-offer selection for RapidAPI responses (tequila_client._parse_cheapest_rapid_offer)."""
+import tequila_client as tc
+
+DATE = "2031-05-01"
+
+
+def itinerary(amount, code):
+    segment = {"source": {"localTime": f"{DATE}T08:00:00", "utcTime": f"{DATE}T06:00:00Z"},
+               "carrier": {"code": "TK"}, "code": code, "duration": 7200}
+    return {"price": {"amount": amount, "currency": "EUR"},
+            "sector": {"sectorSegments": [{"segment": segment}]}}
+
+
+def test_cheapest_offer_is_parsed():
+    items = [itinerary("120.50", "1"), itinerary("80", "2"), itinerary("95", "3")]
+    quote = tc._parse_cheapest_rapid_offer(items, DATE)
+    assert (quote["price"], quote["flight_number"]) == (80.0, "2")
+
+
+def test_price_tie_keeps_upstream_order():
+    items = [itinerary("90", "1"), itinerary("70", "2"), itinerary("70", "3")]
+    assert tc._parse_cheapest_rapid_offer(items, DATE)["flight_number"] == "2"
+
+
+def test_unpriced_offers_are_skipped():
+    items = [itinerary(None, "1"), "not an offer", itinerary("60", "2")]
+    assert tc._parse_cheapest_rapid_offer(items, DATE)["flight_number"] == "2"
+    assert tc._parse_cheapest_rapid_offer([itinerary(None, "1")], DATE) is None
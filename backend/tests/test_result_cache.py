@@ -0,0 +1,67 @@
+"""Whole-response cache for /find-route (main.search_route, cache_db result_cache)."""
+import json
+import time
+
+import cache_db
+import main
+
+
+def as_json(obj):
+    return json.loads(json.dumps(obj, default=cache_db._jsonable))
+
+
+def search(payload):
+    result = main.search_route(payload)
+    return result, main.result_cache_key(main.normalize_payload(payload))
+
+
+def test_repeated_search_is_answered_from_the_result_cache(replay, make_payload):
+    payload = make_payload(3)
+    first, key = search(payload)
+    calls, hits = replay.stats["replayed"], cache_db.result_stats["hits"]
+
+    # the same search spelled differently
+    second, _ = search(payload.model_copy(update={"start_airport": "ist", "cities": [c.lower() for c in payload.cities]}))
+    assert cache_db.result_stats["hits"] == hits + 1
+    assert replay.stats["replayed"] == calls
+    assert as_json(second["best_route"]) == as_json(first["best_route"])
+    assert second["session_id"] != first["session_id"]
+
+
+def test_refreshing_a_leg_drops_the_results_built_from_it(make_payload):
+    result, key = search(make_payload(3))
+    assert cache_db.get_result(key) is not None
+    leg = as_json(result["best_route"])["leg_details"][0]
+    origin, destination, date = leg["origin"], leg["destination"], leg["departure_date"]
+
+    # a leg no cached result used leaves them alone
+    cache_db.set_cache("KIW|IST", "ATH", date, {"price": 1.0}, int(time.time()))
+    assert cache_db.get_result(key) is not None
+
+    # the leg cache keys origins by provider ("KIW|IST"); results list bare legs
+    cache_db.set_cache(f"KIW|{origin}", destination, date, {"price": 1.0}, int(time.time()))
+    assert cache_db.get_result(key) is None
+
+
+def test_result_expires_with_its_oldest_leg(monkeypatch, make_payload):
+    monkeypatch.setenv("RESULT_CACHE_TTL_SEC", "60")
+    result, key = search(make_payload(2, max_candidates=1))
+    stored = cache_db.get_result(key)
+    assert stored is not None and "session_id" not in stored
+
+    # legs fetched over a TTL ago make a response that would already be stale: it is not stored
+    for leg in as_json(result["best_route"])["leg_details"]:
+        cache_db.set_cache(f"KIW|{leg['origin']}", leg["destination"], leg["departure_date"],
+                           {"price": 1.0}, int(time.time()) - 120)
+    main.search_route(make_payload(2, max_candidates=1))
+    assert cache_db.get_result(key) is None
+
+
+def test_timings_and_kill_switch_bypass_the_result_cache(monkeypatch, make_payload):
+    payload = make_payload(2)
+    search(payload)
+    hits = cache_db.result_stats["hits"]
+    assert "timings" in main.search_route(payload.model_copy(update={"include_timings": True}))
+    monkeypatch.setenv("RESULT_CACHE", "false")
+    main.search_route(payload)
+    assert cache_db.result_stats["hits"] == hits
@@ -0,0 +1,34 @@
+"""/find-route/batch: payloads searched from one shared leg matrix."""
+import json
+
+import cache_db
+import main
+
+
+def as_json(value):
+    return json.loads(json.dumps(value, default=cache_db._jsonable))
+
+
+def test_batch_plans_each_payload_once_and_prices_shared_legs_once(monkeypatch, replay, make_payload):
+    monkeypatch.setenv("RESULT_CACHE", "false")
+    plans = []
+    prepare = main.prepare_candidates
+    monkeypatch.setattr(main, "prepare_candidates", lambda payload: plans.append(payload) or prepare(payload))
+    payloads = [make_payload(3), make_payload(3, window_days=5)]
+    calls = replay.stats["replayed"]
+    batch = main._search_batch(payloads)
+    assert len(plans) == len(payloads)
+    assert batch["legs"]["unique"] < batch["legs"]["requested"]
+    assert [r["status"] for r in batch["results"]] == [200, 200]
+    # no leg is fetched beyond the shared union
+    assert replay.stats["replayed"] - calls <= batch["legs"]["unique"]
+
+
+def test_batch_results_match_single_searches(monkeypatch, make_payload):
+    monkeypatch.setenv("RESULT_CACHE", "false")
+    payloads = [make_payload(2), make_payload(3), make_payload(3, first_city="LIS")]
+    batch = main._search_batch(payloads)
+    assert batch["results"][2]["status"] == 400
+    for payload, item in zip(payloads[:2], batch["results"]):
+        single = main.search_route(payload)
+        assert as_json(item["result"]["best_route"]) == as_json(single["best_route"])
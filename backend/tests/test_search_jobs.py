@@ -0,0 +1,88 @@
+"""Asynchronous search jobs (search_jobs, /jobs/find-route): completion, failure and cancellation."""
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from search_jobs import JobQueue, JobQueueFull
+
+client = TestClient(main.app)
+
+
+def poll(job_id, until, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if until(job) or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_job_result_matches_find_route(make_payload):
+    payload = make_payload(3)
+    job = client.post("/jobs/find-route", json=payload.model_dump()).json()
+    assert job["status"] in ("queued", "running", "done")
+    job = poll(job["job_id"], lambda j: j["status"] == "done")
+    assert job["status"] == "done"
+    assert job["progress"]["start_dates_done"] == job["progress"]["start_dates_total"]
+    direct = client.post("/find-route", json=payload.model_dump()).json()
+    assert job["result"]["best_route"]["total_price"] == direct["best_route"]["total_price"]
+
+
+def test_invalid_job_fails_with_its_status(make_payload):
+    payload = make_payload(3, first_city="LHR")
+    job = client.post("/jobs/find-route", json=payload.model_dump()).json()
+    job = poll(job["job_id"], lambda j: j["status"] != "queued" and j["status"] != "running")
+    assert job["status"] == "failed" and job["error"]["status"] == 400
+
+
+def test_cancel_stops_a_job_waiting_on_upstream_retries(replay, make_payload):
+    calls = []
+
+    def throttled(provider, request):
+        calls.append(1)
+        return 503, {"Retry-After": "3"}, "{}"
+
+    replay.responder = throttled
+    job = client.post("/jobs/find-route", json=make_payload(2).model_dump()).json()
+    poll(job["job_id"], lambda j: calls)
+    t0 = time.monotonic()
+    assert client.delete(f"/jobs/{job['job_id']}").json()["cancel_requested"]
+    job = poll(job["job_id"], lambda j: j["status"] == "cancelled")
+    assert job["status"] == "cancelled"
+    assert time.monotonic() - t0 < 1.5
+    n = len(calls)
+    time.sleep(0.2)
+    assert len(calls) == n
+
+
+def test_unknown_job_is_a_404():
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.delete("/jobs/nope").status_code == 404
+
+
+def test_queued_job_cancelled_before_it_runs_never_runs():
+    release, ran = threading.Event(), []
+
+    def runner(job):
+        ran.append(job.payload)
+        release.wait(5)
+        return job.payload
+
+    jobs = JobQueue(runner, workers=1, max_queued=1)
+    first = jobs.submit("first")
+    deadline = time.monotonic() + 5
+    while first.status != "running" and time.monotonic() < deadline:
+        time.sleep(0.005)
+    second = jobs.submit("second")
+    with pytest.raises(JobQueueFull):
+        jobs.submit("third")
+    assert jobs.cancel(second.id).status == "cancelled"
+    release.set()
+    while first.status != "done" and time.monotonic() < deadline:
+        time.sleep(0.005)
+    jobs._queue.join()
+    assert ran == ["first"] and first.result == "first"
+    assert second.snapshot()["status"] == "cancelled"
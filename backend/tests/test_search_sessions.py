@@ -0,0 +1,65 @@
+"""Incremental re-search sessions (search_sessions, session_id on /find-route)."""
+import json
+
+import pytest
+
+import cache_db
+import main
+import search_sessions
+from config import settings
+
+
+@pytest.fixture
+def no_leg_cache(monkeypatch):
+    """Only the session can spare an upstream call."""
+    monkeypatch.setattr(settings, "DISABLE_CACHE", True)
+
+
+def as_json(obj):
+    return json.loads(json.dumps(obj, default=cache_db._jsonable))
+
+
+def calls_for(replay, payload):
+    before = replay.stats["replayed"]
+    result = main.search_route(payload)
+    return result, replay.stats["replayed"] - before
+
+
+def test_same_search_in_its_session_goes_upstream_zero_times(replay, make_payload, no_leg_cache):
+    payload = make_payload(3)
+    first, calls = calls_for(replay, payload)
+    assert calls > 0
+    again, calls = calls_for(replay, payload.model_copy(update={"session_id": first["session_id"]}))
+    assert calls == 0
+    assert again["session_id"] == first["session_id"]
+    assert as_json(again["best_route"]) == as_json(first["best_route"])
+
+
+def test_added_city_prices_only_the_new_legs(replay, make_payload, no_leg_cache):
+    first = main.search_route(make_payload(3))
+    bigger = make_payload(4, window_days=4, max_candidates=1)
+    _, fresh_calls = calls_for(replay, bigger)
+    result, session_calls = calls_for(replay, bigger.model_copy(update={"session_id": first["session_id"]}))
+    fresh = main.search_route(bigger)
+    assert session_calls < fresh_calls
+    assert as_json(result["best_route"]) == as_json(fresh["best_route"])
+
+
+def test_unknown_session_starts_a_new_one(make_payload, no_leg_cache):
+    result = main.search_route(make_payload(2, session_id="does-not-exist"))
+    assert result["session_id"] != "does-not-exist"
+
+
+def test_store_evicts_least_recently_used_and_expired_sessions(monkeypatch):
+    store = search_sessions.SessionStore(ttl=60, max_sessions=2)
+    a, _ = store.get_or_create(None)
+    b, _ = store.get_or_create(None)
+    assert store.get_or_create(a.id) == (a, True)
+    store.get_or_create(None)  # evicts b, the least recently used
+    assert store.get_or_create(a.id) == (a, True)
+    assert store.get_or_create(b.id)[1] is False
+    assert store.get_or_create(a.id) == (a, True)
+
+    now = search_sessions.time.monotonic()
+    monkeypatch.setattr(search_sessions.time, "monotonic", lambda: now + 61)
+    assert store.get_or_create(a.id)[1] is False
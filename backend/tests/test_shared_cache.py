@@ -0,0 +1,84 @@
+"""SHARED_CACHE=mmap: the cross-process quote table in front of the SQLite price_cache."""
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import pytest
+
+import cache_db
+import shared_cache
+
+pytestmark = pytest.mark.skipif(shared_cache.fcntl is None, reason="the shared tier needs flock")
+
+LEG = ("KIW|IST", "BER", "2030-06-01")
+
+
+@pytest.fixture
+def shared(monkeypatch, cache):
+    monkeypatch.setenv("SHARED_CACHE", "mmap")
+    cache_db.init(cache)
+    yield cache_db.shared
+    cache_db.shared = None
+
+
+def test_read_through_copy_keeps_the_sqlite_fetched_at(shared):
+    stale = int(time.time()) - 3600
+    cache_db.set_cache(*LEG, {"price": 10}, fetched_at=stale)
+    shared.clear()
+    assert cache_db.get(*LEG) == {"price": 10}
+    assert shared.get(*LEG) == {"price": 10}
+    # an hour old in both tiers, not fresh because it was copied just now
+    assert shared.get(*LEG, max_age=60) is shared_cache.MISSING
+    assert cache_db.get(*LEG, max_age=60) is None
+    assert cache_db.get(*LEG, max_age=7200) == {"price": 10}
+
+
+def test_read_through_copy_never_replaces_a_newer_quote(shared):
+    now = int(time.time())
+    shared.put(*LEG, {"price": 20}, now)
+    assert not shared.put(*LEG, {"price": 10}, now - 60, if_newer=True)
+    assert shared.get(*LEG) == {"price": 20}
+    # an authoritative write (set_cache) always lands
+    cache_db.set_cache(*LEG, {"price": 30}, fetched_at=now - 30)
+    assert shared.get(*LEG) == {"price": 30}
+
+
+def test_quote_too_large_for_a_slot_drops_the_old_one(shared):
+    cache_db.set_cache(*LEG, {"price": 10}, fetched_at=int(time.time()))
+    big = {"price": 11, "flight_link": "x" * shared.slot_bytes}
+    cache_db.set_cache(*LEG, big, fetched_at=int(time.time()))
+    assert shared.get(*LEG) is shared_cache.MISSING
+    assert cache_db.get(*LEG) == big
+
+
+def test_clear_all_empties_both_tiers(shared):
+    cache_db.set_cache(*LEG, {"price": 10}, fetched_at=int(time.time()))
+    cache_db.clear_all()
+    assert shared.get(*LEG) is shared_cache.MISSING
+    assert cache_db.get(*LEG) is None
+
+
+def _write_many(db_path, worker, n):
+    os.environ["SHARED_CACHE"] = "mmap"
+    cache_db.init(db_path)
+    for i in range(n):
+        cache_db.set_cache("KIW|IST", f"W{worker}", f"2030-06-{1 + i % 28:02d}", {"price": i}, fetched_at=int(time.time()))
+
+
+def test_concurrent_workers_write_through_one_writer(shared, cache):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_write_many, args=(cache, w, 100)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    # a worker that hit "database is locked" would have died with a non-zero exit code
+    assert [p.exitcode for p in procs] == [0] * 4
+    conn = sqlite3.connect(cache)
+    assert conn.execute("SELECT COUNT(*) FROM price_cache").fetchone()[0] == 4 * 28
+    conn.close()
+    for w in range(4):
+        # the last write of every leg won in both tiers
+        assert shared.get("KIW|IST", f"W{w}", "2030-06-28") == {"price": 83}
+        assert cache_db.get("KIW|IST", f"W{w}", "2030-06-01") == {"price": 84}
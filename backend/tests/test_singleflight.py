@@ -0,0 +1,121 @@
+"""Coalescing of concurrent identical upstream calls (singleflight)."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from http_retry import SearchCancelled, cancel_scope
+from singleflight import SingleFlight
+
+
+def slow(calls, value, release):
+    def fn(*args):
+        calls.append(args)
+        release.wait(5)
+        return value
+    return fn
+
+
+def wait_for_waiters(flight, n):
+    deadline = time.monotonic() + 5
+    while flight.stats["shared"] < n and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_concurrent_callers_share_one_call():
+    flight, calls, release = SingleFlight(), [], threading.Event()
+    fn = slow(calls, {"price": 10}, release)
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do, ("KIW", "IST", "BER", "d"), fn, "IST") for _ in range(8)]
+        wait_for_waiters(flight, 7)
+        release.set()
+        results = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.stats == {"leaders": 1, "shared": 7}
+    # a finished call is not reused
+    assert flight.do(("KIW", "IST", "BER", "d"), lambda: 11) == 11
+
+
+def test_leader_error_is_shared_with_waiters():
+    flight, release = SingleFlight(), threading.Event()
+
+    def boom():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(flight.do, "k", boom) for _ in range(3)]
+        wait_for_waiters(flight, 2)
+        release.set()
+        for f in futures:
+            with pytest.raises(RuntimeError):
+                f.result()
+
+
+def test_cancelled_leader_does_not_fail_its_waiters():
+    flight, started, cancelled = SingleFlight(), threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            cancelled.wait(5)
+            raise SearchCancelled()
+        return "fresh"
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", fetch)
+        started.wait(5)
+        waiter = pool.submit(flight.do, "k", fetch)
+        wait_for_waiters(flight, 1)
+        cancelled.set()
+        with pytest.raises(SearchCancelled):
+            leader.result()
+        assert waiter.result() == "fresh"
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_stops_waiting():
+    flight, release, event, calls = SingleFlight(), threading.Event(), threading.Event(), []
+
+    def wait_cancelled():
+        with cancel_scope(event):
+            return flight.do("k", lambda: "late")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", slow(calls, "done", release))
+        deadline = time.monotonic() + 5
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.005)
+        waiter = pool.submit(wait_cancelled)
+        wait_for_waiters(flight, 1)
+        event.set()
+        with pytest.raises(SearchCancelled):
+            waiter.result(timeout=1)
+        release.set()
+        assert leader.result() == "done"
+
+
+def test_do_many_fetches_only_keys_nobody_else_is_fetching():
+    flight, release, batches = SingleFlight(), threading.Event(), []
+
+    def fetch(keys):
+        batches.append(sorted(keys))
+        if "a" in keys:
+            release.wait(5)
+        return {k: k.upper() for k in keys}
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(flight.do_many, ["a", "b"], fetch)
+        deadline = time.monotonic() + 5
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.005)
+        second = pool.submit(flight.do_many, ["b", "c"], fetch)
+        wait_for_waiters(flight, 1)
+        release.set()
+        assert first.result() == {"a": "A", "b": "B"}
+        assert second.result() == {"b": "B", "c": "C"}
+    assert batches == [["a", "b"], ["c"]]
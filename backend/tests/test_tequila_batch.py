@@ -0,0 +1,66 @@
+"""Batched Tequila pricing (tequila_client.fetch_prices_batch) against the synthetic upstream."""
+import json
+
+import main
+import metro_areas
+from synthetic import synthetic_price, synthetic_tequila
+
+DATE = "2031-05-01"
+
+
+def recording(calls, responder=synthetic_tequila):
+    def respond(provider, request):
+        calls.append(dict(request["params"]))
+        return responder(provider, request)
+    return respond
+
+
+def prices(legs, quotes):
+    return {leg[1]: (quotes[leg] or {}).get("price") for leg in legs}
+
+
+def test_one_for_city_only_for_distinct_known_cities():
+    assert metro_areas.distinct_cities(["LON", "CDG", "MXP"])
+    assert not metro_areas.distinct_cities(["LHR", "STN"])
+    assert not metro_areas.distinct_cities(["LON", "LHR"])
+    assert not metro_areas.distinct_cities(["LON", "BER"])
+
+
+def test_known_cities_share_a_one_for_city_request(replay):
+    calls = []
+    replay.responder = recording(calls)
+    legs = [("IST", code, DATE) for code in ("LON", "CDG", "MXP")]
+    quotes = main._tequila().fetch_prices_batch(legs)
+    assert [c.get("one_for_city") for c in calls] == [1]
+    assert all(quotes[leg]["price"] for leg in legs)
+
+
+def test_siblings_of_an_unlisted_city_are_all_priced(replay):
+    # IST and SAW are one city upstream but not in METRO_AREAS
+    calls = []
+    replay.responder = recording(calls)
+    legs = [("VIE", code, DATE) for code in ("IST", "SAW", "BER")]
+    quotes = main._tequila().fetch_prices_batch(legs)
+    assert len(calls) == 1 and "one_for_city" not in calls[0]
+    assert prices(legs, quotes) == {leg[1]: synthetic_price(*leg) for leg in legs}
+
+
+def test_destinations_cut_off_by_the_limit_are_fetched_alone(replay):
+    def crowded(provider, request):
+        # a full page of cheap offers to the first destination pushes the others out
+        status, headers, body = synthetic_tequila(provider, request)
+        params = request["params"]
+        destinations = params["fly_to"].split(",")
+        if len(destinations) == 1:
+            return status, headers, body
+        offer = json.loads(body)["data"][0]
+        filler = dict(offer, flyTo=destinations[0], cityCodeTo=destinations[0], price=1)
+        return status, headers, json.dumps({"data": [filler] * int(params["limit"])})
+
+    calls = []
+    replay.responder = recording(calls, crowded)
+    legs = [("VIE", code, DATE) for code in ("BER", "AMS", "PRG")]
+    quotes = main._tequila().fetch_prices_batch(legs)
+    assert [c["fly_to"] for c in calls] == ["BER,AMS,PRG", "AMS", "PRG"]
+    assert quotes[legs[0]]["price"] == 1
+    assert {leg[1]: quotes[leg]["price"] for leg in legs[1:]} == {leg[1]: synthetic_price(*leg) for leg in legs[1:]}
@@ -3,6 +3,8 @@ import logging
 import requests
 from config import settings
 from cache_db import get as cache_get, set_cache
+from singleflight import single_flight
+from http_retry import request_with_retry
 
 logger = logging.getLogger("gelidonia")
 
@@ -13,6 +15,7 @@ API_BASE = "https://api.travelpayouts.com/v1/prices/cheap"  # Current prices
 TOKEN = settings.TRAVELPAYOUTS_TOKEN
 CURRENCY = settings.CURRENCY
 
+@single_flight("TP")
 def fetch_price_for_date(origin: str, destination: str, date: str):
     cache_key = f"tp-{origin}-{destination}-{date}"
     cached = cache_get(origin, destination, date)
@@ -35,11 +38,11 @@ def fetch_price_for_date(origin: str, destination: str, date: str):
 
     try:
         time.sleep(0.5)  # Rate limiting
-        resp = requests.get(API_BASE, params=params, timeout=15)
+        resp = request_with_retry("GET", API_BASE, label=f"TP {origin}-{destination} {date}", params=params, timeout=15)
         
         if resp.status_code == 429:
             logger.warning("TP rate limited 429 for %s-%s %s", origin, destination, date)
-            return None
+            return {"rate_limited": True}
         if resp.status_code != 200:
             logger.error("TP HTTP %s: %s", resp.status_code, resp.text[:200])
             return None
@@ -100,9 +103,9 @@ def fetch_price_for_date(origin: str, destination: str, date: str):
         # Price validation removed - accept all valid prices
 
         # Log the raw API response for debugging
-        logger.info("TP RAW API RESPONSE for %s-%s %s: %s", origin, destination, date, data)
-        logger.info("TP FLIGHTS_DATA for %s-%s %s: %s", origin, destination, date, flights_data)
-        logger.info("TP CHEAPEST_FLIGHT for %s-%s %s: %s", origin, destination, date, cheapest_flight)
+        logger.debug("TP RAW API RESPONSE for %s-%s %s: %s", origin, destination, date, data)
+        logger.debug("TP FLIGHTS_DATA for %s-%s %s: %s", origin, destination, date, flights_data)
+        logger.debug("TP CHEAPEST_FLIGHT for %s-%s %s: %s", origin, destination, date, cheapest_flight)
         
         # Extract flight details
         airline_code = cheapest_flight.get("airline", "TBD")
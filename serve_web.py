@@ -1,24 +1,114 @@
 #!/usr/bin/env python3
 """
-Simple HTTP server to serve the Flutter web build.
+HTTP server to serve the Flutter web build.
 This serves the web version while keeping the mobile app unaffected.
+
+    python serve_web.py [--port 3000] [--dir build/web] [--no-browser] [--no-precompress] [--quiet]
+
+Each connection is handled in its own thread (HTTP/1.1 keep-alive), so a slow client does not
+block the others. At startup every compressible asset above PRECOMPRESS_MIN_BYTES gets a .gz
+sibling (and .br when the brotli module is installed); clients that accept those encodings are
+sent the precompressed file as is. Responses carry an ETag and Last-Modified, conditional requests
+are answered with 304, and file bodies go out with sendfile. Cache policy: content-hashed file
+names and requests with a ?v= version are cached for a year (immutable); everything else is
+revalidated on each use (no-cache + ETag), since Flutter keeps names like main.dart.js across builds.
 """
+import argparse
+import email.utils
+import gzip
 import http.server
-import socketserver
 import os
+import re
+import shutil
 import sys
+from http import HTTPStatus
 from threading import Thread
+from urllib.parse import parse_qs, urlsplit
 import webbrowser
 import time
 
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
 # Configuration
 WEB_PORT = 3000
 WEB_DIR = "build/web"
+PRECOMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".json", ".wasm", ".svg", ".txt", ".map", ".otf", ".ttf", ".frag"}
+# precompressed sibling suffix per Content-Encoding, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+HASHED_NAME = re.compile(r"[.-][0-9a-f]{8,}\.[A-Za-z0-9]+$")
+
+
+def _fresh(variant: str, source: str) -> bool:
+    try:
+        return os.stat(variant).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except OSError:
+        return False
+
+
+def precompress(root: str) -> dict:
+    """Writes missing or stale .gz (and .br) siblings of compressible assets; returns counts."""
+    counts = {"gzip": 0, "br": 0, "skipped": 0}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE or os.path.getsize(path) < PRECOMPRESS_MIN_BYTES:
+                continue
+            with open(path, "rb") as f:
+                data = None
+                for encoding, suffix in ENCODINGS:
+                    if (encoding == "br" and brotli is None) or _fresh(path + suffix, path):
+                        continue
+                    data = data if data is not None else f.read()
+                    packed = brotli.compress(data) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+                    if len(packed) >= len(data):
+                        counts["skipped"] += 1
+                        continue
+                    # write then rename, so a concurrent request never sees a half-written file
+                    tmp = f"{path}{suffix}.tmp{os.getpid()}"
+                    with open(tmp, "wb") as out:
+                        out.write(packed)
+                    os.replace(tmp, path + suffix)
+                    counts[encoding] += 1
+    return counts
+
+
+def _accepted(header: str) -> set:
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
 
 class Handler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes: without TCP_NODELAY a kept-alive connection
+    # waits on the client's delayed ACK (~40 ms) for every response
+    disable_nagle_algorithm = True
+    quiet = False
+    # WebAssembly.instantiateStreaming (CanvasKit) needs the exact type; older mimetypes lack it
+    extensions_map = {**http.server.SimpleHTTPRequestHandler.extensions_map,
+                      ".wasm": "application/wasm", ".mjs": "text/javascript"}
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=WEB_DIR, **kwargs)
-    
+
     def end_headers(self):
         # Add CORS headers for development
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -26,30 +116,139 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', '*')
         super().end_headers()
 
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def cache_control(self, path: str) -> str:
+        if HASHED_NAME.search(os.path.basename(path)) or "v" in parse_qs(urlsplit(self.path).query):
+            return IMMUTABLE
+        return REVALIDATE
+
+    def _variant(self, path: str):
+        """(Content-Encoding or None, file to send) for path and this request's Accept-Encoding."""
+        if os.path.splitext(path)[1] in COMPRESSIBLE:
+            accepted = _accepted(self.headers.get("Accept-Encoding", ""))
+            for encoding, suffix in ENCODINGS:
+                if encoding in accepted and _fresh(path + suffix, path):
+                    return encoding, path + suffix
+        return None, path
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+        return False
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, "index.html")
+            if not urlsplit(self.path).path.endswith("/") or not os.path.isfile(index):
+                return super().send_head()  # redirect to "dir/" or directory listing
+            path = index
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        encoding, served = self._variant(path)
+        try:
+            f = open(served, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            st = os.fstat(f.fileno())
+            mtime = os.stat(path).st_mtime
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+            not_modified = self._not_modified(etag, mtime)
+            self.send_response(HTTPStatus.NOT_MODIFIED if not_modified else HTTPStatus.OK)
+            if not not_modified:
+                self.send_header("Content-Type", self.guess_type(path))
+                self.send_header("Content-Length", str(st.st_size))
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+            if os.path.splitext(path)[1] in COMPRESSIBLE:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", self.date_time_string(mtime))
+            self.send_header("Cache-Control", self.cache_control(path))
+            self.end_headers()
+        except BaseException:
+            f.close()
+            raise
+        if not_modified:
+            f.close()
+            return None
+        return f
+
+    def copyfile(self, source, outputfile):
+        # the headers are already on the socket (wfile is unbuffered): let the kernel send the body
+        try:
+            self.connection.sendfile(source)
+        except (AttributeError, ValueError):
+            shutil.copyfileobj(source, outputfile)
+
+
+class Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # a browser navigating away mid-download is routine, not a server error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
 def open_browser():
     """Open the web browser after a short delay"""
     time.sleep(2)
     webbrowser.open(f'http://localhost:{WEB_PORT}')
 
 def main():
+    global WEB_PORT, WEB_DIR
+    ap = argparse.ArgumentParser(description="Serve the Flutter web build.")
+    ap.add_argument("--port", type=int, default=WEB_PORT)
+    ap.add_argument("--dir", default=WEB_DIR)
+    ap.add_argument("--no-browser", action="store_true")
+    ap.add_argument("--no-precompress", action="store_true")
+    ap.add_argument("--quiet", action="store_true", help="no per-request log lines")
+    args = ap.parse_args()
+    WEB_PORT, WEB_DIR = args.port, args.dir
+    Handler.quiet = args.quiet
+
     # Check if web build exists
     if not os.path.exists(WEB_DIR):
         print(f"Error: {WEB_DIR} directory not found!")
         print("Please run 'flutter build web' first.")
         sys.exit(1)
-    
+
+    if not args.no_precompress:
+        counts = precompress(WEB_DIR)
+        print(f"🗜  Sıkıştırılmış dosyalar: gzip {counts['gzip']}, brotli {counts['br']}"
+              f"{'' if brotli else ' (brotli modülü yok)'}")
+
     # Start HTTP server
-    with socketserver.TCPServer(("", WEB_PORT), Handler) as httpd:
+    with Server(("", WEB_PORT), Handler) as httpd:
         print(f"✅ Gelidonia Web Interface başlatıldı!")
         print(f"🌐 Web adresi: http://localhost:{WEB_PORT}")
         print(f"📱 Mobil uygulama etkilenmez (port 8000'de API çalışıyor)")
         print(f"🛑 Durdurmak için Ctrl+C basın")
         print()
-        
-        # Open browser in background
-        browser_thread = Thread(target=open_browser, daemon=True)
-        browser_thread.start()
-        
+
+        if not args.no_browser:
+            # Open browser in background
+            browser_thread = Thread(target=open_browser, daemon=True)
+            browser_thread.start()
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt: